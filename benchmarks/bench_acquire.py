@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# Averaging and hi-res acquisition: cost per frame and memory held for growing N,
+# against averaging the last N frames kept in a deque, and the error left against
+# the ideal signal for a noisy 1 kHz sine (the noise dithers the 8 bit codes)
+
+import sys
+from collections import deque
+from time import perf_counter
+
+import numpy as np
+
+from gruseloskop.acquire import Acquisition
+from gruseloskop.driver import FrameData, UnoDriver
+
+FRAMES = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+COUNTS = [4, 16, 64, 256]
+HIRES = [2, 4, 8]
+NOISE = 0.03  # volts RMS, about 1.5 codes
+
+
+def frames_make(count=256):
+    time0, time1, spl_rate = UnoDriver._timebase(1)
+    rng = np.random.default_rng(1)
+    ideal = 2.5 + 2.0 * np.sin(2 * np.pi * 1000 * np.stack([time0, time1]))
+    frames = []
+    for _ in range(count):
+        volts = ideal + rng.normal(0, NOISE, ideal.shape)
+        codes = np.clip(np.round(volts / UnoDriver._vref * 0xFF), 0, 0xFF)
+        frame = FrameData(
+            time0, time1, codes.astype(np.uint8), True, spl_rate, UnoDriver._vref
+        )
+        frames.append(frame)
+    return frames, ideal
+
+
+def naive_cost(frames, count):
+    # mean of the last N frames' volts, microseconds per frame and bytes held
+    window = deque(maxlen=count)
+    start = perf_counter()
+    for i in range(FRAMES):
+        window.append(frames[i % len(frames)].codes.astype(np.float32))
+        np.mean(window, axis=0)
+    held = sum(w.nbytes for w in window)
+    return (perf_counter() - start) / FRAMES * 1e6, held
+
+
+def cost(frames, count, hires=1):
+    acquire = Acquisition((count, count), hires)
+    start = perf_counter()
+    for i in range(FRAMES):
+        acquire.process(frames[i % len(frames)])
+    held = acquire._mean.nbytes + acquire._scratch.nbytes + acquire._volts.nbytes
+    return (perf_counter() - start) / FRAMES * 1e6, held
+
+
+def error(frames, ideal, count, hires=1):
+    # RMS volts of A0 against the ideal signal (block means for hi-res)
+    acquire = Acquisition((count, count), hires)
+    for frame in frames * 4:
+        out = acquire.process(frame)
+    ideal = ideal[0, : out.codes.shape[1] * hires].reshape((-1, hires)).mean(axis=1)
+    return np.sqrt(np.mean((out.data0 - ideal) ** 2))
+
+
+if __name__ == "__main__":
+    print(
+        "numpy {}, {} frames, {:.1f} mV noise, 1 code = {:.1f} mV".format(
+            np.__version__, FRAMES, NOISE * 1e3, UnoDriver._vref / 0xFF * 1e3
+        )
+    )
+    frames, ideal = frames_make()
+    print("{:12s}{:>12s}{:>12s}{:>12s}".format("", "us/frame", "bytes", "error mV"))
+    print("{:12s}{:>36.2f}".format("raw", error(frames, ideal, 1) * 1e3))
+    for count in COUNTS:
+        us, held = naive_cost(frames, count)
+        print("{:12s}{:12.1f}{:12d}".format("deque {}".format(count), us, held))
+        us, held = cost(frames, count)
+        print(
+            "{:12s}{:12.1f}{:12d}{:12.2f}".format(
+                "average {}".format(count),
+                us,
+                held,
+                error(frames, ideal, count) * 1e3,
+            )
+        )
+    for hires in HIRES:
+        us, held = cost(frames, 1, hires)
+        print(
+            "{:12s}{:12.1f}{:12d}{:12.2f}".format(
+                "hi-res {}".format(hires),
+                us,
+                held,
+                error(frames, ideal, 1, hires) * 1e3,
+            )
+        )
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# A1 to A0 alignment: cost per frame for each method, alone and in batches, and
+# the error left against an ideal A1 sampled at A0's times for sines of growing
+# frequency at the full sample rate
+
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from gruseloskop.align import ChannelAligner
+from gruseloskop.driver import FrameData, UnoDriver
+
+FRAMES = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+BATCH = 64
+FREQS = [1000, 5000, 10000, 15000]
+METHODS = [("off", None, 0), ("linear", "linear", 2)] + [
+    ("sinc {}".format(taps), "sinc", taps) for taps in (8, 16, 32)
+]
+
+
+def frame_make(freq):
+    time0, time1, spl_rate = UnoDriver._timebase(1)
+    omega = 2 * np.pi * freq
+    volts = [2.5 + 2.0 * np.sin(omega * time) for time in (time0, time1)]
+    codes = np.round(np.stack(volts) / UnoDriver._vref * 0xFF).astype(np.uint8)
+    frame = FrameData(time0, time1, codes, True, spl_rate, UnoDriver._vref)
+    return frame, 2.5 + 2.0 * np.sin(omega * time0)
+
+
+def cost(method, taps, frame):
+    # microseconds per frame, frame by frame and in batches
+    aligner = ChannelAligner(method, taps)
+    start = perf_counter()
+    for _ in range(FRAMES):
+        aligner.align(frame)
+    single = (perf_counter() - start) / FRAMES * 1e6
+
+    if method is None:
+        return single, single
+    batch = np.repeat(frame.data1[None, :], BATCH, axis=0)
+    delay = ChannelAligner.delay(frame)
+    start = perf_counter()
+    for _ in range(FRAMES // BATCH):
+        aligner.resample(batch, delay)
+    batched = (perf_counter() - start) / (FRAMES // BATCH * BATCH) * 1e6
+    return single, batched
+
+
+def error(method, taps, freq):
+    # RMS volts against the ideal A1, the ends are left out (edge padding)
+    frame, ideal = frame_make(freq)
+    aligned = ChannelAligner(method, taps).align(frame)
+    return np.sqrt(np.mean((aligned - ideal)[32:-32] ** 2))
+
+
+if __name__ == "__main__":
+    frame, _ = frame_make(1000)
+    print(
+        "numpy {}, {} frames, A1 {:.3f} samples late".format(
+            np.__version__, FRAMES, ChannelAligner.delay(frame)
+        )
+    )
+    print(
+        "{:10s}{:>12s}{:>12s}".format("", "us/frame", "batched")
+        + "".join("{:>12s}".format("{} Hz".format(f)) for f in FREQS)
+    )
+    for name, method, taps in METHODS:
+        single, batched = cost(method, taps, frame)
+        errors = [error(method, taps, f) for f in FREQS]
+        print(
+            "{:10s}{:12.1f}{:12.1f}".format(name, single, batched)
+            + "".join("{:10.4f} V".format(e) for e in errors)
+        )
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# Packet decoding throughput and allocations: baseline decoder vs. FrameDecoder
+
+import sys
+import tracemalloc
+from time import perf_counter
+
+import numpy as np
+
+from gruseloskop.driver import UnoDriver, FrameData, FrameDecoder
+
+FRAMES = 20000
+
+
+def make_packet():
+    samples = UnoDriver._chan_samples
+    packet = np.empty(FrameData.packet_size(samples), dtype=np.uint8)
+    packet[:4] = UnoDriver._syncword
+    packet[4] = 1
+    packet[5:] = np.random.randint(0, 0x100, 2 * samples)
+    return packet.tobytes()
+
+
+def baseline_decode(packet, time0, time1, spl_rate):
+    # decoder as it used to be in UnoDriver._parse_acq_packet, eager floats
+    samples = UnoDriver._chan_samples
+    packet = np.frombuffer(packet, dtype=np.uint8)
+    data0 = np.empty_like(time0)
+    data1 = np.empty_like(time1)
+
+    sync_size = np.size(UnoDriver._syncword)
+    if not np.array_equal(packet[:sync_size], UnoDriver._syncword):
+        return None
+
+    triggered = packet[sync_size : sync_size + 1] != 0
+    data = packet[sync_size + 1 :].astype(np.float32).reshape((2, samples))
+    data0 = data[0, :] / 0xFF * UnoDriver._vref
+    data1 = data[1, :] / 0xFF * UnoDriver._vref
+    return triggered, data0, data1
+
+
+def measure(name, decode):
+    for _ in range(100):
+        decode()  # warm up pools and caches
+
+    start = perf_counter()
+    for _ in range(FRAMES):
+        decode()
+    rate = FRAMES / (perf_counter() - start)
+
+    tracemalloc.start()
+    allocated = 0
+    for _ in range(1000):
+        base, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        decode()
+        allocated += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+
+    print(
+        "{:10s} {:10.0f} frames/s {:10.0f} bytes/frame".format(
+            name, rate, allocated / 1000
+        )
+    )
+
+
+if __name__ == "__main__":
+    packet = make_packet()
+    time0 = np.linspace(0, 0.02, UnoDriver._chan_samples)
+    time1 = time0 + UnoDriver._channel1_delay
+
+    decoder = FrameDecoder(
+        UnoDriver._chan_samples, UnoDriver._vref, len(UnoDriver._syncword), 8
+    )
+    view = memoryview(bytearray(packet))
+
+    print("numpy {}, python {}".format(np.__version__, sys.version.split()[0]))
+    measure("baseline", lambda: baseline_decode(packet, time0, time1, 38450.0))
+    measure("raw", lambda: decoder.decode(view))
+    measure("raw+volts", lambda: decoder.decode(view).volts)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# Bulk export throughput from a capture file vs. np.savetxt per frame
+
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+from gruseloskop.driver import UnoDriver, Config, FrameData
+from gruseloskop.record import CaptureWriter, CaptureReader
+from gruseloskop.export import ExportJob, CaptureSource
+
+FRAMES = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+
+def capture_make(path):
+    samples = UnoDriver._chan_samples
+    time0, time1, spl_rate = UnoDriver._timebase(1)
+    codes = np.random.randint(0, 0x100, (2, samples), dtype=np.uint8)
+    frame = FrameData(time0, time1, codes, True, spl_rate, UnoDriver._vref)
+    frame.config = Config()
+
+    with CaptureWriter(
+        path, samples, UnoDriver._vref, UnoDriver._channel1_delay
+    ) as writer:
+        for i in range(FRAMES):
+            frame.timestamp = i * 0.01
+            writer.write(frame)
+
+
+def savetxt_rate(reader, frames=200):
+    start = perf_counter()
+    with open(os.devnull, "w") as f:
+        for i in range(frames):
+            frame = reader[i]
+            data = np.transpose([frame.time0, frame.data0, frame.time1, frame.data1])
+            np.savetxt(f, data, delimiter=",")
+    return frames / (perf_counter() - start)
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.grc")
+        capture_make(path)
+        reader = CaptureReader(path)
+        print(
+            "{} frames, {:.1f} MB capture".format(FRAMES, os.path.getsize(path) / 1e6)
+        )
+        print("{:10s} {:10.0f} frames/s".format("savetxt", savetxt_rate(reader)))
+
+        for fmt in ["csv", "npz"]:
+            out = os.path.join(tmp, "out." + fmt)
+            start = perf_counter()
+            job = ExportJob(CaptureSource(reader), out, fmt).start()
+            job.wait()
+            elapsed = perf_counter() - start
+            print(
+                "{:10s} {:10.0f} frames/s {:8.1f} MB/s written".format(
+                    fmt, FRAMES / elapsed, os.path.getsize(out) / 1e6 / elapsed
+                )
+            )
+            os.remove(out)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# Import time of the package modules and the launcher, from `python -X importtime`
+# in a fresh interpreter each, best of a few runs. Also shows whether Qt got
+# pulled in, only the GUI should need it.
+
+import os
+import subprocess
+import sys
+from time import perf_counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAUNCHER = os.path.join(ROOT, "bin", "gruseloskop")
+REPEAT = 5
+
+TARGETS = [
+    ("protocol", ["-c", "import gruseloskop.protocol"]),
+    ("driver", ["-c", "import gruseloskop.driver"]),
+    ("record", ["-c", "import gruseloskop.record"]),
+    ("asyncdriver", ["-c", "import gruseloskop.asyncdriver"]),
+    ("net", ["-c", "import gruseloskop.net"]),
+    ("gui", ["-c", "import gruseloskop.gui"]),
+    ("gruseloskop --help", [LAUNCHER, "--help"]),
+]
+QT_MODULES = ("PySide2", "pyqtgraph", "PyQt5")
+
+
+def measure(argv):
+    # returns (wall seconds, summed top-level cumulative import seconds, Qt used)
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    start = perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime"] + argv,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    wall = perf_counter() - start
+
+    imports = 0
+    qt = False
+    for line in proc.stderr.splitlines():
+        # "import time:   self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        qt = qt or name.strip().split(".")[0] in QT_MODULES
+        if not name.startswith("  "):  # top level, includes its children
+            imports += int(cumulative)
+    if proc.returncode != 0:
+        return wall, None, qt
+    return wall, imports / 1e6, qt
+
+
+if __name__ == "__main__":
+    print("python {}".format(sys.version.split()[0]))
+    for label, argv in TARGETS:
+        runs = [measure(argv) for _ in range(REPEAT)]
+        wall, imports, qt = min(runs, key=lambda run: run[0])
+        if imports is None:
+            print("{:20s} failed (missing dependency?)".format(label))
+            continue
+        print(
+            "{:20s} {:7.1f} ms imports {:7.1f} ms wall  Qt {}".format(
+                label, imports * 1e3, wall * 1e3, "yes" if qt else "no"
+            )
+        )
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# Link modes: unpacking speed per packing, and frames per second end to end
+# against the emulator paced to capture time and baud rate (POSIX only)
+
+import sys
+from time import perf_counter, sleep
+
+import numpy as np
+
+from gruseloskop import link
+from gruseloskop.driver import UnoDriver, Config, FrameDecoder, TriggerMode
+from gruseloskop.emulator import UnoEmulator
+
+DURATION = 3.0
+UNPACKS = 5000
+
+signals = {
+    # slow enough for 4 bit deltas at the fastest timebase
+    "sine 200Hz": lambda t, chan: 2.5 + 2.0 * np.sin(2 * np.pi * 200 * t + chan),
+    "square 50Hz": lambda t, chan: np.where((t * 50 + chan / 4) % 1 < 0.5, 4.0, 1.0),
+    "noise": lambda t, chan: np.random.uniform(0, 5, len(t)),
+}
+
+modes = [(115200, False), (115200, True), (1000000, False), (1000000, True)]
+
+
+def codes_of(signal):
+    t = np.arange(UnoDriver._chan_samples) / UnoDriver._sample_base_clk
+    volts = np.stack([signal(t, chan) for chan in (0, 1)])
+    return np.clip(volts / UnoDriver._vref * 0xFF, 0, 0xFF).astype(np.uint8)
+
+
+def bench_unpack():
+    decoder = FrameDecoder(
+        UnoDriver._chan_samples, UnoDriver._vref, len(UnoDriver._syncword), 8
+    )
+    for name, signal in signals.items():
+        packet = link.pack(codes_of(signal), True, link.PACK_DELTA | link.PACK_RLE)
+        view = memoryview(bytearray(packet))
+        start = perf_counter()
+        for _ in range(UNPACKS):
+            decoder.decode_packed(view)
+        rate = UNPACKS / (perf_counter() - start)
+        print(
+            "{:12s} {:6s} {:5d} bytes {:10.0f} unpacks/s".format(
+                name, link.Packing(packet[5]).name, len(packet), rate
+            )
+        )
+
+
+def bench_fps(signal, baud, packing):
+    with UnoEmulator(signal, frame_delay=0.001, realtime=True) as emu:
+        drv = UnoDriver(emu.port, baud=baud, packing=packing)
+        drv.set_config(Config(trig_mode=TriggerMode.AUTO, timeframe=0.02))
+        while drv.get_frame(1.0) is None:
+            pass  # config is in effect
+
+        sent = emu.bytes_sent
+        frames = 0
+        start = perf_counter()
+        while perf_counter() - start < DURATION:
+            if drv.get_frame(0.1) is not None:
+                frames += 1
+        elapsed = perf_counter() - start
+        per_frame = (emu.bytes_sent - sent) / max(frames, 1)
+        drv.close()
+        sleep(0.1)
+    return frames / elapsed, per_frame
+
+
+if __name__ == "__main__":
+    print("numpy {}, python {}".format(np.__version__, sys.version.split()[0]))
+    bench_unpack()
+    print()
+    for name, signal in signals.items():
+        for baud, packing in modes:
+            fps, per_frame = bench_fps(signal, baud, packing)
+            print(
+                "{:12s} {:7d} baud {:6s} {:6.1f} fps {:6.0f} bytes/frame".format(
+                    name, baud, "packed" if packing else "raw", fps, per_frame
+                )
+            )
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# Math channels: cost per frame of compiling once and evaluating into preallocated
+# buffers, against evaluating the same expression from scratch each frame, the
+# redraw of a frame already evaluated, and batches as the export evaluates them
+
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from gruseloskop.driver import FrameData, UnoDriver
+from gruseloskop.mathchan import MathChannel, compile_expression
+
+FRAMES = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+BATCH = 64
+EXPRESSIONS = [
+    "A1-A0",
+    "A0*A1",
+    "(A0-2.5)**2 + (A1-2.5)**2",
+    "avg(A0, 16)",
+    "deriv(A0)",
+    "integ(A0-2.5)",
+    "fir(A0, 0.25, 0.5, 0.25)",
+    "lowpass(A0, 500)",
+]
+
+
+def frames_make():
+    time0, time1, spl_rate = UnoDriver._timebase(1)
+    codes = np.random.randint(0, 0x100, (64, 2, time0.size)).astype(np.uint8)
+    frames = [
+        FrameData(time0, time1, c, True, spl_rate, UnoDriver._vref) for c in codes
+    ]
+    for i, frame in enumerate(frames):
+        frame.timestamp = float(i)
+        frame.volts  # converted once, like the GUI does for plotting anyway
+    return frames
+
+
+def per_frame(expression, frames, fresh):
+    # microseconds per frame, a new channel (compiled again) each frame if fresh
+    math = MathChannel(expression)
+    start = perf_counter()
+    for i in range(FRAMES):
+        if fresh:
+            compile_expression.cache_clear()
+            math = MathChannel(expression)
+        math.evaluate(frames[i % len(frames)])
+    return (perf_counter() - start) / FRAMES * 1e6
+
+
+def redraw(expression, frames):
+    math = MathChannel(expression)
+    frame = frames[0]
+    math.evaluate(frame)
+    start = perf_counter()
+    for _ in range(FRAMES):
+        math.evaluate(frame)
+    return (perf_counter() - start) / FRAMES * 1e6
+
+
+def batched(expression, frames):
+    math = MathChannel(expression)
+    volts = np.stack([f.volts for f in frames])[:BATCH]
+    spl_rate = np.full(len(volts), frames[0].spl_rate)
+    start = perf_counter()
+    for _ in range(FRAMES // BATCH):
+        math.evaluate_batch(volts, spl_rate)
+    return (perf_counter() - start) / (FRAMES // BATCH * len(volts)) * 1e6
+
+
+if __name__ == "__main__":
+    print("numpy {}, {} frames, microseconds per frame".format(np.__version__, FRAMES))
+    frames = frames_make()
+    print(
+        "{:28s}".format("")
+        + "".join(
+            "{:>12s}".format(h) for h in ("fresh", "compiled", "redraw", "batched")
+        )
+    )
+    for expression in EXPRESSIONS:
+        costs = [
+            per_frame(expression, frames, True),
+            per_frame(expression, frames, False),
+            redraw(expression, frames),
+            batched(expression, frames),
+        ]
+        print(
+            "{:28s}".format(expression) + "".join("{:12.1f}".format(c) for c in costs)
+        )
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# Measurement time per frame: each channel on its own vs. all channels together,
+# for the default selection and for all measurements, with math channels
+
+import sys
+from timeit import repeat
+
+import numpy as np
+
+from gruseloskop.driver import UnoDriver
+from gruseloskop.measure import measure, measure_channels, measurements
+
+SAMPLES = UnoDriver._chan_samples
+SPL_RATE = 38450.0
+SELECTIONS = {"mean, pp": ["mean", "pp"], "all": measurements}
+
+
+def channels_make(count):
+    # noisy square waves of different frequency, quantized like the codes
+    t = np.arange(SAMPLES)
+    volts = [
+        np.where((t * (chan + 1) / 160) % 1 < 0.3, 4.0, 1.0)
+        + np.random.normal(0, 0.02, SAMPLES)
+        for chan in range(count)
+    ]
+    codes = np.clip(np.round(np.array(volts) / 5.0 * 0xFF), 0, 0xFF)
+    return (codes * np.float32(5.0 / 0xFF)).astype(np.float32)
+
+
+def per_frame(fn, number=2000):
+    return min(repeat(fn, number=number, repeat=5)) / number
+
+
+if __name__ == "__main__":
+    print("numpy {}, python {}".format(np.__version__, sys.version.split()[0]))
+    print("{:24s} {:>14s} {:>14s}".format("", "per channel", "together"))
+    for count in [2, 4]:
+        volts = channels_make(count)
+        for name, select in SELECTIONS.items():
+            single = per_frame(lambda: [measure(v, SPL_RATE, select) for v in volts])
+            fused = per_frame(lambda: measure_channels(volts, SPL_RATE, select))
+            print(
+                "{:d} channels, {:12s} {:11.1f} us {:11.1f} us".format(
+                    count, name, single * 1e6, fused * 1e6
+                )
+            )
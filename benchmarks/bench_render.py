@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# Render path cost vs. samples per trace: min/max envelope reduction and its cache,
+# frames skipped by the RenderScheduler at a given acquisition rate, and (only with
+# PySide2 and pyqtgraph installed) frames per second ScopeGui sustains drawing every
+# sample with antialiasing (as before) vs. the envelope with adaptive antialiasing
+
+import sys
+from time import perf_counter, time
+
+import numpy as np
+
+from gruseloskop.driver import FrameData
+from gruseloskop.render import Decimator, RenderScheduler, minmax_envelope
+
+SAMPLES = [800, 8000, 80000, 800000]
+COLUMNS = 1000  # pixel columns of the plot
+DURATION = 2.0  # s per measurement
+
+
+class BenchDriver:
+    dropped_frames = 0
+    config_dropped_frames = 0
+    resyncs = 0
+
+    def set_update_callback(self, callback):
+        pass
+
+    def set_config(self, config):
+        pass
+
+
+class NoDecimation:
+    def envelope(self, key, x, y, x0, x1, columns):
+        return x, y
+
+
+def frames_make(samples, timeframe, count=8):
+    time0 = np.linspace(0, timeframe, samples, dtype=np.float32)
+    time1 = time0 + timeframe / samples / 2
+    phase = np.linspace(0, 40 * np.pi, samples)
+    frames = []
+    for i in range(count):
+        wave = 0x80 + 0x60 * np.sin(phase + i) + np.random.normal(0, 4, samples)
+        codes = np.clip([wave, wave[::-1]], 0, 0xFF).astype(np.uint8)
+        frames.append(FrameData(time0, time1, codes, True, samples / timeframe))
+    return frames
+
+
+def per_call(func):
+    # seconds per call, repeated for about DURATION / 4
+    start = perf_counter()
+    func()
+    repeat = max(int(DURATION / 4 / max(perf_counter() - start, 1e-7)), 1)
+    start = perf_counter()
+    for _ in range(repeat):
+        func()
+    return (perf_counter() - start) / repeat
+
+
+def bench_envelope():
+    print("{:>8s} {:>14s} {:>14s}".format("samples", "envelope us", "cached us"))
+    for samples in SAMPLES:
+        frame = frames_make(samples, 1.0, 1)[0]
+        x, y = frame.time0, frame.volts[0]
+        decimator = Decimator()
+        reduce = per_call(lambda: minmax_envelope(x, y, 0.0, 1.0, COLUMNS))
+        decimator.envelope(0, x, y, 0.0, 1.0, COLUMNS)
+        cached = per_call(lambda: decimator.envelope(0, x, y, 0.0, 1.0, COLUMNS))
+        print("{:8d} {:14.1f} {:14.2f}".format(samples, reduce * 1e6, cached * 1e6))
+
+
+def bench_scheduler(refresh=60.0, rates=(10, 60, 500, 5000)):
+    # simulated clock: frames pushed at `rate`, one taken per refresh
+    print(
+        "{:>8s} {:>10s} {:>10s} {:>12s}".format(
+            "fps in", "shown", "skipped", "push+take us"
+        )
+    )
+    for rate in rates:
+        scheduler = RenderScheduler()
+        pushes = np.arange(0, 10, 1 / rate)
+        takes = np.arange(0, 10, 1 / refresh)
+        kinds = np.concatenate([np.zeros(len(pushes)), np.ones(len(takes))])
+        kinds = kinds[np.argsort(np.concatenate([pushes, takes]), kind="stable")]
+        start = perf_counter()
+        for kind in kinds:
+            if kind:
+                scheduler.take()
+            else:
+                scheduler.push(kind)
+        cost = (perf_counter() - start) / len(kinds)
+        print(
+            "{:8d} {:10d} {:10d} {:12.2f}".format(
+                rate, scheduler.shown, scheduler.skipped, cost * 1e6
+            )
+        )
+
+
+def fps(app, gui, frames):
+    count = 0
+    start = perf_counter()
+    while perf_counter() - start < DURATION:
+        frame = frames[count % len(frames)]
+        frame.timestamp = time()  # a new frame every time, no cached envelope
+        gui._frame_show(frame)
+        gui._crt.repaint()
+        app.processEvents()
+        count += 1
+    return count / (perf_counter() - start)
+
+
+def bench_widget():
+    try:
+        from PySide2 import QtWidgets
+        import pyqtgraph as pg
+
+        from gruseloskop.gui import ScopeGui
+    except ImportError as e:
+        print("widget: skipped ({})".format(e))
+        return
+
+    app = QtWidgets.QApplication(sys.argv)
+    pg.setConfigOptions(antialias=True)
+    gui = ScopeGui(BenchDriver())
+    timeframe = gui.divtime * ScopeGui._time_divs
+    decimator = gui._decimator
+    budget = gui._paint.budget
+
+    print("{:>8s} {:>12s} {:>12s}".format("samples", "full fps", "envelope fps"))
+    for samples in SAMPLES:
+        frames = frames_make(samples, timeframe)
+
+        gui._decimator = NoDecimation()
+        gui._paint.budget = float("inf")  # antialiasing stays on
+        full = fps(app, gui, frames)
+
+        gui._decimator = decimator
+        gui._paint.budget = budget
+        envelope = fps(app, gui, frames)
+
+        print("{:8d} {:12.1f} {:12.1f}".format(samples, full, envelope))
+
+
+if __name__ == "__main__":
+    bench_envelope()
+    print()
+    bench_scheduler()
+    print()
+    bench_widget()
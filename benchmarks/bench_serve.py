@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# Frame server over loopback: frames per second each of N client processes
+# receives from a synthetic source running as fast as it can, and what the
+# server had to drop for them
+
+import asyncio
+import multiprocessing
+import sys
+from time import perf_counter, sleep, time
+
+import numpy as np
+
+from gruseloskop.driver import Config, FrameData, UnoDriver
+from gruseloskop.net import FrameServer, NetDriver
+
+CLIENTS = [1, 2, 4, 8, 16]
+DURATION = 3.0  # s per measurement
+
+
+class BenchSource:
+    # stands in for an AsyncUnoDriver, hands out the same frame over and over
+
+    def __init__(self):
+        samples = UnoDriver._chan_samples
+        time0, time1, spl_rate = UnoDriver._timebase(1)
+        codes = np.random.randint(0, 0x100, (2, samples)).astype(np.uint8)
+        self.frame = FrameData(time0, time1, codes, True, spl_rate, UnoDriver._vref)
+        self.frame.config = Config()
+
+    async def configure(self, config):
+        pass
+
+    async def frames(self):
+        while True:
+            self.frame.timestamp = time()
+            yield self.frame
+            await asyncio.sleep(0)  # let the clients' senders run
+
+
+def client_run(port, start, results):
+    drv = NetDriver("127.0.0.1", port, queue_size=64)
+    while drv.get_frame(1.0) is None:
+        pass
+    while perf_counter() < start:
+        drv.get_frame(0.1)
+    frames = 0
+    while perf_counter() < start + DURATION:
+        if drv.get_frame(0.1) is not None:
+            frames += 1
+    results.put((frames, drv.server_dropped))
+    drv.close()
+
+
+async def measure(count):
+    server = FrameServer(BenchSource(), "127.0.0.1", 0)
+    await server.start()
+    results = multiprocessing.Queue()
+    start = perf_counter() + 2.0  # all clients connected by then
+    clients = [
+        multiprocessing.Process(target=client_run, args=(server.port, start, results))
+        for _ in range(count)
+    ]
+    for client in clients:
+        client.start()
+    while any(client.is_alive() for client in clients):
+        await asyncio.sleep(0.1)
+    await server.close()
+
+    frames, dropped = zip(*(results.get() for _ in clients))
+    return np.mean(frames) / DURATION, sum(dropped)
+
+
+if __name__ == "__main__":
+    print("numpy {}, python {}".format(np.__version__, sys.version.split()[0]))
+    size = FrameData.packet_size(UnoDriver._chan_samples)
+    for count in CLIENTS:
+        fps, dropped = asyncio.run(measure(count))
+        print(
+            "{:3d} clients {:8.0f} fps each {:8.1f} MB/s total {:8d} dropped".format(
+                count, fps, fps * count * size / 1e6, dropped
+            )
+        )
+        sleep(0.2)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# Spectrum path throughput in frames per second: a naive per frame FFT against the
+# analyzer for growing batches and each averaging mode, then the worker thread fed
+# like the GUI does it
+
+import sys
+from time import perf_counter, sleep
+
+import numpy as np
+
+from gruseloskop.driver import FrameData, UnoDriver
+from gruseloskop.spectrum import Averaging, SpectrumAnalyzer, SpectrumWorker
+
+FRAMES = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+BATCHES = [1, 8, 32, 128]
+
+
+def frames_make():
+    samples = UnoDriver._chan_samples
+    time0, time1, spl_rate = UnoDriver._timebase(1)
+    codes = np.random.randint(0, 0x100, (64, 2, samples)).astype(np.uint8)
+    return [FrameData(time0, time1, c, True, spl_rate, UnoDriver._vref) for c in codes]
+
+
+def naive_rate(frames):
+    # what a straightforward implementation would do for every frame
+    start = perf_counter()
+    for i in range(FRAMES):
+        frame = frames[i % len(frames)]
+        window = np.hanning(frame.codes.shape[1])
+        spectrum = np.abs(np.fft.rfft(frame.volts * window, axis=-1)) ** 2
+        10 * np.log10(np.maximum(spectrum, 1e-20))
+    return FRAMES / (perf_counter() - start)
+
+
+def analyzer_rate(frames, batch, averaging):
+    analyzer = SpectrumAnalyzer("hann", averaging, 16)
+    codes = np.stack([f.codes for f in frames])
+    spl_rate = frames[0].spl_rate
+    start = perf_counter()
+    for i in range(0, FRAMES, batch):
+        pos = i % len(codes)
+        chunk = codes[pos : pos + batch]
+        if len(chunk) < batch:
+            chunk = codes[:batch]
+        analyzer.process(chunk, spl_rate)
+    return FRAMES / (perf_counter() - start)
+
+
+def worker_rate(frames):
+    # frames pushed as fast as the worker takes them, results taken in between
+    # like a render tick would
+    worker = SpectrumWorker(SpectrumAnalyzer("hann", Averaging.EXPONENTIAL, 16))
+    start = perf_counter()
+    for i in range(FRAMES):
+        while len(worker._queue) >= worker._queue.maxlen - 1:
+            sleep(0.0001)
+        worker.push(frames[i % len(frames)])
+        if i % 256 == 0:
+            worker.take()
+    while worker._queue:
+        sleep(0.001)
+    elapsed = perf_counter() - start
+    worker.close()
+    return FRAMES / elapsed, worker.dropped, worker.batches
+
+
+if __name__ == "__main__":
+    print("numpy {}, {} frames".format(np.__version__, FRAMES))
+    frames = frames_make()
+    print("{:24s} {:9.0f} fps".format("naive per frame", naive_rate(frames)))
+    print(
+        "{:24s}".format("")
+        + "".join("{:>14s}".format("batch {}".format(b)) for b in BATCHES)
+    )
+    for averaging in Averaging:
+        rates = [analyzer_rate(frames, b, averaging) for b in BATCHES]
+        print(
+            "{:24s}".format(averaging.name.lower())
+            + "".join("{:10.0f} fps".format(r) for r in rates)
+        )
+    rate, dropped, batches = worker_rate(frames)
+    print(
+        "{:24s} {:9.0f} fps, {} dropped, {:.1f} frames per batch".format(
+            "worker thread", rate, dropped, FRAMES / batches
+        )
+    )
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# Software trigger throughput in samples per second, per trigger kind and chunk size
+
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from gruseloskop.driver import TriggerEdge
+from gruseloskop.trigger import SoftTrigger, SoftTriggerConfig, TriggerKind
+
+SAMPLES = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+CHUNKS = [800, 8192, 65536]
+SPL_RATE = 38450.0
+
+KINDS = {
+    "edge": SoftTriggerConfig(),
+    "edge both": SoftTriggerConfig(edge=TriggerEdge.BOTH),
+    "pulse": SoftTriggerConfig(kind=TriggerKind.PULSE, width_max=2e-3),
+    "window": SoftTriggerConfig(kind=TriggerKind.WINDOW),
+}
+
+
+def stream_make():
+    # noisy 1 kHz square wave with some short glitches, like a signal under test
+    t = np.arange(SAMPLES)
+    wave = np.where(t % 38 < 19, 0xC0, 0x40) + np.random.normal(0, 3, SAMPLES)
+    wave[np.random.randint(0, SAMPLES, SAMPLES // 10000)] = 0xFF
+    codes = np.clip(wave, 0, 0xFF).astype(np.uint8)
+    return np.stack([codes, codes[::-1]])
+
+
+def rate(config, stream, chunk):
+    trigger = SoftTrigger(config, SPL_RATE)
+    frames = 0
+    start = perf_counter()
+    for pos in range(0, stream.shape[1], chunk):
+        frames += len(trigger.feed(stream[:, pos : pos + chunk]))
+    elapsed = perf_counter() - start
+    return stream.shape[1] / elapsed, frames
+
+
+if __name__ == "__main__":
+    stream = stream_make()
+    print("{} samples per channel".format(SAMPLES))
+    print(
+        "{:12s}".format("")
+        + "".join("{:>22s}".format("chunk {}".format(c)) for c in CHUNKS)
+    )
+    for name, config in KINDS.items():
+        results = [rate(config, stream, chunk) for chunk in CHUNKS]
+        print(
+            "{:12s}".format(name)
+            + "".join("{:10.1f} MS/s {:5d} fr".format(r / 1e6, f) for r, f in results)
+        )
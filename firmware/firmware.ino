@@ -1,17 +1,30 @@
 #include <TimerOne.h>
 
 #define N_SAMPLES 800
+#define N_CHUNK 16      //Samples per channel in a roll mode chunk
 
 #define ACQ_CLK_PIN 13  //Acquisition clock output here for external measurement
 #define SGEN_PIN 9      //Signal generator output
 
+#define PROTOCOL_VERSION 2
+#define HELLO_MAGIC 0xA5  //First byte of a link hello, config packets start with 0
+#define PACK_DELTA 1      //Link flags: packings the host can decode
+#define PACK_RLE 2
+
 
 typedef enum {
   TRIG_AUTO = 0,
   TRIG_NORM = 1,
   TRIG_STOP = 2,
+  TRIG_ROLL = 3,  // sample continuously, send sequence-numbered chunks
 } ETrigMode;
 
+typedef enum {
+  FMT_RAW = 0,    // a0 a1 as is
+  FMT_DELTA = 1,  // per channel first sample, then deltas as signed nibbles
+  FMT_RLE = 2,    // (count, value) pairs over a0 followed by a1
+} EPackFormat;
+
 typedef enum {
   EDGE_RISING = 0,
   EDGE_FALLING = 1,
@@ -25,6 +38,13 @@ struct {
   uint8_t a1[N_SAMPLES];
 } out;
 
+struct {
+  uint8_t sync[4] = { 0x00, 0x00, 0xFF, 0xFE };
+  uint8_t seq = 0;                  // counts dropped chunks too, host sees gaps
+  uint8_t a0[N_CHUNK];
+  uint8_t a1[N_CHUNK];
+} chunk;
+
 struct {
   uint8_t sync = 0;
   uint8_t trig_mode = TRIG_STOP;        // dont use enum here to ensure 8bit
@@ -35,6 +55,15 @@ struct {
   uint16_t sgen_period_100us = 0;
 } cfg;
 
+const uint32_t bauds[] = { 115200, 250000, 500000, 1000000 };
+#define N_BAUDS (sizeof(bauds) / sizeof(bauds[0]))
+
+struct {
+  uint8_t version = 1;  // plain packets at 115200 until the host says hello
+  uint8_t baud = 0;
+  uint8_t flags = 0;
+} link;
+
 
 uint8_t adc_read_last( uint8_t next_channel )
 {
@@ -62,19 +91,101 @@ void signal_gen_update() {
 }
 
 
+void send_packed() {
+  // packed in the output stream, there is no RAM for a second buffer
+  const uint8_t* s = out.a0;  // a1 follows right after
+  uint16_t runs = 0;
+  uint8_t run = 0;
+  bool delta_ok = true;
+  for (uint16_t i = 0; i < 2 * N_SAMPLES; ++i) {
+    if (run == 0 || s[i] != s[i-1] || run == 255) {
+      ++runs;
+      run = 0;
+    }
+    ++run;
+    if (i != 0 && i != N_SAMPLES) {  // deltas stay within a channel
+      int16_t d = (int16_t)s[i] - s[i-1];
+      if (d < -8 || d > 7)
+        delta_ok = false;
+    }
+  }
+
+  uint8_t fmt = FMT_RAW;
+  uint16_t size = 2 * N_SAMPLES;
+  if ((link.flags & PACK_DELTA) && delta_ok && 2 * (1 + N_SAMPLES / 2) < size) {
+    fmt = FMT_DELTA;
+    size = 2 * (1 + N_SAMPLES / 2);
+  }
+  if ((link.flags & PACK_RLE) && 2 * runs < size) {
+    fmt = FMT_RLE;
+    size = 2 * runs;
+  }
+
+  uint8_t header[] = { 0x00, 0x00, 0xFF, 0xFC, out.triggered, fmt,
+                       (uint8_t)size, (uint8_t)(size >> 8) };
+  Serial.write(header, sizeof(header));
+
+  if (fmt == FMT_RAW) {
+    Serial.write(s, 2 * N_SAMPLES);
+  } else if (fmt == FMT_DELTA) {
+    for (uint8_t c = 0; c < 2; ++c) {
+      const uint8_t* x = s + c * N_SAMPLES;
+      Serial.write(x[0]);
+      for (uint16_t i = 1; i < N_SAMPLES; i += 2) {
+        uint8_t lo = (x[i] - x[i-1]) & 0x0F;
+        uint8_t hi = i + 1 < N_SAMPLES ? (x[i+1] - x[i]) & 0x0F : 0;
+        Serial.write(lo | (hi << 4));
+      }
+    }
+  } else {
+    run = 0;
+    for (uint16_t i = 0; i < 2 * N_SAMPLES; ++i) {
+      if (run != 0 && (s[i] != s[i-1] || run == 255)) {
+        Serial.write(run);
+        Serial.write(s[i-1]);
+        run = 0;
+      }
+      ++run;
+    }
+    Serial.write(run);
+    Serial.write(s[2 * N_SAMPLES - 1]);
+  }
+}
+
 void send_packet() {  
-  Serial.write((char*)&out, sizeof(out));  
+  if (link.flags)
+    send_packed();
+  else
+    Serial.write((char*)&out, sizeof(out));  
   Serial.flush();  // avoid jitter generated by buffering interrupts later
 }
 
+void handshake(const uint8_t* hello) {
+  // A5 'G' 'S' version baud flags: reply at the old rate, then switch
+  link.version = min(hello[3], PROTOCOL_VERSION);
+  link.baud = hello[4] < N_BAUDS ? hello[4] : 0;
+  link.flags = hello[5] & (PACK_DELTA | PACK_RLE);
+
+  uint8_t reply[] = { 0x00, 0x00, 0xFF, 0xFD, link.version, link.baud, link.flags };
+  Serial.write(reply, sizeof(reply));
+  Serial.flush();
+  Serial.end();
+  Serial.begin(bauds[link.baud]);
+}
+
 bool recv_config() {
   if (Serial.available() >= sizeof(cfg)) {
-    Serial.readBytes((char*)&cfg, sizeof(cfg));
-    if (cfg.sync != 0) {
+    uint8_t in[sizeof(cfg)];
+    Serial.readBytes((char*)in, sizeof(in));
+    if (in[0] == HELLO_MAGIC && in[1] == 'G' && in[2] == 'S') {
+      handshake(in);
+      return true;  // whatever was in progress went out at the old rate
+    } else if (in[0] != 0) {
       // something went wrong: force client to reset by messing up his sync
       Serial.write(0xAA);
       send_packet();
     } else {
+      memcpy(&cfg, in, sizeof(cfg));
       signal_gen_update();
       return true;
     }
@@ -87,7 +198,7 @@ void toggle_acq_clock_output() {
   digitalWrite(ACQ_CLK_PIN, state = !state);
 }
 
-void wait_trigger() {    
+bool wait_trigger() {    
   uint32_t auto_countdown = 3UL * (cfg.spl_div + 1UL) * N_SAMPLES;
 
   uint8_t last = adc_read_last(cfg.trig_chan); // dummy read to set next channel
@@ -98,6 +209,8 @@ void wait_trigger() {
     cur = adc_read_last(cfg.trig_chan);
 
     if (recv_config()) {
+      if (cfg.trig_mode == TRIG_ROLL)
+        return false;  // no more blocks
       // config changed, this took some time - reset to avoid jitter      
       cur = adc_read_last(cfg.trig_chan);
       continue;
@@ -112,10 +225,11 @@ void wait_trigger() {
     bool rising = (last < cfg.trig_level) && (cur >= cfg.trig_level);
     bool falling = (last > cfg.trig_level) && (cur <= cfg.trig_level);
     if (rising && (cfg.trig_edge == EDGE_RISING || cfg.trig_edge == EDGE_BOTH))
-      break;
+      return true;
     if (falling && (cfg.trig_edge == EDGE_FALLING || cfg.trig_edge == EDGE_BOTH))
-      break;
+      return true;
   }
+  return true;
 }
 
 bool capture_run() {    
@@ -140,6 +254,31 @@ bool capture_run() {
   return true;
 }
 
+void roll_run() {
+  adc_read_last(0);  // dummy read while setting 0 as next channel
+
+  while (true) {
+    for (uint8_t i=0; i<N_CHUNK; ++i) {
+      uint16_t div_cnt = cfg.spl_div;
+      do {
+        chunk.a0[i] = adc_read_last(1);
+        chunk.a1[i] = adc_read_last(0);
+
+        // new rate or mode: start over from loop()
+        if (recv_config())
+          return;
+      } while (div_cnt-- > 0);
+
+      toggle_acq_clock_output();
+    }
+
+    // never block sampling for the UART: a chunk that doesn't fit is dropped
+    if (Serial.availableForWrite() >= (int)sizeof(chunk))
+      Serial.write((char*)&chunk, sizeof(chunk));
+    ++chunk.seq;
+  }
+}
+
 void setup() {
   pinMode(ACQ_CLK_PIN, OUTPUT);
   
@@ -157,7 +296,11 @@ void setup() {
 }
 
 void loop() {
-  wait_trigger();
-  if (capture_run())
+  if (cfg.trig_mode == TRIG_ROLL) {
+    roll_run();
+    return;
+  }
+
+  if (wait_trigger() && capture_run())
     send_packet();
 }
@@ -0,0 +1,145 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from .driver import FramePool
+
+
+def _divide(values, divisor):
+    # in place, rounding down. Shifts where they do, integer division is slow.
+    if divisor & (divisor - 1) == 0:
+        np.right_shift(values, divisor.bit_length() - 1, out=values)
+    else:
+        np.floor_divide(values, divisor, out=values)
+
+
+class Acquisition:
+    # Host side acquisition modes trading frame or sample rate for resolution
+    # finer than the 8 bit codes (vref / 255, about 20 mV):
+    # - averaging of triggered frames, separately per channel (`average` frames
+    #   for A0 and A1, 1 for none). The first N frames weigh the same, after that
+    #   each new one weighs 1/N (exponential, like the average mode of bench
+    #   scopes), so memory and time per frame don't depend on N.
+    # - hi-res: boxcar decimation, the mean of each block of `hires` consecutive
+    #   samples of both channels, at their mean time.
+    # Both run on integers: block sums of the codes go into a fixed-point running
+    # mean. Frames handed out are pooled, their volts hold the full resolution,
+    # their codes the rounded values. Untriggered frames are not averaged, they
+    # are shown as they are until there is an average. Changing timebase or
+    # trigger settings starts the average over.
+
+    _frac_bits = 16  # of the running mean, block sums of up to 32 samples fit
+    _pool_size = 4
+    _times_maxsize = 16
+
+    def __init__(self, average=(1, 1), hires=1):
+        self._pool = None
+        self._times = OrderedDict()
+        self.configure(average, hires)
+
+    def configure(self, average=(1, 1), hires=1):
+        if not 1 <= hires <= 32:
+            raise ValueError("Hi-res blocks of 1 to 32 samples are supported")
+        self.average = tuple(int(n) for n in average)
+        self.hires = hires
+        self._times.clear()
+        self.reset()
+
+    def reset(self):
+        self.frames = 0  # in the average so far
+        self.skipped = 0  # untriggered
+        self._mean = None
+        self._source = None  # time axis and config the average belongs to
+
+    @property
+    def active(self):
+        return self.hires > 1 or max(self.average) > 1
+
+    def process(self, frame):
+        # frame with the modes applied, None while an average is held instead of
+        # an untriggered frame
+        if not self.active:
+            return frame
+        averaging = max(self.average) > 1
+        if averaging and not frame.triggered:
+            self.skipped += 1
+            return None if self.frames else frame
+
+        source = (frame.time0, frame.config)
+        if (
+            self._source is None
+            or source[0] is not self._source[0]
+            or source[1] != self._source[1]
+            or not averaging
+        ):
+            self.frames = 0
+            self._source = source
+
+        samples = frame.codes.shape[1] // self.hires
+        if self._mean is None or self._mean.shape[1] != samples:
+            self._mean = np.zeros((2, samples), np.int32)
+            self._scratch = np.empty((2, samples), np.int32)
+            self._volts = np.empty((2, samples), np.float32)
+            self.frames = 0
+
+        # block sums in fixed point, then mean += (sums - mean) / min(frames, N)
+        if self.hires == 1:
+            np.copyto(self._scratch, frame.codes)
+        else:
+            blocks = frame.codes[:, : samples * self.hires].reshape((2, samples, -1))
+            np.sum(blocks, axis=-1, dtype=np.int32, out=self._scratch)
+        self._scratch <<= Acquisition._frac_bits
+        self.frames += 1
+        if self.frames == 1:
+            self._mean[...] = self._scratch
+        else:
+            self._scratch -= self._mean
+            for chan, count in enumerate(self.average):
+                weight = min(count, self.frames)
+                if weight > 1:
+                    self._scratch[chan] += weight // 2  # round to nearest
+                    _divide(self._scratch[chan], weight)
+            self._mean += self._scratch
+        return self._frame_make(frame, samples)
+
+    def _frame_make(self, frame, samples):
+        if self._pool is None or self._pool_key != (samples, frame.vref):
+            self._pool = FramePool(Acquisition._pool_size, samples, frame.vref)
+            self._pool_key = (samples, frame.vref)
+
+        out = self._pool.acquire()
+        unit = self.hires << Acquisition._frac_bits  # one code
+        np.add(self._mean, unit // 2, out=self._scratch)
+        _divide(self._scratch, unit)
+        np.copyto(out.codes, self._scratch, casting="unsafe")
+        # cast and scale in two steps, like FrameData.volts
+        np.copyto(self._volts, self._mean)
+        self._volts *= np.float32(frame.vref / 0xFF / unit)
+        out.set_volts(self._volts)
+
+        out.time0 = self._time(frame.time0, samples)
+        out.time1 = self._time(frame.time1, samples)
+        out.spl_rate = frame.spl_rate / self.hires
+        out.triggered = frame.triggered
+        out.timestamp = frame.timestamp
+        out.config = frame.config
+        return out
+
+    def _time(self, time, samples):
+        # block centres, shared by the frames of a time axis. Axes are evenly
+        # spaced, their ends tell them apart: in roll mode each frame comes with
+        # an axis of its own.
+        if self.hires == 1:
+            return time
+        key = (len(time), float(time[0]), float(time[-1]), samples)
+        centres = self._times.get(key)
+        if centres is not None:
+            self._times.move_to_end(key)
+            return centres
+
+        centres = time[: samples * self.hires].reshape((samples, -1)).mean(axis=1)
+        centres.flags.writeable = False
+        self._times[key] = centres
+        if len(self._times) > Acquisition._times_maxsize:
+            self._times.popitem(last=False)
+        return centres
@@ -0,0 +1,83 @@
+from functools import lru_cache
+
+import numpy as np
+
+# name: label, in display order. None leaves A1 where it was sampled.
+alignment_info = {
+    None: "Off",
+    "linear": "Linear",
+    "sinc": "Windowed sinc",
+}
+
+
+@lru_cache(maxsize=32)
+def kernel(method, delay, taps=16):
+    # FIR taking a channel sampled `delay` samples late back onto the grid of the
+    # other one: y[k] = sum(h[i] * x[k - i + taps // 2 - 1]). Linear interpolation
+    # is the two tap case. Sinc kernels use a Blackman window and are normalized to
+    # unity gain at DC. Shared by all frames of the same rate, hence read-only.
+    if method == "linear":
+        h = np.array([1.0 - delay, delay])
+    elif method == "sinc":
+        x = np.arange(taps) - (taps // 2 - 1) - delay
+        phase = 2 * np.pi * x / taps
+        window = 0.42 + 0.5 * np.cos(phase) + 0.08 * np.cos(2 * phase)
+        h = np.sinc(x) * window
+        h /= h.sum()
+    else:
+        raise ValueError("Unknown alignment method: {}".format(method))
+    h = h.astype(np.float32)
+    h.flags.writeable = False
+    return h
+
+
+class ChannelAligner:
+    # Resamples A1 onto A0's time axis, so samples of both channels can be
+    # paired up (X-Y, A1-A0) as if taken at the same instant. The delay comes
+    # from the frame's own time axes: frames already on a common grid are passed
+    # through as they are.
+
+    def __init__(self, method="linear", taps=16):
+        self.method = method
+        self.taps = taps
+        self._padded = None
+
+    @staticmethod
+    def delay(frame):
+        # of A1 behind A0, in samples
+        return ChannelAligner.axes_delay(frame.time0, frame.time1)
+
+    @staticmethod
+    def axes_delay(time0, time1):
+        if time0 is time1 or len(time0) < 2:
+            return 0.0
+        return float((time1[0] - time0[0]) / (time0[1] - time0[0]))
+
+    def copy(self):
+        # same settings, own buffers (e.g. for another thread)
+        return ChannelAligner(self.method, self.taps)
+
+    def align(self, frame):
+        # A1 volts at the times of A0
+        delay = ChannelAligner.delay(frame)
+        if self.method is None or delay == 0.0:
+            return frame.data1
+        return self.resample(frame.data1, delay)
+
+    def resample(self, volts, delay):
+        # volts (..., samples) sampled `delay` samples late, at the sample times
+        h = kernel(self.method, round(delay, 9), self.taps)
+        left = len(h) // 2
+        samples = volts.shape[-1]
+        shape = volts.shape[:-1] + (samples + len(h) - 1,)
+        if self._padded is None or self._padded.shape != shape:
+            self._padded = np.empty(shape, np.float32)
+
+        # the first and last samples are repeated beyond the ends
+        padded = self._padded
+        padded[..., left : left + samples] = volts
+        padded[..., :left] = volts[..., :1]
+        padded[..., left + samples :] = volts[..., -1:]
+
+        windows = np.lib.stride_tricks.sliding_window_view(padded, len(h), axis=-1)
+        return windows @ h[::-1]
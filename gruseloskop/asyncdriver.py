@@ -0,0 +1,177 @@
+import asyncio
+from functools import partial
+
+from .driver import UnoDriver, Config
+
+
+class Subscription:
+    # Frames for one consumer, an async iterator. A full queue drops its oldest
+    # frame, unless `block`: then the driver stops handing out frames to anyone
+    # until there is room again or it is closed. Its own bounded queue drops the
+    # oldest frames meanwhile, the board can't be paused.
+
+    def __init__(self, driver, maxsize, block):
+        self._driver = driver
+        self._queue = asyncio.Queue(maxsize)
+        self.block = block
+        self.dropped = 0
+        self.closed = False
+        self._closing = asyncio.Event()  # wakes a driver waiting for room
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.closed and self._queue.empty():
+            raise StopAsyncIteration
+        frame = await self._queue.get()
+        if frame is None:
+            raise StopAsyncIteration
+        return frame
+
+    async def _put(self, frame):
+        if self.closed:
+            return
+        if self.block and self._queue.full():
+            # until there is room or the subscriber goes away
+            put = asyncio.ensure_future(self._queue.put(frame))
+            closing = asyncio.ensure_future(self._closing.wait())
+            await asyncio.wait((put, closing), return_when=asyncio.FIRST_COMPLETED)
+            put.cancel()
+            closing.cancel()
+            return
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(frame)
+
+    def close(self):
+        # ends the iteration once the frames already queued are consumed
+        if self.closed:
+            return
+        self.closed = True
+        self._closing.set()
+        self._driver._subscriptions.discard(self)
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(None)
+
+
+class AsyncUnoDriver:
+    # asyncio front end of UnoDriver for headless services, needs neither Qt nor
+    # pyqtgraph. The serial port is read in the driver's own thread, the event
+    # loop is woken for each decoded frame and never blocks on I/O. Frames are
+    # fanned out to any number of subscribers:
+    #
+    #   async with AsyncUnoDriver(port) as drv:
+    #       await drv.configure(Config(timeframe=0.01))
+    #       async for frame in drv.frames():
+    #           ...
+    #
+    # Frames come from a pool with room for the subscriptions' queues and a few
+    # frames in work, copy those kept for longer (FrameData.copy()).
+
+    def __init__(self, port, **driver_kwargs):
+        self._port = port
+        self._driver_kwargs = driver_kwargs
+        self._driver = None
+        self._loop = None
+        self._ready = None
+        self._dispatcher = None
+        self._subscriptions = set()
+        self._config_waiters = []
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    @property
+    def driver(self):
+        # the UnoDriver doing the work, for its counters
+        return self._driver
+
+    @property
+    def dropped_frames(self):
+        return self._driver.dropped_frames
+
+    async def open(self):
+        self._loop = asyncio.get_running_loop()
+        self._ready = asyncio.Event()
+        # opening resets the board and waits for it, not in the event loop
+        self._driver = await self._loop.run_in_executor(
+            None, partial(UnoDriver, self._port, **self._driver_kwargs)
+        )
+        self._driver.on_frame = self._on_frame
+        self._driver.on_config = self._on_config
+        reserved = sum(s._queue.maxsize for s in self._subscriptions)
+        if reserved:
+            self._driver.reserve_frames(reserved)
+        self._dispatcher = self._loop.create_task(self._dispatch())
+
+    async def close(self):
+        if self._driver is None:
+            return
+        self._dispatcher.cancel()
+        try:
+            await self._dispatcher
+        except asyncio.CancelledError:
+            pass
+        for subscription in list(self._subscriptions):
+            subscription.close()
+        for _, future in self._config_waiters:
+            future.cancel()
+        self._config_waiters.clear()
+
+        driver, self._driver = self._driver, None
+        driver.on_frame = driver.on_config = None
+        await self._loop.run_in_executor(None, driver.close)
+
+    async def configure(self, config):
+        # returns once the config went out to the board (or was superseded)
+        assert isinstance(config, Config)
+        if not self._driver.set_config(config):
+            return
+        future = self._loop.create_future()
+        self._config_waiters.append((config, future))
+        await future
+
+    def frames(self, maxsize=4, block=False):
+        subscription = Subscription(self, maxsize, block)
+        self._subscriptions.add(subscription)
+        if self._driver is not None:
+            self._driver.reserve_frames(maxsize)
+        return subscription
+
+    def _on_frame(self):
+        # reader thread
+        self._loop.call_soon_threadsafe(self._ready.set)
+
+    def _on_config(self, config):
+        # reader thread
+        self._loop.call_soon_threadsafe(self._config_sent, config)
+
+    def _config_sent(self, config):
+        # only the newest pending config is sent, those set before it are done too
+        done = 0
+        for i, (waiting, _) in enumerate(self._config_waiters):
+            if waiting == config:
+                done = i + 1
+        for _, future in self._config_waiters[:done]:
+            if not future.done():
+                future.set_result(None)
+        del self._config_waiters[:done]
+
+    async def _dispatch(self):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            while True:
+                frame = self._driver.get_frame(0)
+                if frame is None:
+                    break
+                for subscription in list(self._subscriptions):
+                    await subscription._put(frame)
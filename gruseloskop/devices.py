@@ -0,0 +1,278 @@
+import os
+import threading
+from collections import deque
+from dataclasses import dataclass
+from time import sleep, monotonic, time
+
+import numpy as np
+
+from .driver import UnoDriver, FrameQueue
+from .record import CaptureWriter
+
+
+@dataclass
+class DeviceStats:
+    port: str
+    frames: int = 0
+    fps: float = 0.0
+    dropped_frames: int = 0
+    resyncs: int = 0
+    errors: int = 0  # serial errors, the driver reconnects after each
+    last_error: str = None
+    link_baud: int = 0
+
+
+class MultiFrame:
+    # One frame per device, acquired at about the same time. Devices that had
+    # nothing within the merge window are None. Channels are numbered device by
+    # device: A0, A1 of the first board, A0, A1 of the second and so on.
+    __slots__ = ("frames", "timestamp", "skew")
+
+    def __init__(self, frames):
+        self.frames = frames
+        stamps = [frame.timestamp for frame in frames if frame is not None]
+        self.timestamp = min(stamps)
+        self.skew = max(stamps) - self.timestamp  # arrival spread within the group
+
+    @property
+    def complete(self):
+        return all(frame is not None for frame in self.frames)
+
+    @property
+    def volts(self):
+        # all channels as rows, NaN for devices missing from this group
+        present = next(frame for frame in self.frames if frame is not None)
+        volts = np.full(
+            (2 * len(self.frames), present.codes.shape[1]), np.nan, dtype=np.float32
+        )
+        for i, frame in enumerate(self.frames):
+            if frame is not None:
+                volts[2 * i : 2 * i + 2] = frame.volts
+        return volts
+
+
+class DeviceManager:
+    # Opens one UnoDriver per port, each reading in its own thread, and merges
+    # their frames by arrival time: frames closer than the merge window (half a
+    # screen, no board delivers faster than that) form one MultiFrame. A group is
+    # handed out once every device contributed or no late frame can show up
+    # anymore. Offers the same interface as a single UnoDriver, configs go to all
+    # boards.
+
+    _poll_delay_ms = 5
+    _merge_window = 0.005  # s, at least, for arrival jitter
+    _stats_interval = 0.2  # s
+
+    def __init__(
+        self,
+        ports,
+        queue_size=UnoDriver._queue_size,
+        merge_window=_merge_window,
+        **driver_kwargs
+    ):
+        self.ports = list(ports)
+        self.history = None  # frames of different boards don't fit one history
+        self._merge_window = merge_window
+        self._last_config = None
+
+        # each driver resets its board on open, that is done for all at once
+        self.drivers = [None] * len(self.ports)
+        errors = []
+
+        def driver_open(i):
+            try:
+                self.drivers[i] = UnoDriver(
+                    self.ports[i], queue_size=queue_size, **driver_kwargs
+                )
+            except Exception as e:
+                errors.append(e)
+
+        openers = [
+            threading.Thread(target=driver_open, args=(i,))
+            for i in range(len(self.ports))
+        ]
+        for opener in openers:
+            opener.start()
+        for opener in openers:
+            opener.join()
+        if errors:
+            for driver in self.drivers:
+                if driver is not None:
+                    driver.close()
+            raise errors[0]
+        for driver in self.drivers:
+            # frames wait for their group, then in the queue of groups
+            driver.reserve_frames(queue_size + UnoDriver._held_frames)
+        self._pending = [deque() for _ in self.drivers]
+        self._frames = FrameQueue(queue_size)
+        self._upd_callback = None
+        self._poll_timer = None
+
+        self._stats = [DeviceStats(port) for port in self.ports]
+        self._stats_frames = [0] * len(self.ports)
+        self._stats_time = monotonic()
+        self.groups = 0
+        self.incomplete_groups = 0
+
+        self._running = True
+        self._merger = threading.Thread(
+            target=self._merger_run, name="gruseloskop-merger", daemon=True
+        )
+        self._merger.start()
+
+    @property
+    def dropped_frames(self):
+        return self._frames.dropped + sum(d.dropped_frames for d in self.drivers)
+
+    @property
+    def config_dropped_frames(self):
+        return sum(d.config_dropped_frames for d in self.drivers)
+
+    @property
+    def resyncs(self):
+        return sum(d.resyncs for d in self.drivers)
+
+    def device_stats(self):
+        # per board, rates are updated at most every _stats_interval
+        now = monotonic()
+        elapsed = now - self._stats_time
+        rates = elapsed >= DeviceManager._stats_interval
+        for i, (stats, driver) in enumerate(zip(self._stats, self.drivers)):
+            if rates:
+                stats.fps = (stats.frames - self._stats_frames[i]) / elapsed
+                self._stats_frames[i] = stats.frames
+            stats.dropped_frames = driver.dropped_frames
+            stats.resyncs = driver.resyncs
+            stats.errors = driver.serial_errors
+            stats.last_error = driver.last_error
+            stats.link_baud = driver.link_baud
+        if rates:
+            self._stats_time = now
+        return self._stats
+
+    def close(self):
+        self._running = False
+        if self._poll_timer is not None:
+            self._poll_timer.stop()
+        if self._merger.is_alive():
+            self._merger.join()
+        for driver in self.drivers:
+            driver.close()
+
+    def set_config(self, config):
+        self._last_config = config
+        for driver in self.drivers:
+            driver.set_config(config)
+
+    def set_update_callback(self, callback):
+        # newest group is delivered in the Qt thread, needs a running event loop
+        from pyqtgraph.Qt import QtCore
+
+        self._upd_callback = callback
+        if self._poll_timer is None:
+            self._poll_timer = QtCore.QTimer()
+            self._poll_timer.timeout.connect(self._poll)
+            self._poll_timer.start(DeviceManager._poll_delay_ms)
+
+    def get_frame(self, timeout=None):
+        # oldest merged group, for consumers that need every one without Qt
+        return self._frames.get(timeout)
+
+    def _window(self):
+        # boards trigger on their own, a slow timebase spreads them further apart
+        if self._last_config is None:
+            return self._merge_window
+        return max(self._merge_window, self._last_config.timeframe / 2)
+
+    def _merge(self, now):
+        window = self._window()
+        # a partner of the oldest frame has arrived by then, if at all
+        late = window + 2 * DeviceManager._poll_delay_ms / 1000
+        groups = []
+        while True:
+            heads = [pending[0].timestamp for pending in self._pending if pending]
+            if not heads:
+                break
+            first = min(heads)
+            group = [
+                (
+                    pending[0]
+                    if pending and pending[0].timestamp - first <= window
+                    else None
+                )
+                for pending in self._pending
+            ]
+            complete = all(frame is not None for frame in group)
+            if not complete and now - first < late:
+                break  # wait for the others
+
+            for pending, frame in zip(self._pending, group):
+                if frame is not None:
+                    pending.popleft()
+            groups.append(MultiFrame(group))
+            self.groups += 1
+            self.incomplete_groups += not complete
+        return groups
+
+    def _merger_run(self):
+        while self._running:
+            for i, driver in enumerate(self.drivers):
+                while True:
+                    frame = driver.get_frame(0)
+                    if frame is None:
+                        break
+                    self._pending[i].append(frame)
+                    self._stats[i].frames += 1
+
+            for group in self._merge(time()):
+                self._frames.put(group)
+            sleep(DeviceManager._poll_delay_ms / 1000)
+
+    def _poll(self):
+        group = self._frames.latest()
+        if group is not None and self._upd_callback is not None:
+            self._upd_callback(group)
+
+
+class DeviceCaptureWriter:
+    # Records merged groups into one capture file per device, "<file>.devN.grc",
+    # rotated independently. Records keep their own arrival timestamps, so the
+    # files line up again when read back.
+
+    def __init__(self, path, devices, *args, **kwargs):
+        stem, ext = os.path.splitext(path)
+        self._writers = [
+            CaptureWriter("{}.dev{}{}".format(stem, i, ext), *args, **kwargs)
+            for i in range(devices)
+        ]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def flush_interval(self):
+        return self._writers[0].flush_interval
+
+    @property
+    def files(self):
+        return [path for writer in self._writers for path in writer.files]
+
+    @property
+    def frames_written(self):
+        return sum(writer.frames_written for writer in self._writers)
+
+    def write(self, group):
+        for writer, frame in zip(self._writers, group.frames):
+            if frame is not None:
+                writer.write(frame)
+
+    def flush(self):
+        for writer in self._writers:
+            writer.flush()
+
+    def close(self):
+        for writer in self._writers:
+            writer.close()
@@ -1,22 +1,31 @@
 from dataclasses import dataclass
 from enum import IntEnum
-from serial import Serial
+from collections import deque
+from functools import lru_cache
+from serial import Serial, SerialException
 from serial.tools import list_ports
-from pyqtgraph.Qt import QtCore
 import numpy as np
-from time import sleep
+import threading
+from time import sleep, monotonic, time
+
+from . import link
+from .protocol import PacketFramer
+from .stream import StreamBuffer, stream_syncword, chunk_size
 
 
 class TriggerMode(IntEnum):
     AUTO = 0
     NORM = 1
     STOP = 2
+    ROLL = 3  # stream continuously, newest samples on the right
+
 
 class TriggerEdge(IntEnum):
     RAISING = 0
     FALLING = 1
     BOTH = 2
 
+
 @dataclass
 class Config:
     trig_mode: TriggerMode = TriggerMode.AUTO
@@ -27,14 +36,37 @@ class Config:
     sgen_freq: float = 0
 
 
-@dataclass
 class FrameData:
-    time0: np.ndarray
-    time1: np.ndarray
-    data0: np.ndarray
-    data1: np.ndarray
-    triggered: bool
-    spl_rate: float
+    # Raw 8-bit samples of both channels, volts are only computed when asked for.
+    # Time axes are shared between all frames of the same timebase.
+    __slots__ = (
+        "time0",
+        "time1",
+        "codes",
+        "triggered",
+        "spl_rate",
+        "vref",
+        "timestamp",
+        "config",
+        "stream_end",
+        "_volts",
+        "_volts_valid",
+        "_volts_fine",
+    )
+
+    def __init__(self, time0, time1, codes, triggered, spl_rate, vref=5.0):
+        self.time0 = time0
+        self.time1 = time1
+        self.codes = codes
+        self.triggered = triggered
+        self.spl_rate = spl_rate
+        self.vref = vref
+        self.timestamp = 0.0  # arrival time, seconds since epoch
+        self.config = None  # Config in effect while captured
+        self.stream_end = None  # roll snapshots: samples streamed up to the last
+        self._volts = None
+        self._volts_valid = False
+        self._volts_fine = False
 
     @staticmethod
     def packet_size(chan_samples):
@@ -42,20 +74,186 @@ class FrameData:
         aux_size = 1
         return header_size + aux_size + chan_samples * 2
 
+    def copy(self):
+        # a frame of its own, e.g. to keep a pooled one for longer
+        frame = FrameData(
+            self.time0,
+            self.time1,
+            self.codes.copy(),
+            self.triggered,
+            self.spl_rate,
+            self.vref,
+        )
+        frame.timestamp = self.timestamp
+        frame.config = self.config
+        frame.stream_end = self.stream_end
+        if self._volts_fine:
+            frame.set_volts(self._volts)
+        return frame
+
+    def invalidate(self):
+        # codes were rewritten in place
+        self._volts_valid = False
+        self._volts_fine = False
+
+    def set_volts(self, volts):
+        # finer than the codes can hold (e.g. averaged), the codes hold them rounded
+        if self._volts is None:
+            self._volts = np.empty(self.codes.shape, dtype=np.float32)
+        np.copyto(self._volts, volts)
+        self._volts_valid = True
+        self._volts_fine = True
+
+    @property
+    def fine(self):
+        # volts were set finer than the codes, use them rather than the codes
+        return self._volts_fine
+
+    @property
+    def volts(self):
+        if not self._volts_valid:
+            if self._volts is None:
+                self._volts = np.empty(self.codes.shape, dtype=np.float32)
+            # cast and scale in two steps, mixed-type ufuncs allocate cast buffers
+            np.copyto(self._volts, self.codes)
+            np.multiply(self._volts, np.float32(self.vref / 0xFF), out=self._volts)
+            self._volts_valid = True
+        return self._volts
+
+    @property
+    def data0(self):
+        return self.volts[0]
+
+    @property
+    def data1(self):
+        return self.volts[1]
+
+
+class FrameQueue:
+    # bounded hand-over between reader thread and consumer, oldest frames get dropped
+    def __init__(self, maxlen):
+        self._frames = deque(maxlen=maxlen)
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def __len__(self):
+        with self._cond:
+            return len(self._frames)
+
+    def put(self, frame):
+        with self._cond:
+            if len(self._frames) == self._frames.maxlen:
+                self.dropped += 1
+            self._frames.append(frame)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._frames, timeout):
+                return None
+            return self._frames.popleft()
+
+    def latest(self):
+        with self._cond:
+            if not self._frames:
+                return None
+            frame = self._frames.pop()
+            self.dropped += len(self._frames)
+            self._frames.clear()
+            return frame
+
+
+class FramePool:
+    # Ring of preallocated frames reused for decoding, in turn. A frame handed out
+    # is left alone until `size` more were acquired: size the pool for the queue
+    # it feeds plus what its consumers hold at a time (shown, plotted, in work).
+    # Whoever keeps frames for longer copies them or reserves room for them.
+
+    def __init__(self, size, chan_samples, vref):
+        self._chan_samples = chan_samples
+        self._vref = vref
+        self._entries = [self._frame_alloc() for _ in range(size)]
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        return len(self._entries)
+
+    def _frame_alloc(self):
+        codes = np.empty((2, self._chan_samples), dtype=np.uint8)
+        frame = FrameData(None, None, codes, False, 0.0, self._vref)
+        frame.volts  # pooled frames keep their volts buffer as well
+        return frame
+
+    def reserve(self, count):
+        # room for `count` more frames held at a time, e.g. by another queue. The
+        # new ones come next, the frames handed out keep their turn.
+        with self._lock:
+            fresh = [self._frame_alloc() for _ in range(count)]
+            self._entries[self._next : self._next] = fresh
+
+    def acquire(self):
+        with self._lock:
+            frame = self._entries[self._next]
+            self._next = (self._next + 1) % len(self._entries)
+        frame.invalidate()
+        return frame
+
+
+class FrameDecoder:
+    # Copies packet samples into pooled frames (time axes are left to the caller)
+
+    def __init__(self, chan_samples, vref, sync_size, pool_size):
+        self._chan_samples = chan_samples
+        self._sync_size = sync_size
+        self.pool = FramePool(pool_size, chan_samples, vref)
+
+    def decode(self, packet):
+        frame = self.pool.acquire()
+        frame.triggered = packet[self._sync_size] != 0
+
+        codes = np.frombuffer(
+            packet,
+            dtype=np.uint8,
+            count=2 * self._chan_samples,
+            offset=self._sync_size + 1,
+        ).reshape((2, self._chan_samples))
+        np.copyto(frame.codes, codes)
+        return frame
+
+    def decode_packed(self, packet):
+        # raises ValueError if the packet doesn't unpack to a whole frame
+        frame = self.pool.acquire()
+        frame.triggered = link.unpack(packet, frame.codes)
+        return frame
+
 
 class UnoDriver:
     _device_pid = 67
     _device_vid = 9025
     _poll_delay_ms = 5
-    _serial_baud = 115200
+    _serial_baud = 115200  # after reset, until a faster link is negotiated
+    _link_baud = 1000000
+    _hello_timeout = 0.3
+    _serial_timeout = 0.1
+    _serial_retry_delay = 1.0
+    _queue_size = 4
+    _held_frames = 8  # by consumers besides the queued ones: shown, plotted, in work
+    _config_rate = 10.0  # max config writes per second
+    _config_debounce = 0.05  # quiet time before a changed config is sent
 
     _vref = 5.0
     _chan_samples = 800
-    
+
     _sample_base_clk = 76900 // 2  # max sample rate with 2 channels
     _channel1_delay = 1.0 / 76900  # maximum theoretical rate between samples
+    _dummy_freq = 1234.5  # Hz, test signal in dummy mode
 
     _syncword = [0x00, 0x00, 0xFF, 0xFF]
+    _nak = 0xAA  # firmware got a bad config and wants to be reset
+    _resync_limit = 4  # packets without sync before resetting the board
+    _stream_max_rate = 4000  # roll mode samples/s per channel the UART can carry
 
     @staticmethod
     def find_devices():
@@ -63,85 +261,300 @@ class UnoDriver:
             if port.pid == UnoDriver._device_pid and port.vid == UnoDriver._device_vid:
                 yield port.device
 
-    def __init__(self, port):
+    def __init__(
+        self,
+        port,
+        queue_size=_queue_size,
+        config_rate=_config_rate,
+        history=None,
+        baud=_link_baud,
+        packing=True,
+    ):
         self._dummy_mode = port == "dummy"
+        self.history = history  # gets every acquired frame, even if never shown
+
+        # asked for, what the firmware agreed to is in link_baud and link_flags
+        self._baud = baud
+        self._packing = link.PACK_DELTA | link.PACK_RLE if packing else 0
+        self.link_baud = UnoDriver._serial_baud
+        self.link_flags = 0
+        self._link_failed = False
+        self._link_packets = 0
+        self.bad_packets = 0
 
         self._port = port
         self._ser = None
         self._upd_callback = None
         self._last_config = Config()
         self._config_queue = None
+        self._config_lock = threading.Lock()
+        self._config_interval = 1.0 / config_rate
+        self._config_changed_at = 0.0
+        self._config_pending_since = 0.0
+        self._config_sent_at = -self._config_interval
+        self._device_packet = None
+        self.config_writes = 0
+        self.config_dropped_frames = 0
+        self.serial_errors = 0
+        self.last_error = None
+
+        # called from the reader thread, e.g. to wake up an event loop
+        self.on_frame = None  # after a frame was queued
+        self.on_config = None  # after a config was sent, with that config
 
         self._packet_size = FrameData.packet_size(UnoDriver._chan_samples)
-
-        self._poll_timer = QtCore.QTimer()
-        self._poll_timer.timeout.connect(self._poll)
-        self._poll_timer.start(UnoDriver._poll_delay_ms)
+        self._framer = PacketFramer(
+            self._packet_size,
+            UnoDriver._syncword,
+            UnoDriver._nak,
+            UnoDriver._resync_limit,
+        )
+        self._packed_framer = PacketFramer(
+            link.packed_size(UnoDriver._chan_samples),
+            link.packed_syncword,
+            UnoDriver._nak,
+            UnoDriver._resync_limit,
+            link.packed_header_size,
+            link.packed_length,
+        )
+        self._frames = FrameQueue(queue_size)
+
+        # roll mode: chunks go into a ring, frames handed out are snapshots of it.
+        # The rest of a block packet in flight when switching is no reason to reset.
+        self._chunk_framer = PacketFramer(
+            chunk_size(),
+            stream_syncword,
+            UnoDriver._nak,
+            UnoDriver._resync_limit + self._packet_size // chunk_size() + 1,
+        )
+        self._stream = StreamBuffer(UnoDriver._chan_samples)
+        self._dummy_roll_at = 0.0
+
+        # a decoded frame is reused once the queue and the consumers moved on
+        self._decoder = FrameDecoder(
+            UnoDriver._chan_samples,
+            UnoDriver._vref,
+            len(UnoDriver._syncword),
+            pool_size=queue_size + UnoDriver._held_frames,
+        )
+        self._rng = np.random.default_rng()
+        self._poll_timer = None
 
         self._serial_init()
 
+        # all device I/O happens here, GUI thread only picks up finished frames
+        self._running = True
+        self._reader = threading.Thread(
+            target=self._reader_run, name="gruseloskop-reader", daemon=True
+        )
+        self._reader.start()
+
+    @property
+    def dropped_frames(self):
+        return self._frames.dropped
+
+    @property
+    def _framers(self):
+        return self._framer, self._packed_framer, self._chunk_framer
+
+    @property
+    def resyncs(self):
+        return sum(framer.resyncs for framer in self._framers)
+
+    @property
+    def discarded_bytes(self):
+        return sum(framer.discarded_bytes for framer in self._framers)
+
+    @property
+    def stream_gaps(self):
+        return self._stream.gaps
+
+    @property
+    def stream_lost_samples(self):
+        return self._stream.lost_samples
+
+    def close(self):
+        self._running = False
+        if self._poll_timer is not None:
+            self._poll_timer.stop()
+        if self._reader.is_alive() and self._reader is not threading.current_thread():
+            self._reader.join()
+        if self._ser is not None:
+            self._ser.close()
+            self._ser = None
+
     def _serial_init(self):
         if not self._dummy_mode:
             print("No sync or port closed: initializing UART")
+            if self._ser is not None:
+                self._ser.close()
             self._ser = None
-            init = Serial(port=self._port, baudrate=UnoDriver._serial_baud)
-            init.setDTR(False)
-            sleep(0.25)
-            init.flushInput()
-            init.setDTR(True)
-            sleep(0.5)          # wait for arduino to become ready to receive config
+            for framer in self._framers:
+                framer.reset()
+            self._device_packet = None
+            init = Serial(
+                port=self._port,
+                baudrate=UnoDriver._serial_baud,
+                timeout=UnoDriver._serial_timeout,
+            )
+            try:
+                init.setDTR(False)
+                sleep(0.25)
+                init.flushInput()
+                init.setDTR(True)
+            except OSError:
+                pass  # no modem lines (e.g. emulator on a pty), nothing to reset
+            sleep(0.5)  # wait for arduino to become ready to receive config
+            self._link_negotiate(init)
             self._ser = init
 
         self._send_apply_config(self._last_config)
 
-    def _parse_acq_packet(self, packet):
-        packet = np.frombuffer(packet, dtype=np.uint8)
-        data0 = np.empty_like(self._cur_time0)
-        data1 = np.empty_like(self._cur_time1)
+    def _link_negotiate(self, ser):
+        # ask for a faster, packed link, firmware without it NAKs the hello
+        self.link_baud = UnoDriver._serial_baud
+        self.link_flags = 0
+        self._link_packets = 0
+        if self._link_failed:
+            return
+        if self._baud == UnoDriver._serial_baud and not self._packing:
+            return
+
+        ser.reset_input_buffer()
+        ser.write(link.hello_make(self._baud, self._packing))
+        received = bytearray()
+        reply = None
+        deadline = monotonic() + UnoDriver._hello_timeout
+        while reply is None and monotonic() < deadline:
+            received += ser.read(max(1, ser.in_waiting))
+            reply = link.reply_parse(received)
+
+        if reply is None:
+            print("No link negotiation, staying at 115200 baud with plain packets")
+            self._link_failed = True
+            ser.reset_input_buffer()
+            return
+
+        _, baud, flags = reply
+        if baud != ser.baudrate:
+            ser.flush()
+            ser.baudrate = baud
+            sleep(0.01)  # firmware switches right after the reply
+        self.link_baud = baud
+        self.link_flags = flags
+        print("Link: {} baud, packing {}".format(baud, "on" if flags else "off"))
 
-        sync_size = np.size(self._syncword)
-
-        if not np.array_equal(packet[:sync_size], self._syncword):
+    def _parse_acq_packet(self, packet):
+        # sync word was already checked by the framer
+        if not self.link_flags:
+            return self._frame_fill(self._decoder.decode(packet))
+        try:
+            return self._frame_fill(self._decoder.decode_packed(packet))
+        except ValueError:
+            self.bad_packets += 1
             return None
 
-        aux_size = 1
-        aux_data = packet[sync_size : sync_size + aux_size]
-        triggered = aux_data != 0
-
-        data = (
-            packet[sync_size + aux_size :]
-            .astype(np.float32)
-            .reshape((2, self._chan_samples))
-        )
-        data0 = data[0, :] / 0xFF * UnoDriver._vref
-        data1 = data[1, :] / 0xFF * UnoDriver._vref
-
-        return FrameData(
-            self._cur_time0,
-            self._cur_time1,
-            data0,
-            data1,
-            triggered,
-            self._cur_sample_rate,
-        )
-
     def _get_dummy_dataframe(self):
-        data0 = 0.5 * (0.5 + np.random.rand(UnoDriver._chan_samples)) * UnoDriver._vref
-        data1 = 0.5 * (0.5 + np.random.rand(UnoDriver._chan_samples)) * UnoDriver._vref
-        return FrameData(
-            self._cur_time0, self._cur_time1, data0, data1, True, self._cur_sample_rate
+        # Periodic test signal captured like the firmware does: sampling starts
+        # within a sample after the trigger crossing, at a random sub-sample phase.
+        # Both channels are the same sine 90 degrees apart, plus a little noise.
+        cfg = self._last_config
+        amplitude = 0x60
+        level = (cfg.trig_level / UnoDriver._vref * 0xFF - 0x80) / amplitude
+        triggered = abs(level) < 1
+        if triggered:
+            phase = np.arcsin(level)
+            falling = cfg.trig_edge == TriggerEdge.FALLING or (
+                cfg.trig_edge == TriggerEdge.BOTH and self._rng.random() < 0.5
+            )
+            if falling:
+                phase = np.pi - phase
+            phase -= cfg.trig_chan * np.pi / 2
+        elif cfg.trig_mode == TriggerMode.NORM:
+            return None  # level out of reach
+        else:
+            phase = self._rng.random() * 2 * np.pi
+
+        frame = self._decoder.pool.acquire()
+        omega = 2 * np.pi * UnoDriver._dummy_freq
+        start = phase / omega + self._rng.random() / self._cur_sample_rate
+        start -= cfg.trig_chan * UnoDriver._channel1_delay  # A1 is sampled later
+        for chan, axis in enumerate((self._cur_time0, self._cur_time1)):
+            wave = np.sin(omega * (start + axis) + chan * np.pi / 2)
+            wave = 0x80 + amplitude * wave + self._rng.normal(0, 0.5, len(axis))
+            frame.codes[chan] = np.clip(np.round(wave), 0, 0xFF)
+        frame.triggered = triggered
+        return self._frame_fill(frame)
+
+    def _get_dummy_roll(self):
+        # as many random samples as would have come in since last time
+        now = monotonic()
+        count = int((now - self._dummy_roll_at) * self._cur_sample_rate)
+        if count == 0:
+            return None
+        self._dummy_roll_at += count / self._cur_sample_rate
+        count = min(count, self._stream.capacity)
+        self._stream.append(self._rng.integers(0x40, 0xC0, (2, count), dtype=np.uint8))
+        return self._roll_frame()
+
+    def _roll_frame(self):
+        # right-aligned while the ring is still filling up
+        codes = self._stream.snapshot()
+        count = codes.shape[1]
+        frame = FrameData(
+            self._cur_time0[-count:],
+            self._cur_time1[-count:],
+            codes,
+            False,
+            self._cur_sample_rate,
+            UnoDriver._vref,
         )
+        frame.timestamp = time()
+        frame.config = self._last_config
+        frame.stream_end = self._stream.position
+        return frame
+
+    def _frame_fill(self, frame):
+        frame.time0 = self._cur_time0
+        frame.time1 = self._cur_time1
+        frame.spl_rate = self._cur_sample_rate
+        frame.timestamp = time()
+        frame.config = self._last_config
+        return frame
 
     def set_config(self, config):
+        # False if there is nothing to send, the config is in effect already
         assert isinstance(config, Config)
-        if (self._last_config is None) or (config != self._last_config):
+        with self._config_lock:
+            if self._config_queue is None and config == self._last_config:
+                return False
+            now = monotonic()
+            if self._config_queue is None:
+                self._config_pending_since = now
+            self._config_changed_at = now
             self._config_queue = config
+            return True
 
     def set_update_callback(self, callback):
+        # newest frame is delivered in the Qt thread, needs a running event loop
+        from pyqtgraph.Qt import QtCore  # the only use of Qt in here
+
         self._upd_callback = callback
+        if self._poll_timer is None:
+            self._poll_timer = QtCore.QTimer()
+            self._poll_timer.timeout.connect(self._poll)
+            self._poll_timer.start(UnoDriver._poll_delay_ms)
+
+    def get_frame(self, timeout=None):
+        # oldest queued frame, for consumers that need every frame without Qt
+        return self._frames.get(timeout)
+
+    def reserve_frames(self, count):
+        # consumers queue up to `count` more frames, keep them from being reused
+        self._decoder.pool.reserve(count)
 
     def _config_packet_make(self, config, sample_div, level):
-        sgen_period = 0 if config.sgen_freq == 0. else 1.0 / config.sgen_freq
+        sgen_period = 0 if config.sgen_freq == 0.0 else 1.0 / config.sgen_freq
         sgen_period_100us = sgen_period * 10000
 
         packet = np.empty(9, dtype=np.uint8)
@@ -150,51 +563,165 @@ class UnoDriver:
         packet[2] = level
         packet[3] = config.trig_chan
         packet[4] = config.trig_edge
-        
+
         # split uint16 for little endian
         packet[5] = (sample_div - 1) % 0xFF
         packet[6] = (sample_div - 1) // 0xFF
-        packet[7] = sgen_period_100us % 0xFF  
+        packet[7] = sgen_period_100us % 0xFF
         packet[8] = sgen_period_100us // 0xFF
         return packet.tobytes()
 
     def _send_apply_config(self, config):
         time_at_max_rate = UnoDriver._chan_samples / UnoDriver._sample_base_clk
         spl_rate_div = int(np.ceil(config.timeframe / time_at_max_rate))
+        roll = config.trig_mode == TriggerMode.ROLL
+        if roll:
+            # the faster the link, the faster the stream
+            speedup = self.link_baud / UnoDriver._serial_baud
+            max_rate = UnoDriver._stream_max_rate * speedup
+            min_div = UnoDriver._sample_base_clk / max_rate
+            spl_rate_div = max(spl_rate_div, int(np.ceil(min_div)))
         trig_level = int(config.trig_level / UnoDriver._vref * 0xFF)
 
         if not self._dummy_mode and self._ser is not None:
             packet = self._config_packet_make(config, spl_rate_div, trig_level)
-            self._ser.write(packet)
-
-        self._cur_sample_rate = UnoDriver._sample_base_clk / spl_rate_div
-        self._cur_time0 = np.linspace(
-            0, time_at_max_rate * spl_rate_div, UnoDriver._chan_samples
-        )
-        self._cur_time1 = self._cur_time0 + UnoDriver._channel1_delay
+            if packet != self._device_packet:
+                # firmware throws away the capture in progress on every config
+                running = self._last_config.trig_mode != TriggerMode.STOP
+                if self._device_packet is not None and running:
+                    self.config_dropped_frames += 1
+                self._ser.write(packet)
+                self._device_packet = packet
+                self.config_writes += 1
+
+        if roll:
+            timebase = UnoDriver._roll_timebase(spl_rate_div, config.timeframe)
+        else:
+            timebase = UnoDriver._timebase(spl_rate_div)
+        self._cur_time0, self._cur_time1, self._cur_sample_rate = timebase
+
+        if roll != (self._last_config.trig_mode == TriggerMode.ROLL):
+            # whatever is still in flight belongs to the other mode
+            for framer in self._framers:
+                framer.reset()
+            self._stream.reset()
+            self._dummy_roll_at = monotonic()
         self._last_config = config
 
-    def _poll(self):
+    @staticmethod
+    @lru_cache(maxsize=16)
+    def _timebase(spl_rate_div):
+        # shared by all frames with this divisor, hence read-only
+        time_at_max_rate = UnoDriver._chan_samples / UnoDriver._sample_base_clk
+        time0 = np.linspace(0, time_at_max_rate * spl_rate_div, UnoDriver._chan_samples)
+        time1 = time0 + UnoDriver._channel1_delay
+        time0.flags.writeable = False
+        time1.flags.writeable = False
+        return time0, time1, UnoDriver._sample_base_clk / spl_rate_div
+
+    @staticmethod
+    @lru_cache(maxsize=16)
+    def _roll_timebase(spl_rate_div, timeframe):
+        # newest sample at the right edge of the screen, older ones before it
+        spl_rate = UnoDriver._sample_base_clk / spl_rate_div
+        time0 = timeframe - np.arange(UnoDriver._chan_samples)[::-1] / spl_rate
+        time1 = time0 + UnoDriver._channel1_delay
+        time0.flags.writeable = False
+        time1.flags.writeable = False
+        return time0, time1, spl_rate
+
+    def _config_take(self):
+        # debounce changes, but keep sending at the max rate while they go on
+        with self._config_lock:
+            if self._config_queue is None:
+                return None
+
+            now = monotonic()
+            if now - self._config_sent_at < self._config_interval:
+                return None
+            quiet = now - self._config_changed_at >= UnoDriver._config_debounce
+            overdue = now - self._config_pending_since >= self._config_interval
+            if not (quiet or overdue):
+                return None
+
+            config, self._config_queue = self._config_queue, None
+            self._config_sent_at = now
+            return config
+
+    def _acquire(self):
         if self._dummy_mode:
-            if (
-                self._upd_callback is not None
-                and not self._last_config.trig_mode == TriggerMode.STOP
-            ):
-                self._upd_callback(self._get_dummy_dataframe())
+            sleep(UnoDriver._poll_delay_ms / 1000)
+            if self._last_config.trig_mode == TriggerMode.STOP:
+                return None
+            if self._last_config.trig_mode == TriggerMode.ROLL:
+                return self._get_dummy_roll()
+            return self._get_dummy_dataframe()
+
+        if self._ser is None or not self._ser.is_open:
+            self._serial_init()
+            return None
+
+        roll = self._last_config.trig_mode == TriggerMode.ROLL
+        if roll:
+            framer = self._chunk_framer
         else:
-            if self._ser is None or not self._ser.is_open:
-                return
-
-            if self._ser.in_waiting >= self._packet_size:
-                packet = self._ser.read(self._packet_size)
-                assert len(packet) == self._packet_size
-
-                parsed = self._parse_acq_packet(packet)
-                if parsed is None:
-                    self._serial_init()  # lost sync or something like that
-                elif self._upd_callback is not None:
-                    self._upd_callback(parsed)
-
-        if self._config_queue is not None:
-            self._send_apply_config(self._config_queue)
-            self._config_queue = None
+            framer = self._packed_framer if self.link_flags else self._framer
+        packet = framer.next_packet()
+        if packet is not None:
+            self._link_packets += 1
+            if not roll:
+                return self._parse_acq_packet(packet)
+            while packet is not None:  # one snapshot for all chunks at hand
+                self._stream.push_chunk(packet)
+                packet = framer.next_packet()
+            return self._roll_frame()
+
+        # block for at least one byte, but never longer than the serial timeout
+        pending = max(1, self._ser.in_waiting)
+        received = self._ser.readinto(framer.writable(pending))
+        framer.commit(received)
+        if received == 0:
+            framer.flush()  # packets are sent in one go, a gap breaks it
+
+        if framer.lost:
+            negotiated = self.link_baud != UnoDriver._serial_baud or self.link_flags
+            if negotiated and not self._link_packets:
+                print("Negotiated link doesn't work, falling back to 115200 baud")
+                self._link_failed = True
+            self._serial_init()  # no sync for a long time or device asked for it
+        return None
+
+    def _reader_run(self):
+        while self._running:
+            try:
+                config = self._config_take()
+                if config is not None:
+                    self._send_apply_config(config)
+                    if self.on_config is not None:
+                        self.on_config(config)
+
+                frame = self._acquire()
+            except SerialException as e:
+                print("Serial error: {}".format(e))
+                self.serial_errors += 1
+                self.last_error = str(e)
+                self._ser = None
+                sleep(UnoDriver._serial_retry_delay)
+                continue
+
+            if frame is None:
+                continue
+            if self._last_config.trig_mode == TriggerMode.ROLL:
+                # snapshots supersede each other, the samples are in the ring
+                if len(self._frames):
+                    continue
+            elif self.history is not None:
+                self.history.append(frame)
+            self._frames.put(frame)
+            if self.on_frame is not None:
+                self.on_frame()
+
+    def _poll(self):
+        frame = self._frames.latest()
+        if frame is not None and self._upd_callback is not None:
+            self._upd_callback(frame)
@@ -0,0 +1,222 @@
+import os
+import select
+import threading
+import tty
+from time import sleep, monotonic
+
+import numpy as np
+
+from . import link
+from .driver import UnoDriver, FrameData, TriggerMode
+from .stream import stream_syncword, chunk_samples, chunk_size
+
+
+def sine_signal(t, chan):
+    # two phase-shifted 50Hz sines spanning most of the input range
+    return 2.5 + 2.0 * np.sin(2 * np.pi * 50.0 * t + chan * np.pi / 2)
+
+
+class UnoEmulator:
+    # Fake Uno speaking the firmware protocol on a pseudo-terminal (POSIX only).
+    # Open `emulator.port` with UnoDriver to exercise the whole serial path.
+    # Roll mode streams sequence-numbered chunks in real time, drop() skips some
+    # of them like the firmware does when the UART can't keep up.
+    # Link negotiation is answered as by firmware `version` (1: NAK, like old
+    # firmware). With `realtime`, blocks take their capture time and sending
+    # takes as long as it would at the negotiated baud rate.
+
+    _config_size = 9
+
+    def __init__(
+        self,
+        signal=sine_signal,
+        frame_delay=0.01,
+        version=link.protocol_version,
+        realtime=False,
+    ):
+        self._signal = signal
+        self._frame_delay = frame_delay
+        self._version = version
+        self._realtime = realtime
+        self.baud = UnoDriver._serial_baud
+        self.link_flags = 0
+        self.bytes_sent = 0
+
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        os.set_blocking(self._master, False)
+        self.port = os.ttyname(self._slave)
+
+        self.config = None
+        self.configs_received = 0
+        self.frames_sent = 0
+        self.chunks_sent = 0
+        self.chunks_dropped = 0
+
+        self._rx = bytearray()
+        self._tx_inject = bytearray()
+        self._lock = threading.Lock()
+        self._t0 = 0.0
+        self._seq = 0
+        self._drop = 0
+        self._roll_at = None
+
+        self._running = False
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._run, name="gruseloskop-emulator", daemon=True
+        )
+        self._thread.start()
+
+    def close(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        os.close(self._master)
+        os.close(self._slave)
+
+    def inject(self, data):
+        # raw bytes to be sent before the next packet, e.g. to break the sync
+        with self._lock:
+            self._tx_inject += data
+
+    def drop(self, chunks):
+        # skip the next chunks in roll mode, the host should see a gap
+        with self._lock:
+            self._drop += chunks
+
+    @property
+    def spl_rate(self):
+        return UnoDriver._sample_base_clk / self.spl_div
+
+    @property
+    def spl_div(self):
+        if self.config is None:
+            return 1
+        return 1 + self.config[5] + (self.config[6] << 8)  # as firmware's uint16
+
+    def _samples(self, count):
+        rate = self.spl_rate
+        t = self._t0 + np.arange(count) / rate
+        self._t0 = t[-1] + 1 / rate
+
+        codes = [
+            np.clip(self._signal(t, chan) / UnoDriver._vref * 0xFF, 0, 0xFF)
+            for chan in (0, 1)
+        ]
+        return np.concatenate(codes).astype(np.uint8)
+
+    def _make_packet(self):
+        samples = UnoDriver._chan_samples
+        if self.link_flags:
+            codes = self._samples(samples).reshape((2, samples))
+            return link.pack(codes, True, self.link_flags)
+        packet = np.empty(FrameData.packet_size(samples), dtype=np.uint8)
+        packet[:4] = UnoDriver._syncword
+        packet[4] = 1
+        packet[5:] = self._samples(samples)
+        return packet.tobytes()
+
+    def _make_chunks(self):
+        # all chunks due since the last call, sampling never pauses
+        now = monotonic()
+        period = chunk_samples / self.spl_rate
+        if self._roll_at is None:
+            self._roll_at = now
+        data = bytearray()
+        while now - self._roll_at >= period:
+            self._roll_at += period
+            chunk = np.empty(chunk_size(), dtype=np.uint8)
+            chunk[:4] = stream_syncword
+            chunk[4] = self._seq
+            chunk[5:] = self._samples(chunk_samples)
+            self._seq = (self._seq + 1) & 0xFF
+            with self._lock:
+                if self._drop:
+                    self._drop -= 1
+                    self.chunks_dropped += 1
+                    continue
+            data += chunk.tobytes()
+            self.chunks_sent += 1
+        return bytes(data)
+
+    def _recv_config(self):
+        while len(self._rx) >= UnoEmulator._config_size:
+            config = bytes(self._rx[: UnoEmulator._config_size])
+            del self._rx[: UnoEmulator._config_size]
+            hello = link.hello_parse(config)
+            if hello is not None and self._version >= 2:
+                self._handshake(*hello)
+                continue
+            if config[0] != 0:
+                # same as firmware: mess up the sync to force the host to reset
+                self._send(b"\xaa" + self._make_packet())
+                continue
+            self.config = config
+            self.configs_received += 1
+
+    def _handshake(self, version, baud, flags):
+        version = min(version, self._version)
+        baud = baud if baud < len(link.bauds) else 0
+        flags &= link.PACK_DELTA | link.PACK_RLE
+        self._send(link.reply_make(version, baud, flags))
+        self.baud = link.bauds[baud]
+        self.link_flags = flags
+
+    def _send(self, data):
+        self.bytes_sent += len(data)
+        if self._realtime:
+            sleep(len(data) * 10 / self.baud)  # 8N1
+        view = memoryview(data)
+        while view and self._running:
+            _, writable, _ = select.select([], [self._master], [], 0.1)
+            if writable:
+                view = view[os.write(self._master, view) :]
+
+    def _run(self):
+        while self._running:
+            readable, _, _ = select.select([self._master], [], [], 0)
+            if readable:
+                try:
+                    self._rx += os.read(self._master, 4096)
+                except BlockingIOError:
+                    pass
+                self._recv_config()
+
+            sleep(self._frame_delay)
+            if self.config is None or self.config[1] == TriggerMode.STOP:
+                self._roll_at = None
+                continue
+
+            with self._lock:
+                data, self._tx_inject = self._tx_inject, bytearray()
+            if self.config[1] == TriggerMode.ROLL:
+                self._send(bytes(data) + self._make_chunks())
+            else:
+                self._roll_at = None
+                if self._realtime:
+                    capture = UnoDriver._chan_samples / self.spl_rate
+                    sleep(max(0.0, capture - self._frame_delay))
+                self._send(bytes(data) + self._make_packet())
+                self.frames_sent += 1
+
+
+if __name__ == "__main__":
+    with UnoEmulator() as emu:
+        print("Emulating Uno on {}, Ctrl+C to stop".format(emu.port))
+        try:
+            while True:
+                sleep(1)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,295 @@
+from functools import lru_cache
+
+import numpy as np
+
+from .driver import Config, FramePool, TriggerEdge
+
+
+def trigger_phases(codes, time, level, edge=TriggerEdge.RAISING, hysteresis=2):
+    # Time of the first crossing of `level` (in codes) in each row of codes
+    # (frames x samples) sampled at `time`, interpolated between the samples on
+    # either side of it. NaN where there is none. The signal has to be more than
+    # `hysteresis` codes on the other side first: the board starts sampling right
+    # at its trigger level, noise there would give a bogus early crossing. BOTH
+    # uses rising edges, mixing them would put frames half a period apart.
+    before = codes[:, :-1]
+    after = codes[:, 1:]
+    if edge == TriggerEdge.FALLING:
+        cross = (before > level) & (after <= level)
+        armed = before > level + hysteresis
+    else:
+        cross = (before < level) & (after >= level)
+        armed = before < level - hysteresis
+    cross &= np.logical_or.accumulate(armed, axis=1)
+
+    first = np.argmax(cross, axis=1)
+    rows = np.arange(len(codes))
+    found = cross[rows, first]
+    c0 = before[rows, first].astype(np.float64)
+    c1 = after[rows, first].astype(np.float64)
+    frac = np.divide(level - c0, c1 - c0, out=np.zeros_like(c0), where=found)
+    phases = time[first] + frac * (time[first + 1] - time[first])
+    phases[~found] = np.nan
+    return phases
+
+
+@lru_cache(maxsize=16)
+def _grid(bin_width, bins):
+    # bin centres, shared by all reconstructions on this grid, hence read-only
+    time = (np.arange(bins) + 0.5) * bin_width
+    time.flags.writeable = False
+    return time
+
+
+class EquivalentTimeSampler:
+    # Equivalent-time sampling of a repetitive signal. Triggered frames are
+    # shifted by the sub-sample time of their trigger crossing and their samples
+    # sorted into a shared grid `oversample` times finer than the sample spacing,
+    # both channels at their true sample times. Each bin holds the mean of the
+    # samples of the last `depth` frames that fell into it, NaN if none did yet.
+    # The grid is anchored at the crossing of the first frame: the board starts
+    # sampling right after triggering, so later frames only shift by a fraction
+    # of a sample against it and the reconstruction lines up with the frames.
+
+    def __init__(
+        self, oversample=16, depth=128, chan=0, level=0x80, edge=TriggerEdge.RAISING
+    ):
+        self.oversample = oversample
+        self.depth = depth
+        self._time = None
+        self.configure(chan, level, edge)
+
+    def configure(self, chan=0, level=0x80, edge=TriggerEdge.RAISING):
+        # trigger channel, level in codes and edge the phase is measured on
+        self.chan = chan
+        self.level = level
+        self.edge = edge
+        self.reset()
+
+    def reset(self, time0=None, time1=None):
+        # start over, on the grid of frames sampled at time0 / time1 if given
+        if time0 is not None:
+            self._time = (time0, time1)
+        self.frames = 0
+        self.skipped = 0  # no crossing to align them by
+        self._anchor = None
+        if self._time is None:
+            return
+
+        samples = len(self._time[0])
+        self.bins = samples * self.oversample
+        self.bin_width = (self._time[0][1] - self._time[0][0]) / self.oversample
+        # one overflow bin per channel after its grid takes the unused samples
+        self._sums = np.zeros(2 * (self.bins + 1))
+        self._counts = np.zeros(2 * (self.bins + 1), np.int64)
+        self._ring_bins = np.full((self.depth, 2, samples), self.bins, np.int32)
+        self._ring_codes = np.zeros((self.depth, 2, samples), np.uint8)
+        self._ring_pos = 0
+
+    @property
+    def time(self):
+        return _grid(self.bin_width, self.bins)
+
+    @property
+    def coverage(self):
+        # fraction of the grid holding samples
+        counts = self._counts.reshape((2, -1))[:, : self.bins]
+        return float(np.count_nonzero(counts)) / counts.size
+
+    def add(self, codes, time0, time1):
+        # codes: (frames, 2, samples) uint8 sampled at time0 / time1. Returns the
+        # number of frames that could be placed on the grid.
+        if self._time is None or self._time[0] is not time0:
+            self.reset(time0, time1)
+
+        phases = trigger_phases(
+            codes[:, self.chan], self._time[self.chan], self.level, self.edge
+        )
+        found = ~np.isnan(phases)
+        self.skipped += len(phases) - int(np.count_nonzero(found))
+        codes = codes[found][-self.depth :]
+        phases = phases[found][-self.depth :]
+        if not len(codes):
+            return 0
+        if self._anchor is None:
+            self._anchor = phases[0]
+        shifts = phases - self._anchor
+
+        # grid bins of every sample, out of range ones go to the overflow bin
+        bins = np.empty(codes.shape, np.int32)
+        for chan in (0, 1):
+            pos = (self._time[chan][None, :] - shifts[:, None]) / self.bin_width
+            pos = np.floor(pos, out=pos)
+            pos[(pos < 0) | (pos >= self.bins)] = self.bins
+            bins[:, chan] = pos
+            bins[:, chan] += chan * (self.bins + 1)
+
+        # the oldest frames in the ring make room
+        slots = (self._ring_pos + np.arange(len(codes))) % self.depth
+        self._accumulate(self._ring_bins[slots], self._ring_codes[slots], -1)
+        self._ring_bins[slots] = bins
+        self._ring_codes[slots] = codes
+        self._ring_pos = (self._ring_pos + len(codes)) % self.depth
+        self._accumulate(bins, codes, 1)
+
+        self.frames += len(codes)
+        return len(codes)
+
+    def _accumulate(self, bins, codes, sign):
+        bins = bins.ravel()
+        size = len(self._sums)
+        self._sums += sign * np.bincount(bins, codes.ravel(), size)
+        self._counts += sign * np.bincount(bins, minlength=size)
+
+    def trace(self):
+        # mean codes of both channels on the grid (2 x bins), NaN for empty bins
+        sums = self._sums.reshape((2, -1))[:, : self.bins]
+        counts = self._counts.reshape((2, -1))[:, : self.bins]
+        mean = np.full(sums.shape, np.nan)
+        np.divide(sums, counts, out=mean, where=counts > 0)
+        return mean
+
+
+class EquivalentTimeDriver:
+    # Reconstructs repetitive signals at `oversample` times the real-time sample
+    # rate from many triggered frames of the wrapped driver, see
+    # EquivalentTimeSampler. Frames handed out hold the grid, gaps between the
+    # bins that got samples so far are interpolated. Untriggered frames (auto
+    # mode) are not used. The board triggers as usual.
+
+    _poll_delay_ms = 5
+    _pool_size = 4
+
+    def __init__(self, driver, oversample=16, depth=128, vref=5.0):
+        self._driver = driver
+        self._sampler = EquivalentTimeSampler(oversample, depth)
+        self._vref = vref
+        self._pool = None
+        self._last_config = Config()
+        self._trigger_key = self._trigger_key_make(self._last_config)
+        self._upd_callback = None
+        self._poll_timer = None
+        self.history = None  # the raw frames are not what is on screen
+
+    @property
+    def sampler(self):
+        return self._sampler
+
+    @property
+    def coverage(self):
+        return self._sampler.coverage if self._sampler.frames else 0.0
+
+    @property
+    def dropped_frames(self):
+        return self._driver.dropped_frames
+
+    @property
+    def config_dropped_frames(self):
+        return self._driver.config_dropped_frames
+
+    @property
+    def resyncs(self):
+        return self._driver.resyncs
+
+    def close(self):
+        if self._poll_timer is not None:
+            self._poll_timer.stop()
+        self._driver.close()
+
+    def set_config(self, config):
+        assert isinstance(config, Config)
+        level = config.trig_level / self._vref * 0xFF
+        self._sampler.configure(config.trig_chan, level, config.trig_edge)
+        self._last_config = config
+        self._trigger_key = self._trigger_key_make(config)
+        return self._driver.set_config(config)
+
+    def _trigger_key_make(self, config):
+        # what the alignment depends on, the level in codes like the board has it.
+        # Configs that went through a network client need not be exactly equal.
+        if config is None:
+            return None
+        level = int(config.trig_level / self._vref * 0xFF)
+        timeframe = np.float32(config.timeframe)
+        return config.trig_chan, config.trig_edge, level, timeframe
+
+    def set_update_callback(self, callback):
+        from pyqtgraph.Qt import QtCore
+
+        self._upd_callback = callback
+        if self._poll_timer is None:
+            self._poll_timer = QtCore.QTimer()
+            self._poll_timer.timeout.connect(self._poll)
+            self._poll_timer.start(EquivalentTimeDriver._poll_delay_ms)
+
+    def get_frame(self, timeout=None):
+        # reconstruction including at least one more frame, None on timeout
+        frame = self._driver.get_frame(timeout)
+        if frame is None:
+            return None
+        frames = [frame]
+        while True:
+            frame = self._driver.get_frame(0)
+            if frame is None:
+                break
+            frames.append(frame)
+        return self._feed(frames)
+
+    def _feed(self, frames):
+        # frames of the same timebase go into the sampler together. Those still
+        # captured with older trigger settings would throw off the alignment.
+        key = self._trigger_key
+        frames = [
+            f for f in frames if f.triggered and self._trigger_key_make(f.config) == key
+        ]
+        newest = None
+        while frames:
+            time0 = frames[0].time0
+            batch = [f for f in frames if f.time0 is time0]
+            frames = [f for f in frames if f.time0 is not time0]
+            codes = np.stack([f.codes for f in batch])
+            if self._sampler.add(codes, time0, batch[0].time1):
+                newest = batch[-1]
+        if newest is None:
+            return None
+        return self._frame_make(newest)
+
+    def _frame_make(self, newest):
+        sampler = self._sampler
+        if self._pool is None or self._pool_bins != sampler.bins:
+            self._pool = FramePool(
+                EquivalentTimeDriver._pool_size, sampler.bins, self._vref
+            )
+            self._pool_bins = sampler.bins
+
+        frame = self._pool.acquire()
+        time = sampler.time
+        for chan, mean in enumerate(sampler.trace()):
+            filled = np.flatnonzero(~np.isnan(mean))
+            if not len(filled):
+                frame.codes[chan] = 0
+                continue
+            np.copyto(
+                frame.codes[chan],
+                np.round(np.interp(time, time[filled], mean[filled])),
+                casting="unsafe",
+            )
+        frame.time0 = frame.time1 = time  # channel 1 delay is already accounted for
+        frame.spl_rate = newest.spl_rate * sampler.oversample
+        frame.triggered = True
+        frame.timestamp = newest.timestamp
+        frame.config = self._last_config
+        return frame
+
+    def _poll(self):
+        frames = []
+        while True:
+            frame = self._driver.get_frame(0)
+            if frame is None:
+                break
+            frames.append(frame)
+        if not frames:
+            return
+        frame = self._feed(frames)
+        if frame is not None and self._upd_callback is not None:
+            self._upd_callback(frame)
@@ -0,0 +1,396 @@
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from collections import namedtuple
+
+import numpy as np
+
+from .align import ChannelAligner
+
+# Chunk of consecutive frames as handed out by the export sources. Time axes are
+# per frame references to the shared arrays of the respective timebase. Volts are
+# None unless the frames hold more than their codes (averaged or hi-res), then
+# they are written instead of the codes.
+ExportChunk = namedtuple(
+    "ExportChunk",
+    ["codes", "timestamps", "triggered", "spl_rate", "time0", "time1", "volts"],
+    defaults=(None,),
+)
+
+
+class FrameListSource:
+    # Frames held in memory, e.g. the last acquired one
+
+    def __init__(self, frames):
+        self._frames = list(frames)
+        self.vref = self._frames[0].vref if self._frames else 5.0
+        self.chan_samples = self._frames[0].codes.shape[1] if self._frames else 0
+        self._fine = any(f.fine for f in self._frames)
+
+    def __len__(self):
+        return len(self._frames)
+
+    def chunk(self, start, stop):
+        frames = self._frames[start:stop]
+        return ExportChunk(
+            np.stack([f.codes for f in frames]),
+            np.array([f.timestamp for f in frames], dtype=np.float64),
+            np.array([f.triggered for f in frames], dtype=np.bool_),
+            np.array([f.spl_rate for f in frames], dtype=np.float64),
+            [f.time0 for f in frames],
+            [f.time1 for f in frames],
+            np.stack([f.volts for f in frames]) if self._fine else None,
+        )
+
+
+class CaptureSource:
+    # Frames of a (memory-mapped) capture file
+
+    def __init__(self, reader):
+        self._reader = reader
+        self.vref = reader.vref
+        self.chan_samples = reader.chan_samples
+
+    def __len__(self):
+        return len(self._reader)
+
+    def chunk(self, start, stop):
+        records = self._reader.records[start:stop]
+        timebases = [self._reader.timebase(int(c)) for c in records["config"]]
+        return ExportChunk(
+            records["codes"],
+            records["timestamp"],
+            records["triggered"] != 0,
+            np.array([t[2] for t in timebases], dtype=np.float64),
+            [t[0] for t in timebases],
+            [t[1] for t in timebases],
+        )
+
+
+def _text_table(strings):
+    # fixed-width, right-aligned ASCII rows for vectorized lookup
+    width = max(len(s) for s in strings)
+    table = np.frombuffer(
+        "".join(s.rjust(width) for s in strings).encode("ascii"), dtype=np.uint8
+    )
+    return table.reshape((len(strings), width))
+
+
+def _text_padded(table):
+    # any row of a _text_table narrower than the table
+    return bool(np.any(table[:, 0] == ord(" ")))
+
+
+def _sci_text(values):
+    # "%+.6e"-like ASCII of float32 values, 13 bytes each with a space for "+",
+    # built digit by digit with array arithmetic. Two exponent digits cover float32.
+    values = np.asarray(values, np.float64)
+    finite = np.isfinite(values)
+    mag = np.where(finite, np.abs(values), 0.0)
+    exp = np.floor(np.log10(mag, out=np.zeros_like(mag), where=mag > 0))
+    mant = np.rint(mag / 10.0**exp * 1e6)
+    carry = mant >= 1e7  # 9.9999996 rounds up to 1.000000e+01
+    mant[carry] /= 10
+    exp[carry] += 1
+    mant = mant.astype(np.int64)
+    exp = exp.astype(np.int64)
+
+    text = np.empty(values.shape + (13,), np.uint8)
+    text[..., 0] = np.where(values < 0, ord("-"), ord(" "))
+    for pos, power in zip([1, 3, 4, 5, 6, 7, 8], range(6, -1, -1)):
+        text[..., pos] = mant // 10**power % 10 + ord("0")
+    text[..., 2] = ord(".")
+    text[..., 9] = ord("e")
+    text[..., 10] = np.where(exp < 0, ord("-"), ord("+"))
+    text[..., 11] = np.abs(exp) // 10 + ord("0")
+    text[..., 12] = np.abs(exp) % 10 + ord("0")
+
+    for special in ("nan", "inf", "-inf"):
+        mask = np.isnan(values) if special == "nan" else values == float(special)
+        text[mask] = _text_table([special.rjust(13)])[0]
+    return text
+
+
+def _volt_text(volts):
+    # "%.4f" ASCII of volts below 10 (clipped), 6 bytes each like the lookup table
+    steps = np.rint(np.clip(volts, 0.0, 9.9999) * 1e4).astype(np.int32)
+    text = np.empty(steps.shape + (6,), np.uint8)
+    text[..., 1] = ord(".")
+    for pos, power in zip([0, 2, 3, 4, 5], range(4, -1, -1)):
+        text[..., pos] = steps // 10**power % 10 + ord("0")
+    return text
+
+
+def _math_evaluate(math, chunk, vref):
+    # (frames, channels, samples) volts of the math channels, on A0's time axes
+    volts = chunk.volts
+    if volts is None:
+        volts = chunk.codes * np.float32(vref / 0xFF)
+    delay = np.array(
+        [ChannelAligner.axes_delay(t0, t1) for t0, t1 in zip(chunk.time0, chunk.time1)]
+    )
+    return np.stack(
+        [m.evaluate_batch(volts, chunk.spl_rate, delay) for m in math], axis=1
+    )
+
+
+class CsvWriter:
+    # One row per sample: "frame,t0,a0,t1,a1" and a column per math channel (at
+    # t0), frame being the index in the source (from `start` on). Rows are
+    # assembled as bytes from lookup tables, so no number is formatted in Python
+    # per sample. Math values and volts finer than the codes can't be looked up,
+    # their digits are computed for a whole chunk at once. Fields are as wide as
+    # the widest value of the chunk, narrower ones are padded with spaces that
+    # are dropped when written (the slow path, most chunks have none).
+
+    _math_width = 13  # "-1.234567e+00", see _sci_text
+
+    def __init__(self, path, source, count, math=(), start=0):
+        self._math = list(math)
+        self._vref = source.vref
+        self._file = open(path, "wb")
+        columns = ["frame", "t0", "a0", "t1", "a1"] + [m.name for m in self._math]
+        self._file.write(",".join(columns).lower().encode("ascii") + b"\n")
+
+        volts = np.arange(0x100) / 0xFF * source.vref
+        self._volt_table = _text_table(["{:.4f}".format(v) for v in volts])
+        self._volt_padded = _text_padded(self._volt_table)
+        self._time_tables = {}
+        self._frame = start
+        self._samples = source.chan_samples
+        self._layouts = {}
+
+    def _layout(self, widths):
+        # field slices and a row buffer for fields this wide, separated by commas
+        layout = self._layouts.get(widths)
+        if layout is None:
+            fields = []
+            pos = 0
+            for width in widths:
+                fields.append(slice(pos, pos + width))
+                pos += width + 1
+            layout = (fields, np.empty((0, self._samples, pos), np.uint8))
+            self._layouts = {widths: layout}  # chunks rarely change it
+        return layout
+
+    def _rows(self, widths, count):
+        fields, buf = self._layout(widths)
+        if len(buf) < count:
+            buf = np.full((count,) + buf.shape[1:], ord(" "), np.uint8)
+            for field in fields[1:]:
+                buf[:, :, field.start - 1] = ord(",")
+            buf[:, :, -1] = ord("\n")
+            self._layouts[widths] = (fields, buf)
+        return fields, buf[:count]
+
+    def _time_table(self, time):
+        # time axes are shared per timebase, so are their text tables (the axis is
+        # kept referenced, its id can't be reused)
+        entry = self._time_tables.get(id(time))
+        if entry is None:
+            table = _text_table(["{:.6e}".format(t) for t in time])
+            entry = (table, _text_padded(table), time)
+            self._time_tables[id(time)] = entry
+        return entry[:2]
+
+    def write(self, chunk):
+        count = len(chunk.codes)
+        frames = _text_table([str(i) for i in range(self._frame, self._frame + count)])
+        self._frame += count
+        times0 = [self._time_table(t) for t in chunk.time0]
+        times1 = [self._time_table(t) for t in chunk.time1]
+        width0 = max(table.shape[1] for table, _ in times0)
+        width1 = max(table.shape[1] for table, _ in times1)
+        padded = (
+            _text_padded(frames)
+            or any(p or t.shape[1] != width0 for t, p in times0)
+            or any(p or t.shape[1] != width1 for t, p in times1)
+        )
+
+        volt_width = self._volt_table.shape[1]
+        if chunk.volts is None:
+            padded = padded or self._volt_padded
+            a0_text = self._volt_table[chunk.codes[:, 0, :]]
+            a1_text = self._volt_table[chunk.codes[:, 1, :]]
+        else:
+            text = _volt_text(chunk.volts)
+            volt_width = text.shape[-1]
+            a0_text, a1_text = text[:, 0], text[:, 1]
+        if self._math:
+            math_text = _sci_text(_math_evaluate(self._math, chunk, self._vref))
+            padded = True  # a space stands in for the "+"
+
+        widths = [frames.shape[1], width0, volt_width, width1, volt_width]
+        widths += [CsvWriter._math_width] * len(self._math)
+        fields, rows = self._rows(tuple(widths), count)
+        frame, t0, a0, t1, a1 = fields[:5]
+
+        rows[:, :, frame] = frames[:, None, :]
+        for i in range(count):
+            # right-aligned, the spaces left of narrower tables are the padding
+            table = times0[i][0]
+            rows[i, :, t0.stop - table.shape[1] : t0.stop] = table
+            table = times1[i][0]
+            rows[i, :, t1.stop - table.shape[1] : t1.stop] = table
+        rows[:, :, a0] = a0_text
+        rows[:, :, a1] = a1_text
+        if self._math:
+            for i, field in enumerate(fields[5:]):
+                rows[:, :, field] = math_text[:, i]
+
+        if padded:
+            self._file.write(rows[rows != ord(" ")])
+        else:
+            self._file.write(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class NpzWriter:
+    # Compressed .npz holding raw codes (frames x 2 x samples, uint8) plus per frame
+    # timestamp, triggered flag and sample rate. Volts = codes / 255 * vref.
+    # Codes are streamed into the archive, the small per frame arrays go through
+    # temporary files as a zip can only be written one member at a time. So do
+    # math channels: volts (frames x channels x samples, float32) in "math", their
+    # expressions in "math_expressions", and the volts of frames finer than their
+    # codes (averaged or hi-res, float32) in "volts". "start" is the index of the
+    # first frame in the source.
+
+    _meta = [
+        ("timestamps", np.float64),
+        ("triggered", np.bool_),
+        ("spl_rate", np.float64),
+    ]
+
+    def __init__(self, path, source, count, math=(), start=0):
+        self._count = count
+        self._samples = source.chan_samples
+        self._vref = source.vref
+        self._math = list(math)
+        self._math_file = tempfile.TemporaryFile() if self._math else None
+        self._volts_file = None
+        self._zip = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED)
+
+        with self._zip.open("vref.npy", "w") as member:
+            np.lib.format.write_array(member, np.array(source.vref))
+        with self._zip.open("start.npy", "w") as member:
+            np.lib.format.write_array(member, np.array(start, dtype=np.int64))
+
+        self._codes = self._zip.open("codes.npy", "w", force_zip64=True)
+        self._header_write(self._codes, np.uint8, (count, 2, source.chan_samples))
+        self._meta_files = {name: tempfile.TemporaryFile() for name, _ in self._meta}
+
+    @staticmethod
+    def _header_write(member, dtype, shape):
+        header = {"descr": np.dtype(dtype).str, "fortran_order": False, "shape": shape}
+        np.lib.format.write_array_header_2_0(member, header)
+
+    def write(self, chunk):
+        self._codes.write(np.ascontiguousarray(chunk.codes))
+        for name, dtype in self._meta:
+            data = np.ascontiguousarray(getattr(chunk, name), dtype=dtype)
+            self._meta_files[name].write(data)
+        if self._math:
+            values = _math_evaluate(self._math, chunk, self._vref)
+            self._math_file.write(values.astype(np.float32))
+        if chunk.volts is not None:
+            if self._volts_file is None:
+                self._volts_file = tempfile.TemporaryFile()
+            self._volts_file.write(np.ascontiguousarray(chunk.volts, np.float32))
+
+    def close(self):
+        self._codes.close()
+        if self._volts_file is not None:
+            self._volts_file.seek(0)
+            with self._zip.open("volts.npy", "w", force_zip64=True) as member:
+                self._header_write(member, np.float32, (self._count, 2, self._samples))
+                shutil.copyfileobj(self._volts_file, member)
+            self._volts_file.close()
+        for name, dtype in self._meta:
+            tmp = self._meta_files[name]
+            tmp.seek(0)
+            with self._zip.open(name + ".npy", "w", force_zip64=True) as member:
+                self._header_write(member, dtype, (self._count,))
+                shutil.copyfileobj(tmp, member)
+            tmp.close()
+        if self._math:
+            expressions = np.array([m.expression for m in self._math])
+            with self._zip.open("math_expressions.npy", "w") as member:
+                np.lib.format.write_array(member, expressions)
+            shape = (self._count, len(self._math), self._samples)
+            self._math_file.seek(0)
+            with self._zip.open("math.npy", "w", force_zip64=True) as member:
+                self._header_write(member, np.float32, shape)
+                shutil.copyfileobj(self._math_file, member)
+            self._math_file.close()
+        self._zip.close()
+
+
+export_writers = {"csv": CsvWriter, "npz": NpzWriter}
+
+
+class ExportJob:
+    # Writes frames [start, stop) of a source on a worker thread. Poll progress
+    # (0..1), done and error from any thread, cancel() stops after the current chunk.
+    # Math channels are evaluated on that thread, don't use them elsewhere meanwhile.
+
+    _chunk_frames = 64
+
+    def __init__(self, source, path, fmt="csv", start=0, stop=None, math=()):
+        self._source = source
+        self._math = list(math)
+        self._path = path
+        self._writer_cls = export_writers[fmt]
+        self._start = start
+        self._stop = len(source) if stop is None else min(stop, len(source))
+
+        self._cancelled = False
+        self.exported = 0
+        self.done = False
+        self.error = None
+        self._thread = threading.Thread(
+            target=self._run, name="gruseloskop-export", daemon=True
+        )
+
+    @property
+    def total(self):
+        return max(self._stop - self._start, 0)
+
+    @property
+    def progress(self):
+        return self.exported / self.total if self.total else 1.0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled = True
+
+    def wait(self, timeout=None):
+        self._thread.join(timeout)
+        return self.done
+
+    def _run(self):
+        try:
+            writer = self._writer_cls(
+                self._path, self._source, self.total, self._math, self._start
+            )
+            try:
+                for pos in range(self._start, self._stop, ExportJob._chunk_frames):
+                    if self._cancelled:
+                        break
+                    stop = min(pos + ExportJob._chunk_frames, self._stop)
+                    writer.write(self._source.chunk(pos, stop))
+                    self.exported += stop - pos
+            finally:
+                writer.close()
+            if self._cancelled:
+                os.remove(self._path)  # incomplete, don't leave a broken file around
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
@@ -1,9 +1,32 @@
 import pyqtgraph as pg
 from pyqtgraph.Qt import QtGui, QtCore
 import numpy as np
+from datetime import datetime
+from time import perf_counter, monotonic
 from pyqtgraph.functions import mkPen
 
+from .acquire import Acquisition
+from .align import ChannelAligner, alignment_info
+from .devices import MultiFrame
 from .driver import Config, TriggerMode, TriggerEdge
+from .export import ExportJob, FrameListSource, CaptureSource
+from .mathchan import MathChannel, math_functions
+from .measure import MeasurementEngine, measurement_info
+from .render import Decimator, PaintBudget, RenderScheduler, Persistence
+from .spectrum import Averaging, SpectrumWorker, window_info
+
+
+class _TimedPlotWidget(pg.PlotWidget):
+    # reports how long each repaint took, rendering quality follows from that
+
+    def __init__(self, paint_budget, **kwargs):
+        super().__init__(**kwargs)
+        self._paint_budget = paint_budget
+
+    def paintEvent(self, ev):
+        start = perf_counter()
+        super().paintEvent(ev)
+        self._paint_budget.add(perf_counter() - start)
 
 
 class ScopeGui:
@@ -23,14 +46,72 @@ class ScopeGui:
         "2ms   / DIV": 0.002,
         "1ms   / DIV": 0.001,
     }
+    _fps_items = {"30 FPS": 30, "60 FPS": 60}
+    _persistence_items = {"Off": 0, "4 frames": 4, "16 frames": 16, "64 frames": 64}
+    _stats_rate = 4  # Hz, the label doesn't need to keep up with the plot
+    _measure_default = ("mean", "pp", "freq")
+    _db_min = -100.0  # dBV, about the noise floor of 8 bit samples
+    _db_max = 10.0
+    _freq_divs = 10
+    _window_items = {label: name for name, label in window_info.items()}
+    _averaging_items = {
+        "Off": Averaging.NONE,
+        "Linear": Averaging.LINEAR,
+        "Exponential": Averaging.EXPONENTIAL,
+        "Peak hold": Averaging.PEAK,
+    }
+    _average_count_items = {"4 frames": 4, "16 frames": 16, "64 frames": 64}
+    _alignment_items = {label: method for method, label in alignment_info.items()}
+    _average_items = {
+        "Off": 1,
+        "4 frames": 4,
+        "16 frames": 16,
+        "64 frames": 64,
+        "256 frames": 256,
+    }
+    _hires_items = {"Off": 1, "2 samples": 2, "4 samples": 4, "8 samples": 8}
+    _math_defaults = ("A1-A0", "avg(A0, 16)")  # one per math channel
+    _math_pens = [(200, 100, 200), (100, 150, 250)]
 
-    def __init__(self, driver):
+    def __init__(self, driver, fps=30):
         self._driver = driver
         self._last_data = None
+        self._fps = fps
+        self._device = 0  # board on screen when several are merged
+        self._decimator = Decimator()
+        self._paint = PaintBudget(1.0 / fps)  # antialiasing is dropped beyond that
+        self._scheduler = RenderScheduler()
+        self._persist = [Persistence(), Persistence()]
+        # averaging / hi-res, off by default. One per board when several are merged,
+        # each keeps its average going while another one is on screen
+        boards = len(getattr(driver, "ports", ())) or 1
+        self._acquires = [Acquisition() for _ in range(boards)]
+        self._acquire = self._acquires[0]  # the board on screen
+        self._aligner = ChannelAligner(None)  # A1 onto A0's sample times for X-Y
+        self._math = [None for _ in ScopeGui._math_defaults]  # enabled MathChannels
+        self._xy_diff = MathChannel("A1-A0", "A1-A0", self._aligner)
+        self._measure = MeasurementEngine(ScopeGui._measure_default)
+        self._spectrum = SpectrumWorker()  # frames are only fed in spectrum mode
+        self._spectrum_on = False
+        self._last_spectrum = None
 
         self._ui_setup()
+
+        # frames are only collected as they come, repaints and stats run on timers
+        self._render_timer = QtCore.QTimer()
+        self._render_timer.timeout.connect(self._render_tick)
+        self._render_timer.start(int(1000 / fps))
+
+        self._display_fps = 0.0
+        self._stats_shown = 0
+        self._stats_time = monotonic()
+        self._stats_timer = QtCore.QTimer()
+        self._stats_timer.timeout.connect(self._stats_tick)
+        self._stats_timer.start(int(1000 / ScopeGui._stats_rate))
+
         driver.set_update_callback(self._drv_update)
 
+        self._spectrum_changed(None)
         self._control_changed(None)
 
     def _ui_setup(self):
@@ -51,19 +132,31 @@ class ScopeGui:
         self._mw.show()
 
     def _crt_create(self):
-        self._crt = pg.PlotWidget(name="Scope")
+        self._crt = _TimedPlotWidget(self._paint, name="Scope")
         self._crt.setMouseEnabled(x=False, y=False)
         self._crt.setMenuEnabled(False)
         self._crt.showGrid(x=True, y=True, alpha=0.3)
 
         pg.setConfigOptions(antialias=True, leftButtonPan=False)
 
+        # persistence trails below the live traces
+        self._trail0 = self._crt.plot()
+        self._trail0.setPen((200, 200, 100, 60))
+
+        self._trail1 = self._crt.plot()
+        self._trail1.setPen((000, 200, 100, 60))
+
         self._plot0 = self._crt.plot()
         self._plot0.setPen((200, 200, 100))
 
         self._plot1 = self._crt.plot()
         self._plot1.setPen((000, 200, 100))
 
+        self._plot_math = []
+        for pen in ScopeGui._math_pens:
+            self._plot_math.append(self._crt.plot())
+            self._plot_math[-1].setPen(pen)
+
         # cursors for trigger and measurements
         pen_curtrig = mkPen("b", style=QtCore.Qt.DotLine)
         pen_cur0 = mkPen("r", style=QtCore.Qt.DashLine)
@@ -102,6 +195,10 @@ class ScopeGui:
         gb_horizontal = QtGui.QGroupBox("Horizontal")
         gb_horizontal.setLayout(self._horizontal_controls_create())
 
+        gb_display = QtGui.QGroupBox("Display")
+        gb_display.setLayout(self._display_controls_create())
+
+        self._cmb_average = []  # filled per channel below
         self._gb_vertical_a0 = QtGui.QGroupBox("Vertical A0")
         self._gb_vertical_a0.setCheckable(True)
         self._gb_vertical_a0.setStyleSheet(
@@ -129,6 +226,15 @@ class ScopeGui:
         self._gb_sgen.toggled.connect(self._control_changed)
         self._gb_cursors.toggled.connect(self._cursors_changed)
 
+        self._gb_spectrum = QtGui.QGroupBox("Spectrum")
+        self._gb_spectrum.setLayout(self._spectrum_controls_create())
+
+        self._gb_math = QtGui.QGroupBox("Math")
+        self._gb_math.setLayout(self._math_controls_create())
+
+        self._gb_measure = QtGui.QGroupBox("Measurements")
+        self._gb_measure.setLayout(self._measure_controls_create())
+
         self._gb_export = QtGui.QGroupBox("Export")
         self._gb_export.setLayout(self._export_controls_create())
 
@@ -138,17 +244,30 @@ class ScopeGui:
         layout = QtGui.QVBoxLayout()
         layout.addWidget(gb_trig)
         layout.addWidget(gb_horizontal)
+        layout.addWidget(gb_display)
+        layout.addWidget(self._gb_spectrum)
         layout.addWidget(self._gb_vertical_a0)
         layout.addWidget(self._gb_vertical_a1)
+        layout.addWidget(self._gb_math)
         layout.addWidget(self._gb_cursors)
         layout.addWidget(self._gb_sgen)
+        layout.addWidget(self._gb_measure)
+        if getattr(self._driver, "history", None) is not None:
+            self._gb_history = QtGui.QGroupBox("History (while stopped)")
+            self._gb_history.setLayout(self._history_controls_create())
+            layout.addWidget(self._gb_history)
         layout.addWidget(self._gb_export)
+        if hasattr(self._driver, "seek"):  # playing back a capture file
+            self._gb_replay = QtGui.QGroupBox("Replay")
+            self._gb_replay.setLayout(self._replay_controls_create())
+            layout.addWidget(self._gb_replay)
         layout.addWidget(self._gb_author)
         return layout
 
     def _stats_create(self):
         self._lbl_stats = QtGui.QLabel()
         self._lbl_stats.setAlignment(QtCore.Qt.AlignRight)
+        self._lbl_stats.setWordWrap(True)  # grows with the selected measurements
         self._lbl_stats.setText("Signal statistics")
         return self._lbl_stats
 
@@ -156,12 +275,15 @@ class ScopeGui:
         rb_trig_auto = QtGui.QRadioButton("Auto")
         rb_trig_norm = QtGui.QRadioButton("Norm")
         rb_trig_stop = QtGui.QRadioButton("Stop")
+        rb_trig_roll = QtGui.QRadioButton("Roll")
+        rb_trig_roll.setToolTip("Stream continuously, for slow time bases")
         rb_trig_auto.setChecked(True)
 
         self._bg_trig_mode = QtGui.QButtonGroup()
         self._bg_trig_mode.addButton(rb_trig_auto, TriggerMode.AUTO)
         self._bg_trig_mode.addButton(rb_trig_norm, TriggerMode.NORM)
         self._bg_trig_mode.addButton(rb_trig_stop, TriggerMode.STOP)
+        self._bg_trig_mode.addButton(rb_trig_roll, TriggerMode.ROLL)
 
         rb_trig_src0 = QtGui.QRadioButton("A0")
         rb_trig_src1 = QtGui.QRadioButton("A1")
@@ -199,13 +321,14 @@ class ScopeGui:
         layout.addWidget(rb_trig_auto, 0, 0, 1, 1)
         layout.addWidget(rb_trig_norm, 0, 1, 1, 1)
         layout.addWidget(rb_trig_stop, 0, 2, 1, 1)
+        layout.addWidget(rb_trig_roll, 0, 3, 1, 1)
 
         layout.addWidget(QtGui.QLabel("Source:"), 1, 0, 1, 1)
         layout.addWidget(rb_trig_src0, 1, 1, 1, 1)
         layout.addWidget(rb_trig_src1, 1, 2, 1, 1)
 
         layout.addWidget(QtGui.QLabel("Level:"), 2, 0, 1, 1)
-        layout.addWidget(self._sld_trig_lvl, 2, 1, 1, 2)
+        layout.addWidget(self._sld_trig_lvl, 2, 1, 1, 3)
 
         layout.addWidget(rb_trig_edge_raising, 3, 0, 1, 1)
         layout.addWidget(rb_trig_edge_falling, 3, 1, 1, 1)
@@ -215,8 +338,21 @@ class ScopeGui:
 
     def _vertical_controls_create(self, chan):
         lbl = QtGui.QLabel("1V / DIV")
+
+        cmb_average = pg.ComboBox(items=ScopeGui._average_items)
+        cmb_average.setToolTip(
+            "Average triggered frames for finer resolution than the 8 bit samples"
+        )
+        cmb_average.currentIndexChanged.connect(self._acquisition_changed)
+        self._cmb_average.append(cmb_average)
+
+        average = QtGui.QHBoxLayout()
+        average.addWidget(QtGui.QLabel("Average:"))
+        average.addWidget(cmb_average)
+
         layout = QtGui.QVBoxLayout()
         layout.addWidget(lbl)
+        layout.addLayout(average)
         return layout
 
     def _horizontal_controls_create(self):
@@ -229,17 +365,114 @@ class ScopeGui:
         self._rb_xy_ty = QtGui.QRadioButton("t-Y")
         self._rb_xy_a0a1 = QtGui.QRadioButton("X-Y (X=A0, Y=A1)")
         self._rb_xy_a0a10 = QtGui.QRadioButton("X-Y (X=A0, Y=A1-A0)")
+        self._rb_spectrum = QtGui.QRadioButton("Spectrum (FFT)")
         self._rb_xy_ty.setChecked(True)
 
         self._rb_xy_ty.toggled.connect(self._control_changed)
         self._rb_xy_a0a1.toggled.connect(self._control_changed)
         self._rb_xy_a0a10.toggled.connect(self._control_changed)
+        self._rb_spectrum.toggled.connect(self._control_changed)
+
+        self._cmb_alignment = pg.ComboBox(items=ScopeGui._alignment_items)
+        self._cmb_alignment.setToolTip(
+            "Resample A1 to the sample times of A0 before pairing them in X-Y"
+        )
+        self._cmb_alignment.currentIndexChanged.connect(self._alignment_changed)
+
+        alignment = QtGui.QHBoxLayout()
+        alignment.addWidget(QtGui.QLabel("A1 alignment:"))
+        alignment.addWidget(self._cmb_alignment)
+
+        self._cmb_hires = pg.ComboBox(items=ScopeGui._hires_items)
+        self._cmb_hires.setToolTip(
+            "Average blocks of consecutive samples: fewer samples, finer resolution"
+        )
+        self._cmb_hires.currentIndexChanged.connect(self._acquisition_changed)
+
+        hires = QtGui.QHBoxLayout()
+        hires.addWidget(QtGui.QLabel("Hi-res:"))
+        hires.addWidget(self._cmb_hires)
 
         layout = QtGui.QVBoxLayout()
         layout.addWidget(self._cmb_t_div)
         layout.addWidget(self._rb_xy_ty)
         layout.addWidget(self._rb_xy_a0a1)
         layout.addWidget(self._rb_xy_a0a10)
+        layout.addWidget(self._rb_spectrum)
+        layout.addLayout(alignment)
+        layout.addLayout(hires)
+        return layout
+
+    def _spectrum_controls_create(self):
+        self._cmb_window = pg.ComboBox(items=ScopeGui._window_items, default="hann")
+        self._cmb_averaging = pg.ComboBox(items=ScopeGui._averaging_items)
+        self._cmb_average_count = pg.ComboBox(items=ScopeGui._average_count_items)
+
+        self._cmb_window.currentIndexChanged.connect(self._spectrum_changed)
+        self._cmb_averaging.currentIndexChanged.connect(self._spectrum_changed)
+        self._cmb_average_count.currentIndexChanged.connect(self._spectrum_changed)
+
+        btn_restart = QtGui.QPushButton("Restart averaging")
+        btn_restart.clicked.connect(self._spectrum.reset)
+
+        layout = QtGui.QGridLayout()
+        layout.addWidget(QtGui.QLabel("Window:"), 0, 0, 1, 1)
+        layout.addWidget(self._cmb_window, 0, 1, 1, 1)
+        layout.addWidget(QtGui.QLabel("Averaging:"), 1, 0, 1, 1)
+        layout.addWidget(self._cmb_averaging, 1, 1, 1, 1)
+        layout.addWidget(QtGui.QLabel("Over:"), 2, 0, 1, 1)
+        layout.addWidget(self._cmb_average_count, 2, 1, 1, 1)
+        layout.addWidget(btn_restart, 3, 0, 1, 2)
+        return layout
+
+    def _math_controls_create(self):
+        help_text = "On A0, A1 (volts), numbers and + - * / **:\n" + "\n".join(
+            "{}: {}".format(name, text) for name, text in math_functions.items()
+        )
+
+        self._cb_math = []
+        self._le_math = []
+        layout = QtGui.QGridLayout()
+        for i, (expression, pen) in enumerate(
+            zip(ScopeGui._math_defaults, ScopeGui._math_pens)
+        ):
+            cb = QtGui.QCheckBox("M{}".format(i + 1))
+            cb.setStyleSheet("QCheckBox {{color: rgb{};}}".format(pen))
+            cb.toggled.connect(self._math_changed)
+            le = QtGui.QLineEdit(expression)
+            le.setToolTip(help_text)
+            le.editingFinished.connect(self._math_changed)
+            self._cb_math.append(cb)
+            self._le_math.append(le)
+            layout.addWidget(cb, i, 0, 1, 1)
+            layout.addWidget(le, i, 1, 1, 1)
+
+        self._lbl_math = QtGui.QLabel("")
+        self._lbl_math.setWordWrap(True)
+        layout.addWidget(self._lbl_math, len(self._cb_math), 0, 1, 2)
+        return layout
+
+    def _display_controls_create(self):
+        self._cmb_fps = pg.ComboBox(items=ScopeGui._fps_items, default=self._fps)
+        self._cmb_persistence = pg.ComboBox(items=ScopeGui._persistence_items)
+
+        self._cmb_fps.currentIndexChanged.connect(self._display_changed)
+        self._cmb_persistence.currentIndexChanged.connect(self._display_changed)
+
+        layout = QtGui.QGridLayout()
+        layout.addWidget(QtGui.QLabel("Refresh:"), 0, 0, 1, 1)
+        layout.addWidget(self._cmb_fps, 0, 1, 1, 1)
+        layout.addWidget(QtGui.QLabel("Persistence:"), 1, 0, 1, 1)
+        layout.addWidget(self._cmb_persistence, 1, 1, 1, 1)
+
+        self._cmb_device = None
+        if hasattr(self._driver, "ports"):  # several boards at once
+            self._cmb_device = pg.ComboBox(
+                items={port: i for i, port in enumerate(self._driver.ports)}
+            )
+            self._cmb_device.currentIndexChanged.connect(self._display_changed)
+            layout.addWidget(QtGui.QLabel("Device:"), 2, 0, 1, 1)
+            layout.addWidget(self._cmb_device, 2, 1, 1, 1)
         return layout
 
     def _cursor_controls_create(self):
@@ -277,12 +510,67 @@ class ScopeGui:
         layout.addWidget(self._sb_sgen_freq)
         return layout
 
+    def _measure_controls_create(self):
+        layout = QtGui.QGridLayout()
+
+        self._cb_measure = {}
+        for i, (name, (label, _)) in enumerate(measurement_info.items()):
+            cb = QtGui.QCheckBox(label)
+            cb.setChecked(name in ScopeGui._measure_default)
+            cb.toggled.connect(self._measure_changed)
+            self._cb_measure[name] = cb
+            layout.addWidget(cb, i // 3, i % 3, 1, 1)
+        rows = (len(measurement_info) + 2) // 3
+
+        btn_reset = QtGui.QPushButton("Reset statistics")
+        btn_reset.clicked.connect(self._measure.reset)
+        self._lbl_measure = QtGui.QLabel("")
+
+        layout.addWidget(btn_reset, rows, 0, 1, 3)
+        layout.addWidget(self._lbl_measure, rows + 1, 0, 1, 3)
+        return layout
+
     def _export_controls_create(self):
         self._btn_export_csv = QtGui.QPushButton("To CSV")
         self._btn_export_csv.clicked.connect(self._export_csv)
+        self._btn_export_npz = QtGui.QPushButton("To NPZ")
+        self._btn_export_npz.clicked.connect(self._export_npz)
+
+        layout = QtGui.QGridLayout()
+        layout.addWidget(self._btn_export_csv, 0, 0, 1, 1)
+        layout.addWidget(self._btn_export_npz, 0, 1, 1, 1)
+
+        self._cb_export_history = None
+        if getattr(self._driver, "history", None) is not None:
+            # while stopped, like stepping through it
+            self._cb_export_history = QtGui.QCheckBox("Whole history")
+            self._cb_export_history.setEnabled(False)
+            layout.addWidget(self._cb_export_history, 1, 0, 1, 2)
+        return layout
+
+    def _history_controls_create(self):
+        self._sld_history = QtGui.QSlider(QtCore.Qt.Horizontal)
+        self._sld_history.setRange(0, 0)
+        self._sld_history.valueChanged.connect(self._history_seek)
+
+        self._lbl_history = QtGui.QLabel("")
+        self._gb_history.setEnabled(False)
 
         layout = QtGui.QVBoxLayout()
-        layout.addWidget(self._btn_export_csv)
+        layout.addWidget(self._sld_history)
+        layout.addWidget(self._lbl_history)
+        return layout
+
+    def _replay_controls_create(self):
+        self._sld_replay = QtGui.QSlider(QtCore.Qt.Horizontal)
+        self._sld_replay.setRange(0, max(self._driver.frame_count - 1, 0))
+        self._sld_replay.valueChanged.connect(self._driver.seek)
+
+        self._lbl_replay = QtGui.QLabel("")
+
+        layout = QtGui.QVBoxLayout()
+        layout.addWidget(self._sld_replay)
+        layout.addWidget(self._lbl_replay)
         return layout
 
     def _author_controls_create(self):
@@ -300,6 +588,15 @@ class ScopeGui:
 
     def _crt_ax_update(self):
 
+        if self.spectrum_mode:
+            span = self.spectrum_span
+            self._crt.setXRange(0, span)
+            self._crt_axis_set("bottom", 0.0, span, ScopeGui._freq_divs)
+            self._crt.setYRange(ScopeGui._db_min, ScopeGui._db_max)
+            divs = int(ScopeGui._db_max - ScopeGui._db_min) // 10
+            self._crt_axis_set("left", ScopeGui._db_min, ScopeGui._db_max, divs)
+            return
+
         if self.xy_mode:
             self._crt.setXRange(0, 5)
             self._crt_axis_set(
@@ -314,48 +611,259 @@ class ScopeGui:
         self._crt_axis_set("left", ScopeGui._vmin, ScopeGui._vmax, ScopeGui._volt_divs)
 
     def _crt_data_update(self, data):
+        plots = [self._plot0, self._plot1]
+        trails = [self._trail0, self._trail1]
+
+        # math channels are drawn in t-Y only, on A0's time axis
+        math_shown = data is not None and not (self.spectrum_mode or self.xy_mode)
+        for plot, math in zip(self._plot_math, self._math):
+            if not math_shown or math is None:
+                plot.setVisible(False)
+                plot.setData(y=[], x=[])
+
         if data is None:
-            self._plot0.setVisible(False)
-            self._plot1.setVisible(False)
-            self._plot0.setData(y=[], x=[])
-            self._plot1.setData(y=[], x=[])
+            for plot in plots + trails:
+                plot.setVisible(False)
+                plot.setData(y=[], x=[])
+            return
+
+        if self.spectrum_mode:
+            self._crt_spectrum_update(self._last_spectrum)
             return
 
         if self.xy_mode:
-            self._plot0.setVisible(False)
-            self._plot1.setVisible(True)
+            visible = [False, True]
             if self.xy_mode == "A1":
-                self._plot1.setData(y=data.data1, x=data.data0)
-            elif self.xy_mode == "A1-A0":
-                self._plot1.setData(y=data.data1 - data.data0, x=data.data0)
+                curves = [None, (data.data0, self._aligner.align(data))]
             else:
-                self._plot1.setData(y=[], x=[])
+                curves = [None, (data.data0, self._xy_diff.evaluate(data))]
         else:
-            self._plot0.setVisible(self._gb_vertical_a0.isChecked())
-            self._plot1.setVisible(self._gb_vertical_a1.isChecked())
-
-            self._plot0.setData(y=data.data0, x=data.time0)
-            self._plot1.setData(y=data.data1, x=data.time1)
+            visible = [
+                self._gb_vertical_a0.isChecked(),
+                self._gb_vertical_a1.isChecked(),
+            ]
+
+            # no more than two points per pixel column, drawn as min/max envelope
+            (x0, x1), _ = self._crt.viewRange()
+            columns = max(int(self._crt.getViewBox().width()), 1)
+            curves = [
+                self._decimator.envelope(
+                    (data.timestamp, chan), time, volts, x0, x1, columns
+                )
+                for chan, time, volts in [
+                    (0, data.time0, data.data0),
+                    (1, data.time1, data.data1),
+                ]
+            ]
+
+            for plot, math in zip(self._plot_math, self._math):
+                if math is None:
+                    continue
+                key = (data.timestamp, math.expression, self._aligner.method)
+                x, y = self._decimator.envelope(
+                    key, data.time0, math.evaluate(data), x0, x1, columns
+                )
+                plot.setVisible(True)
+                plot.setData(y=y, x=x, antialias=self._paint.antialias)
+
+        antialias = self._paint.antialias
+        for plot, trail, persist, show, curve in zip(
+            plots, trails, self._persist, visible, curves
+        ):
+            x, y = curve if curve is not None else ([], [])
+            plot.setVisible(show)
+            plot.setData(y=y, x=x, antialias=antialias)
+
+            trailing = show and persist.depth > 0
+            trail.setVisible(trailing)
+            if trailing:
+                persist.add(x, y)
+                x, y = persist.line()
+                trail.setData(y=y, x=x, connect="finite", antialias=antialias)
+
+    def _crt_spectrum_update(self, spectrum):
+        plots = [self._plot0, self._plot1]
+        visible = [self._gb_vertical_a0.isChecked(), self._gb_vertical_a1.isChecked()]
+        for trail in [self._trail0, self._trail1]:
+            trail.setVisible(False)
+
+        antialias = self._paint.antialias
+        for chan, (plot, show) in enumerate(zip(plots, visible)):
+            plot.setVisible(show and spectrum is not None)
+            if spectrum is None:
+                plot.setData(y=[], x=[])
+            else:
+                plot.setData(y=spectrum.db[chan], x=spectrum.freq, antialias=antialias)
 
     def _stats_data_update(self, data):
         if data is None:
             self._lbl_stats.setText("NO DATA")
             return
 
-        a0avg = np.mean(data.data0)
-        a0pp = np.max(data.data0) - np.min(data.data0)
-        a1avg = np.mean(data.data1)
-        a1pp = np.max(data.data1) - np.min(data.data1)
-        stat_a0 = "A0: Vavg={:04.3f}V, Vpp={:04.3f}V; ".format(a0avg, a0pp)
-        stat_a1 = "A1: Vavg={:04.3f}V, Vpp={:04.3f}V; ".format(a1avg, a1pp)
+        stat_chans = ""
+        math = self._math_values(data)
+        names = ["A0", "A1"] + list(math)
+        for chan, result in zip(names, self._measure.measure(data, math)):
+            values = [
+                "{}={}".format(measurement_info[name][0], self._measure_fmt(name, v))
+                for name, v in result.items()
+            ]
+            stat_chans += "{}: {}; ".format(chan, ", ".join(values))
 
         spl_rate_hint = "Sample rate: {:06.3f}kHz; ".format(data.spl_rate / 1000)
-        self._lbl_stats.setText(stat_a0 + stat_a1 + spl_rate_hint)
+        dropped_hint = "Dropped: {} (config: {}); Resyncs: {}; ".format(
+            self._driver.dropped_frames,
+            self._driver.config_dropped_frames,
+            self._driver.resyncs,
+        )
+        if getattr(self._driver, "stream_gaps", 0):
+            dropped_hint += "Stream gaps: {} ({} samples); ".format(
+                self._driver.stream_gaps, self._driver.stream_lost_samples
+            )
+        if hasattr(self._driver, "coverage"):  # equivalent-time sampling
+            dropped_hint += "Equivalent time: {} frames, {:.0f}% filled; ".format(
+                self._driver.sampler.frames, self._driver.coverage * 100
+            )
+        if hasattr(self._driver, "device_stats"):
+            for stats in self._driver.device_stats():
+                dropped_hint += "{}: {:.0f} FPS, {} errors; ".format(
+                    stats.port, stats.fps, stats.errors
+                )
+        if max(self._acquire.average) > 1:
+            dropped_hint += "Averaged: {} frames ({} untriggered skipped); ".format(
+                self._acquire.frames, self._acquire.skipped
+            )
+        display_hint = "Display: {:.0f} FPS; ".format(self._display_fps)
+        if self.spectrum_mode and self._last_spectrum is not None:
+            display_hint += "Spectrum: {} frames, {:.1f}Hz bins; ".format(
+                self._last_spectrum.frames, self._last_spectrum.freq[1]
+            )
+        self._lbl_stats.setText(
+            stat_chans + spl_rate_hint + dropped_hint + display_hint
+        )
+
+    @staticmethod
+    def _measure_fmt(name, value):
+        unit = measurement_info[name][1]
+        if np.isnan(value):
+            return "---"
+        if unit == "%":
+            return "{:.1f}%".format(value)
+        return pg.siFormat(value, precision=4, suffix=unit)
+
+    def _measure_stats_update(self):
+        lines = []
+        for chan, chan_stats in zip(self._measure.names, self._measure.stats):
+            for name, stats in chan_stats.items():
+                lines.append(
+                    "{} {}: {} ± {} [{} … {}]".format(
+                        chan,
+                        measurement_info[name][0],
+                        *(
+                            self._measure_fmt(name, v)
+                            for v in (stats.mean, stats.std, stats.min, stats.max)
+                        ),
+                    )
+                )
+        self._lbl_measure.setText("\n".join(lines))
+
+    def _measure_changed(self, source):
+        self._measure.select(
+            [name for name, cb in self._cb_measure.items() if cb.isChecked()]
+        )
+        self._stats_data_update(self._last_data)
+        self._measure_stats_update()
 
     def _drv_update(self, data):
+        # driver callback, may come at any rate: only the newest frame gets drawn
+        if isinstance(data, MultiFrame):
+            frames = [
+                acquire.process(frame) if frame is not None else None
+                for acquire, frame in zip(self._acquires, data.frames)
+            ]
+            data = frames[self._device]
+        else:
+            data = self._acquire.process(data)
+        if data is None:
+            return  # untriggered (the average stays on screen) or no frame of the board
+        self._scheduler.push(data)
+        if self._spectrum_on:
+            self._spectrum.push(data)  # every frame counts towards the average
+
+    def _render_tick(self):
+        if self._spectrum_on:
+            spectrum = self._spectrum.take()
+            if spectrum is not None:
+                self._spectrum_show(spectrum)
+        data = self._scheduler.take()
+        if data is not None:
+            self._frame_show(data)
+            self._measure.update(data, self._math_values(data))
+
+    def _stats_tick(self):
+        now = monotonic()
+        shown = self._scheduler.shown
+        self._display_fps = (shown - self._stats_shown) / (now - self._stats_time)
+        self._stats_shown, self._stats_time = shown, now
+        self._stats_data_update(self._last_data)
+        self._measure_stats_update()
+
+    def _frame_show(self, data):
         self._last_data = data
         self._crt_data_update(data)
-        self._stats_data_update(data)
+        if data is not None and hasattr(self._driver, "seek"):
+            self._replay_data_update(data)
+
+    def _spectrum_show(self, spectrum):
+        span_changed = (
+            self._last_spectrum is None
+            or self._last_spectrum.spl_rate != spectrum.spl_rate
+        )
+        self._last_spectrum = spectrum
+        if span_changed:
+            self._crt_ax_update()
+            self._cursors_changed(None)
+        self._crt_spectrum_update(spectrum)
+
+    def _history_seek(self, i):
+        history = self._driver.history
+        if 0 <= i < len(history):
+            self._frame_show(history.frame(i))
+            self._lbl_history.setText(
+                "Frame {} of {}".format(i - len(history) + 1, len(history))
+            )
+
+    def _history_controls_update(self):
+        # stepping back only makes sense while nothing new comes in
+        stopped = self._bg_trig_mode.checkedId() == TriggerMode.STOP
+        if stopped == self._gb_history.isEnabled():
+            return
+
+        self._gb_history.setEnabled(stopped)
+        if self._cb_export_history is not None:
+            self._cb_export_history.setEnabled(stopped)
+        if stopped:
+            held = len(self._driver.history)
+            self._sld_history.blockSignals(True)
+            self._sld_history.setRange(0, max(held - 1, 0))
+            self._sld_history.setValue(max(held - 1, 0))
+            self._sld_history.blockSignals(False)
+            self._lbl_history.setText("{} frames held".format(held))
+        else:
+            self._lbl_history.setText("")
+
+    def _replay_data_update(self, data):
+        # follow playback without seeking back
+        self._sld_replay.blockSignals(True)
+        self._sld_replay.setValue(self._driver.position)
+        self._sld_replay.blockSignals(False)
+
+        stamp = datetime.fromtimestamp(data.timestamp).strftime("%Y-%m-%d %H:%M:%S.%f")
+        self._lbl_replay.setText(
+            "Frame {} / {}\n{}".format(
+                self._driver.position + 1, self._driver.frame_count, stamp[:-3]
+            )
+        )
 
     @property
     def divtime(self):
@@ -370,13 +878,26 @@ class ScopeGui:
         else:
             return False
 
+    @property
+    def spectrum_mode(self):
+        return self._rb_spectrum.isChecked()
+
+    @property
+    def spectrum_span(self):
+        # up to half the sample rate of the last spectrum, 1 Hz before there is one
+        if self._last_spectrum is None:
+            return 1.0
+        return float(self._last_spectrum.freq[-1])
+
     @property
     def trig_level(self):
         return self._sld_trig_lvl.value() / 99 * ScopeGui._vmax
 
     @property
     def cursors_mode(self):
-        if self.xy_mode or self._rb_cursors_horizontal.isChecked():
+        if self.spectrum_mode:
+            return "frequency"
+        elif self.xy_mode or self._rb_cursors_horizontal.isChecked():
             return "voltage"
         else:
             return "time"
@@ -397,6 +918,10 @@ class ScopeGui:
 
             if self.cursors_mode == "voltage":
                 self._lbl_cursors.setText("ΔV={:4.3f}V".format(c1 - c0))
+            elif self.cursors_mode == "frequency":
+                self._lbl_cursors.setText(
+                    "Δf={}".format(pg.siFormat(abs(c1 - c0), precision=4, suffix="Hz"))
+                )
             else:
                 dt = np.abs(c1 - c0)
                 freq = 1.0 / dt if dt != 0 else np.inf
@@ -430,6 +955,12 @@ class ScopeGui:
             self._cursor0.label.setFormat("V0={value:0.2f}V")
             self._cursor1.label.setFormat("V1={value:0.2f}V")
 
+        elif self.cursors_mode == "frequency":
+            bounds = (0.0, self.spectrum_span)
+            angle = 90
+            self._cursor0.label.setFormat("f0={value:0.1f}Hz")
+            self._cursor1.label.setFormat("f1={value:0.1f}Hz")
+
         else:
             bounds = (0.0, self.divtime * ScopeGui._time_divs)
             angle = 90
@@ -454,32 +985,141 @@ class ScopeGui:
 
         self._cursor_moved(None)  # Update calculated values
 
+    def _display_changed(self, source):
+        self._fps = self._cmb_fps.value()
+        self._render_timer.setInterval(int(1000 / self._fps))
+        self._paint.budget = 1.0 / self._fps
+
+        if self._cmb_device is not None and self._cmb_device.value() != self._device:
+            self._device = self._cmb_device.value()
+            self._acquire = self._acquires[self._device]
+            self._spectrum.reset()  # only the board on screen is fed to it
+
+        depth = self._cmb_persistence.value()
+        self._persist = [Persistence(depth), Persistence(depth)]
+        self._frame_show(self._last_data)
+
+    def _acquisition_changed(self, source):
+        if len(self._cmb_average) < 2:
+            return  # still setting up the controls
+        for acquire in self._acquires:
+            acquire.configure(
+                [cmb.value() for cmb in self._cmb_average], self._cmb_hires.value()
+            )
+        self._spectrum.reset()
+        for persist in self._persist:
+            persist.clear()
+
+    def _alignment_changed(self, source):
+        self._aligner.method = self._cmb_alignment.value()
+        for persist in self._persist:
+            persist.clear()
+        self._frame_show(self._last_data)
+
+    def _math_changed(self, source=None):
+        errors = []
+        for i, (cb, le) in enumerate(zip(self._cb_math, self._le_math)):
+            name = "M{}".format(i + 1)
+            expression = le.text().strip()
+            math = self._math[i]
+            if not cb.isChecked():
+                self._math[i] = None
+            elif math is None or math.expression != expression:
+                try:
+                    self._math[i] = MathChannel(expression, name, self._aligner)
+                except ValueError as e:
+                    self._math[i] = None
+                    errors.append("{}: {}".format(name, e))
+                self._measure.reset_channel(name)
+            le.setStyleSheet(
+                "color: red;" if cb.isChecked() and self._math[i] is None else ""
+            )
+        self._lbl_math.setText("\n".join(errors))
+        self._frame_show(self._last_data)
+        self._stats_data_update(self._last_data)
+
+    def _math_values(self, data):
+        # {name: volts} of the enabled math channels, evaluated once per frame
+        return {m.name: m.evaluate(data) for m in self._math if m is not None}
+
+    def _spectrum_changed(self, source):
+        self._spectrum.configure(
+            self._cmb_window.value(),
+            self._cmb_averaging.value(),
+            self._cmb_average_count.value(),
+        )
+
     def _control_changed(self, source):
+        spectrum_on = self.spectrum_mode
+        if spectrum_on != self._spectrum_on:
+            self._spectrum_on = spectrum_on
+            self._spectrum.reset()
+            self._last_spectrum = None
+        self._gb_spectrum.setEnabled(spectrum_on)
         self._crt_ax_update()
-        self._drv_update(self._last_data)
+        for persist in self._persist:
+            persist.clear()  # old traces don't match new settings
+        self._frame_show(self._last_data)
+        self._stats_data_update(self._last_data)
         self._driver.set_config(self._gather_drv_config())
         self._cursors_changed(None)
+        if getattr(self._driver, "history", None) is not None:
+            self._history_controls_update()
+
+    def _export_source(self):
+        # whole capture while replaying, the frame on screen otherwise
+        if hasattr(self._driver, "reader"):
+            return CaptureSource(self._driver.reader)
+        history = self._cb_export_history
+        if history is not None and history.isEnabled() and history.isChecked():
+            return self._driver.history.snapshot()
+        if self._last_data is None:
+            return None
+        # pooled, the driver reuses it while the export runs
+        return FrameListSource([self._last_data.copy()])
 
     def _export_csv(self):
-        backup = self._last_data
-        if backup is None:
+        self._export("csv", "Save CSV", "CSV Files (*.csv)")
+
+    def _export_npz(self):
+        self._export("npz", "Save NPZ", "Compressed NumPy archives (*.npz)")
+
+    def _export(self, fmt, title, file_filter):
+        source = self._export_source()
+        if source is None or len(source) == 0:
             return  # nothing to save yet
 
         filename, _ = QtGui.QFileDialog.getSaveFileName(
             self._mw,
-            "Save CSV",
-            "gruseloskop_export.csv",
-            "CSV Files (*.csv)",
+            title,
+            "gruseloskop_export." + fmt,
+            file_filter,
             options=QtGui.QFileDialog.DontUseNativeDialog,
         )
+        if not filename:
+            return
 
-        if filename is not None:
-            data = np.transpose(
-                [
-                    backup.time0,
-                    backup.data0,
-                    backup.time1,
-                    backup.data1,
-                ]
-            )
-            np.savetxt(filename, data, delimiter=",", header="t0, a0, t1, a1")
+        # runs on a worker thread, the dialog is only updated by a timer
+        # the math channels get copies, the worker thread needs buffers of its own
+        math = [m.copy() for m in self._math if m is not None]
+        job = ExportJob(source, filename, fmt, math=math).start()
+        progress = QtGui.QProgressDialog(
+            "Exporting {} frames...".format(job.total), "Cancel", 0, 100, self._mw
+        )
+        progress.setMinimumDuration(500)
+        progress.canceled.connect(job.cancel)
+
+        timer = QtCore.QTimer(progress)
+
+        def export_poll():
+            progress.setValue(int(job.progress * 100))
+            if job.done:
+                timer.stop()
+                progress.reset()
+                progress.deleteLater()
+                if job.error is not None:
+                    msg = str(job.error)
+                    QtGui.QMessageBox.critical(self._mw, "Export failed", msg)
+
+        timer.timeout.connect(export_poll)
+        timer.start(100)
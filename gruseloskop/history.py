@@ -0,0 +1,138 @@
+import threading
+
+import numpy as np
+
+from .driver import FrameData
+from .export import ExportChunk
+
+
+class FrameHistory:
+    # Last N frames in preallocated arrays: raw codes as one (N, 2, samples) block
+    # plus per-frame metadata. N follows from the memory limit. Appending copies
+    # into the next slot, nothing is allocated per frame. Index 0 is the oldest
+    # frame held, len() - 1 the newest. Also works as an export source.
+
+    def __init__(self, chan_samples, max_bytes, vref=5.0):
+        # codes, timestamp, sample rate, flag and three list slots
+        frame_bytes = 2 * chan_samples + 8 + 8 + 1 + 3 * 8
+        capacity = max(int(max_bytes // frame_bytes), 1)
+
+        self.chan_samples = chan_samples
+        self.vref = vref
+        self._codes = np.zeros((capacity, 2, chan_samples), dtype=np.uint8)
+        self._timestamps = np.zeros(capacity, dtype=np.float64)
+        self._spl_rate = np.zeros(capacity, dtype=np.float64)
+        self._triggered = np.zeros(capacity, dtype=np.bool_)
+        # references to the shared time axes and configs, not copies
+        self._time0 = [None] * capacity
+        self._time1 = [None] * capacity
+        self._configs = [None] * capacity
+
+        self._lock = threading.Lock()
+        self._next = 0
+        self._count = 0
+        self._appended = 0  # sequence number of the next frame, slot is seq % N
+
+    @property
+    def capacity(self):
+        return len(self._codes)
+
+    @property
+    def nbytes(self):
+        arrays = [self._codes, self._timestamps, self._spl_rate, self._triggered]
+        return sum(a.nbytes for a in arrays) + 3 * 8 * self.capacity
+
+    def __len__(self):
+        return self._count
+
+    def clear(self):
+        with self._lock:
+            self._count = 0
+
+    def append(self, frame):
+        with self._lock:
+            i = self._next
+            self._codes[i] = frame.codes
+            self._timestamps[i] = frame.timestamp
+            self._spl_rate[i] = frame.spl_rate
+            self._triggered[i] = frame.triggered
+            self._time0[i] = frame.time0
+            self._time1[i] = frame.time1
+            self._configs[i] = frame.config
+
+            self._next = (i + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+            self._appended += 1
+
+    def _slot(self, i):
+        if not 0 <= i < self._count:
+            raise IndexError("history index out of range")
+        return (self._next - self._count + i) % self.capacity
+
+    def frame(self, i):
+        # codes are a view into the history, valid until the slot is overwritten
+        with self._lock:
+            slot = self._slot(i)
+            frame = FrameData(
+                self._time0[slot],
+                self._time1[slot],
+                self._codes[slot],
+                bool(self._triggered[slot]),
+                float(self._spl_rate[slot]),
+                self.vref,
+            )
+            frame.timestamp = float(self._timestamps[slot])
+            frame.config = self._configs[slot]
+            return frame
+
+    def __getitem__(self, i):
+        return self.frame(i)
+
+    def chunk(self, start, stop):
+        with self._lock:
+            if not 0 <= start <= stop <= self._count:
+                raise IndexError("history range out of range")
+            return self._chunk(self._appended - self._count + start, stop - start)
+
+    def snapshot(self):
+        # export source of the frames held now. Frames appended meanwhile don't
+        # shift it, exporting fails once its frames are overwritten.
+        with self._lock:
+            return HistorySnapshot(self, self._appended - self._count, self._count)
+
+    def _chunk(self, first, count):
+        # frames with sequence numbers [first, first + count), under the lock
+        if first < self._appended - self._count or first + count > self._appended:
+            raise IndexError("history frames no longer held")
+        slots = np.arange(first, first + count) % self.capacity
+        return ExportChunk(
+            self._codes[slots],
+            self._timestamps[slots],
+            self._triggered[slots],
+            self._spl_rate[slots],
+            [self._time0[s] for s in slots],
+            [self._time1[s] for s in slots],
+        )
+
+
+class HistorySnapshot:
+    # Frames of a FrameHistory as they were when taken, by sequence number
+
+    def __init__(self, history, first, count):
+        self._history = history
+        self._first = first
+        self._count = count
+        self.vref = history.vref
+        self.chan_samples = history.chan_samples
+
+    def __len__(self):
+        return self._count
+
+    def chunk(self, start, stop):
+        if not 0 <= start <= stop <= self._count:
+            raise IndexError("history range out of range")
+        with self._history._lock:
+            try:
+                return self._history._chunk(self._first + start, stop - start)
+            except IndexError:
+                raise IndexError("History frames were overwritten, stop first")
@@ -0,0 +1,144 @@
+from enum import IntEnum
+
+import numpy as np
+
+# Link negotiation, firmware protocol version 2. After reset the board talks
+# 115200 baud with plain packets. The host may send a hello of config packet
+# size, which version 1 firmware rejects with a NAK (so the host falls back):
+#   A5 'G' 'S' version baud flags 00 00 00
+# Newer firmware answers at 115200, then switches to the agreed baud rate:
+#   00 00 FF FD version baud flags
+# With any packing flag set, blocks are sent as packed packets:
+#   00 00 FF FC triggered format length(uint16 LE) payload[length]
+# RAW: a0 a1 as is. DELTA: per channel the first sample, then the differences
+# to the previous sample as signed nibbles, low nibble first (only if all fit).
+# RLE: (count, value) pairs over a0 followed by a1, runs of up to 255.
+
+protocol_version = 2
+hello_magic = 0xA5
+hello_size = 9
+reply_syncword = [0x00, 0x00, 0xFF, 0xFD]
+reply_size = 7
+packed_syncword = [0x00, 0x00, 0xFF, 0xFC]
+packed_header_size = 8
+
+bauds = [115200, 250000, 500000, 1000000]
+
+
+class Packing(IntEnum):
+    RAW = 0
+    DELTA = 1
+    RLE = 2
+
+
+# hello / reply flags
+PACK_DELTA = 1
+PACK_RLE = 2
+
+
+def hello_make(baud, flags):
+    hello = [hello_magic, ord("G"), ord("S"), protocol_version]
+    return bytes(hello + [bauds.index(baud), flags, 0, 0, 0])
+
+
+def hello_parse(data):
+    # (version, baud, flags) if data is a hello, None otherwise
+    if len(data) != hello_size or data[0] != hello_magic or data[1:3] != b"GS":
+        return None
+    return data[3], data[4], data[5]
+
+
+def reply_make(version, baud, flags):
+    return bytes(reply_syncword + [version, baud, flags])
+
+
+def reply_parse(data):
+    # (version, baud rate, flags) of the first reply within data, None if none
+    pos = bytes(data).find(bytes(reply_syncword))
+    if pos < 0 or len(data) < pos + reply_size:
+        return None
+    version, baud, flags = data[pos + 4 : pos + reply_size]
+    if baud >= len(bauds):
+        return None
+    return version, bauds[baud], flags
+
+
+def packed_size(chan_samples):
+    # largest possible packed packet
+    return packed_header_size + 2 * chan_samples
+
+
+def packed_length(header):
+    return packed_header_size + header[6] + (header[7] << 8)
+
+
+def _runs(flat):
+    # (counts, values) of runs of up to 255 equal samples
+    starts = np.flatnonzero(np.diff(flat)) + 1
+    starts = np.concatenate([[0], starts])
+    lengths = np.diff(np.append(starts, len(flat)))
+
+    pieces = (lengths + 254) // 255
+    counts = np.full(int(pieces.sum()), 255, dtype=np.uint8)
+    counts[np.cumsum(pieces) - 1] = (lengths - 1) % 255 + 1
+    values = np.repeat(flat[starts], pieces)
+    return counts, values
+
+
+def pack(codes, triggered, flags):
+    # packed packet of 2 x n codes, chosen the same way as the firmware does
+    samples = codes.shape[1]
+    payload = codes.reshape(-1)
+    fmt = Packing.RAW
+
+    if flags & PACK_DELTA:
+        delta = np.diff(codes.astype(np.int16), axis=1)
+        if np.all((delta >= -8) & (delta <= 7)):
+            nibbles = np.zeros((2, samples + samples % 2), dtype=np.uint8)
+            nibbles[:, : samples - 1] = delta & 0x0F
+            pairs = nibbles[:, 0::2] | (nibbles[:, 1::2] << 4)
+            payload = np.concatenate([codes[:, :1], pairs], axis=1).reshape(-1)
+            fmt = Packing.DELTA
+
+    if flags & PACK_RLE:
+        counts, values = _runs(codes.reshape(-1))
+        if 2 * len(counts) < len(payload):
+            payload = np.stack([counts, values], axis=1).reshape(-1)
+            fmt = Packing.RLE
+
+    header = packed_syncword + [int(triggered), fmt, len(payload) & 0xFF]
+    header += [len(payload) >> 8]
+    return bytes(header) + payload.astype(np.uint8).tobytes()
+
+
+def unpack(packet, out):
+    # decodes a packed packet into out (2 x n uint8), returns the triggered flag
+    fmt = packet[5]
+    payload = np.frombuffer(packet, dtype=np.uint8, offset=packed_header_size)
+    samples = out.shape[1]
+
+    if fmt == Packing.RAW:
+        if len(payload) != out.size:
+            raise ValueError("raw packet of wrong size")
+        out[:] = payload.reshape(out.shape)
+    elif fmt == Packing.DELTA:
+        if len(payload) != 2 * (1 + samples // 2):
+            raise ValueError("delta packet of wrong size")
+        payload = payload.reshape((2, -1))
+        nibbles = np.empty((2, 2 * (payload.shape[1] - 1)), dtype=np.uint8)
+        nibbles[:, 0::2] = payload[:, 1:] & 0x0F
+        nibbles[:, 1::2] = payload[:, 1:] >> 4
+        # sign-extended nibbles summed up modulo 256 give the codes directly
+        nibbles ^= 0x08
+        nibbles -= 0x08
+        out[:, 0] = payload[:, 0]
+        np.cumsum(nibbles[:, : samples - 1], axis=1, dtype=np.uint8, out=out[:, 1:])
+        out[:, 1:] += payload[:, :1]
+    elif fmt == Packing.RLE:
+        counts, values = payload[0::2], payload[1::2]
+        if len(payload) % 2 or int(counts.sum()) != out.size:
+            raise ValueError("run lengths don't add up")
+        out[:] = np.repeat(values, counts).reshape(out.shape)
+    else:
+        raise ValueError("unknown packing {}".format(fmt))
+    return packet[4] != 0
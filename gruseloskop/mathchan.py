@@ -0,0 +1,300 @@
+import ast
+import math
+from functools import lru_cache
+
+import numpy as np
+
+# Expressions over the channels A0 and A1 (volts), e.g. "A0*A1", "avg(A1-A0, 16)"
+# or "lowpass(A0, 500)". Besides + - * / ** and numbers there are:
+math_functions = {
+    "abs": "absolute value",
+    "sqrt": "square root",
+    "exp": "e to the power of x",
+    "log": "natural logarithm",
+    "log10": "decimal logarithm",
+    "avg": "avg(x, n): moving average over the last n samples",
+    "deriv": "deriv(x): derivative, per second",
+    "integ": "integ(x): running integral (trapezoid), times seconds",
+    "fir": "fir(x, c0, c1, ...): y[k] = c0 x[k] + c1 x[k-1] + ...",
+    "lowpass": "lowpass(x, fc): first order IIR low pass, cut-off in Hz",
+    "highpass": "highpass(x, fc): first order IIR high pass, cut-off in Hz",
+}
+
+_inputs = {"A0": 0, "A1": 1}
+_binary = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.divide,
+    ast.Pow: np.power,
+}
+_elementwise = {
+    "abs": np.absolute,
+    "sqrt": np.sqrt,
+    "exp": np.exp,
+    "log": np.log,
+    "log10": np.log10,
+}
+_iir_range = 600.0  # natural log of the largest factor a block may scale by
+
+
+def _fill(out, rate, value):
+    out[...] = value
+
+
+def _avg(out, x, rate, n):
+    # mean of the last n samples, of as many as there are at the start
+    n = int(n)
+    total = np.cumsum(x, axis=-1, dtype=np.float64)
+    n = min(n, x.shape[-1])
+    out[..., :n] = total[..., :n] / np.arange(1, n + 1)
+    np.subtract(total[..., n:], total[..., :-n], out=out[..., n:], casting="unsafe")
+    out[..., n:] /= n
+
+
+def _deriv(out, x, rate):
+    # central differences, one-sided at the ends
+    np.subtract(x[..., 2:], x[..., :-2], out=out[..., 1:-1])
+    out[..., 1:-1] *= rate / 2
+    out[..., :1] = (x[..., 1:2] - x[..., :1]) * rate
+    out[..., -1:] = (x[..., -1:] - x[..., -2:-1]) * rate
+
+
+def _integ(out, x, rate):
+    out[..., 0] = 0.0
+    np.add(x[..., 1:], x[..., :-1], out=out[..., 1:])
+    np.cumsum(out[..., 1:], axis=-1, out=out[..., 1:])
+    out[..., 1:] *= 0.5 / rate
+
+
+def _fir(out, x, rate, *taps):
+    # causal, samples before the first one are taken to equal it
+    taps = np.array(taps, np.float64)
+    padded = np.concatenate([np.repeat(x[..., :1], len(taps) - 1, axis=-1), x], axis=-1)
+    windows = np.lib.stride_tricks.sliding_window_view(padded, len(taps), axis=-1)
+    np.matmul(windows, taps[::-1].astype(x.dtype), out=out)
+
+
+@lru_cache(maxsize=32)
+def _powers(base, count):
+    powers = base ** np.arange(count, dtype=np.float64)
+    powers.flags.writeable = False
+    return powers
+
+
+def _iir(out, x, alpha):
+    # y[k] = y[k-1] + alpha (x[k] - y[k-1]), starting settled at x[0]. With
+    # r = 1 - alpha that is y[k] = r^k (r y[-1] + sum(alpha r^-j x[j], j <= k)),
+    # a cumulative sum. Blocks are kept short enough for r^-j to stay in range.
+    r = 1.0 - alpha
+    if r <= 0.0:
+        out[...] = x
+        return
+    block = max(int(_iir_range / -math.log(r)), 1) if r < 1.0 else x.shape[-1]
+    state = x[..., :1].astype(np.float64)
+    for pos in range(0, x.shape[-1], block):
+        part = x[..., pos : pos + block]
+        powers = _powers(r, part.shape[-1])
+        acc = np.cumsum(part * (alpha / powers), axis=-1)
+        acc += r * state
+        acc *= powers
+        out[..., pos : pos + block] = acc
+        state = acc[..., -1:]
+
+
+def _lowpass(out, x, rate, fc):
+    # frames sampled at different rates need different coefficients
+    rates = np.unique(rate)
+    for spl_rate in rates:
+        alpha = 1.0 - math.exp(-2 * math.pi * fc / spl_rate)
+        if len(rates) == 1:
+            _iir(out, x, alpha)
+        else:
+            rows = np.flatnonzero(rate[:, 0] == spl_rate)
+            part = np.empty((len(rows), x.shape[-1]), out.dtype)
+            _iir(part, x[rows], alpha)
+            out[rows] = part
+
+
+def _highpass(out, x, rate, fc):
+    _lowpass(out, x, rate, fc)
+    np.subtract(x, out, out=out)
+
+
+# name: function, number of parameters (None: any, at least one), their check
+_filters = {
+    "avg": (_avg, 1, lambda n: n >= 1),
+    "deriv": (_deriv, 0, None),
+    "integ": (_integ, 0, None),
+    "fir": (_fir, None, None),
+    "lowpass": (_lowpass, 1, lambda fc: fc > 0),
+    "highpass": (_highpass, 1, lambda fc: fc > 0),
+}
+
+
+class _Compiler:
+    # Turns the syntax tree into a list of steps (function, elementwise, output
+    # slot, operands, constants). Slots 0 and 1 hold A0 and A1, each step writes
+    # into a slot of its own. Constant subexpressions are folded.
+
+    def __init__(self):
+        self.steps = []
+        self.slots = 2
+
+    def _step(self, fn, args, consts=None):
+        # ufuncs are called as fn(*args, out=out), filters as
+        # fn(out, signal, spl_rate, *consts)
+        elementwise = consts is None
+        self.steps.append((fn, elementwise, self.slots, tuple(args), consts or ()))
+        self.slots += 1
+        return ("slot", self.slots - 1)
+
+    def result(self, tree):
+        # slot of the result, a constant fills a slot of its own
+        kind, value = self.operand(tree.body)
+        if kind == "const":
+            return self._step(_fill, (), (value,))[1]
+        return value
+
+    def operand(self, node):
+        # ("slot", index) or ("const", value)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return ("const", float(node.value))
+        if isinstance(node, ast.Name):
+            name = node.id.upper()
+            if name not in _inputs:
+                raise ValueError("Unknown channel '{}', use A0 or A1".format(node.id))
+            return ("slot", _inputs[name])
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            value = self.operand(node.operand)
+            if isinstance(node.op, ast.UAdd):
+                return value
+            if value[0] == "const":
+                return ("const", -value[1])
+            return self._step(np.negative, (value,))
+        if isinstance(node, ast.BinOp) and type(node.op) in _binary:
+            fn = _binary[type(node.op)]
+            left, right = self.operand(node.left), self.operand(node.right)
+            if left[0] == right[0] == "const":
+                with np.errstate(all="ignore"):
+                    return ("const", float(fn(left[1], right[1])))
+            return self._step(fn, (left, right))
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            return self._call(node)
+        raise ValueError("Not allowed in expressions: {}".format(type(node).__name__))
+
+    def _call(self, node):
+        name = node.func.id.lower()
+        if node.keywords:
+            raise ValueError("{}() takes no keyword arguments".format(name))
+        args = [self.operand(arg) for arg in node.args]
+
+        if name in _elementwise:
+            fn = _elementwise[name]
+            if len(args) != 1:
+                raise ValueError("{}() takes one argument".format(name))
+            if args[0][0] == "const":
+                with np.errstate(all="ignore"):
+                    return ("const", float(fn(args[0][1])))
+            return self._step(fn, args)
+
+        if name in _filters:
+            fn, params, check = _filters[name]
+            if not args:
+                raise ValueError("{}() needs a signal".format(name))
+            if params is not None and len(args) != params + 1:
+                raise ValueError(
+                    "{}() takes a signal and {} number(s)".format(name, params)
+                )
+            if len(args) < 2 and params is None:
+                raise ValueError("{}() needs at least one coefficient".format(name))
+            if args[0][0] == "const":
+                raise ValueError("{}() needs a channel to work on".format(name))
+            if any(kind != "const" for kind, _ in args[1:]):
+                raise ValueError("Parameters of {}() must be numbers".format(name))
+            consts = [value for _, value in args[1:]]
+            if check is not None and not check(*consts):
+                raise ValueError("Invalid parameters for {}()".format(name))
+            return self._step(fn, args[:1], consts)
+
+        raise ValueError("Unknown function '{}'".format(name))
+
+
+@lru_cache(maxsize=64)
+def compile_expression(expression):
+    # (steps, slot count, result slot): the evaluation plan of an expression,
+    # shared by all channels using it. Raises ValueError if it can't be evaluated.
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ValueError("Syntax error in '{}': {}".format(expression, e.msg))
+    compiler = _Compiler()
+    result = compiler.result(tree)
+    return tuple(compiler.steps), compiler.slots, result
+
+
+class MathChannel:
+    # A derived signal, evaluated on whole frames (or batches of them) at once
+    # following the compiled plan. Intermediate results go into buffers allocated
+    # once per frame size. The result of the last frame is kept: evaluating it
+    # again, e.g. to redraw a stopped frame, costs nothing. Results live in those
+    # buffers, copy them to keep them beyond the next evaluation. With an
+    # `aligner`, A1 is resampled onto A0's sample times first. The result belongs
+    # to A0's time axis in any case.
+
+    def __init__(self, expression, name="M1", aligner=None):
+        self._plan = compile_expression(expression)
+        self.expression = expression
+        self.name = name
+        self.aligner = aligner
+        self._buffers = None
+        self._key = None
+        self._result = None
+
+    def copy(self):
+        # same expression, own buffers (e.g. for another thread)
+        aligner = None if self.aligner is None else self.aligner.copy()
+        return MathChannel(self.expression, self.name, aligner)
+
+    def evaluate(self, frame):
+        # volts, one per sample of A0
+        method = None if self.aligner is None else self.aligner.method
+        key = (id(frame), frame.timestamp, method)
+        if key != self._key:
+            a1 = frame.data1 if self.aligner is None else self.aligner.align(frame)
+            rate = np.array([[frame.spl_rate]])
+            self._result = self._run(frame.data0[None], a1[None], rate)[0]
+            self._key = key
+        return self._result
+
+    def evaluate_batch(self, volts, spl_rate, delay=None):
+        # volts: (frames, 2, samples), with the sample rate and the delay of A1 in
+        # samples (see ChannelAligner) of each frame. Not cached.
+        a1 = volts[:, 1]
+        if delay is not None and self.aligner is not None:
+            if self.aligner.method is not None and np.any(delay):
+                a1 = a1.copy()
+                for value in np.unique(delay):
+                    rows = np.flatnonzero(delay == value)
+                    a1[rows] = self.aligner.resample(volts[rows, 1], value)
+        rate = np.asarray(spl_rate, np.float64).reshape((-1, 1))
+        self._key = None  # the buffers may hold the cached frame
+        return self._run(volts[:, 0], a1, rate)
+
+    def _run(self, a0, a1, rate):
+        steps, slots, result = self._plan
+        if self._buffers is None or self._buffers[0].shape != a0.shape:
+            # at least one, so there is a shape to compare to
+            count = max(slots - 2, 1)
+            self._buffers = [np.empty(a0.shape, np.float32) for _ in range(count)]
+            self._key = None
+        values = [a0, a1] + self._buffers
+
+        with np.errstate(all="ignore"):  # NaN / inf where undefined
+            for fn, elementwise, out, args, consts in steps:
+                args = [values[v] if kind == "slot" else v for kind, v in args]
+                if elementwise:
+                    fn(*args, out=values[out])
+                else:
+                    fn(values[out], *args, rate, *consts)
+        return values[result]
@@ -0,0 +1,251 @@
+import math
+
+import numpy as np
+
+# name: (label, unit), in display order
+measurement_info = {
+    "mean": ("Vavg", "V"),
+    "pp": ("Vpp", "V"),
+    "min": ("Vmin", "V"),
+    "max": ("Vmax", "V"),
+    "rms": ("Vrms", "V"),
+    "freq": ("f", "Hz"),
+    "period": ("T", "s"),
+    "duty": ("Duty", "%"),
+    "rise": ("Rise", "s"),
+    "fall": ("Fall", "s"),
+    "overshoot": ("Overshoot", "%"),
+}
+measurements = list(measurement_info)
+
+# these need the top/base levels and the transitions between them
+_edge_measurements = {"freq", "period", "duty", "rise", "fall", "overshoot"}
+_min_amplitude = 4  # codes, anything smaller is noise without edges
+
+
+def _first_last(groups, count):
+    # index of the first and last entry of each group in a sorted group array,
+    # -1 for groups without entries
+    first = np.searchsorted(groups, np.arange(count))
+    last = np.searchsorted(groups, np.arange(count), side="right") - 1
+    empty = first > last
+    first[empty] = last[empty] = -1
+    return first, last
+
+
+def _group_mean(groups, values, count):
+    # per group, NaN for groups without values
+    n = np.bincount(groups, minlength=count)
+    sums = np.bincount(groups, weights=values, minlength=count)
+    return np.divide(sums, n, out=np.full(count, np.nan), where=n > 0)
+
+
+def _edges(volts, lo, hi):
+    # Transitions through a Schmitt trigger between lo and hi (one per row), of
+    # all rows at once. Returns (rising, falling) as (row, start, end) arrays:
+    # fractional sample positions of the interpolated lo and hi crossings, in
+    # order of row, then position.
+    high = volts > hi
+    rows, held = np.nonzero(high | (volts < lo))
+    states = high[rows, held]
+
+    # samples in between the thresholds keep the state of the last one outside,
+    # the edge leaves one threshold right after `before` and reaches the other
+    # just before `after`
+    change = np.flatnonzero((states[1:] != states[:-1]) & (rows[1:] == rows[:-1]))
+    row, before, after = rows[change], held[change], held[change + 1]
+    up = states[change + 1]
+
+    def crossing(row, i, level):
+        # between sample i and i + 1
+        v0, v1 = volts[row, i], volts[row, i + 1]
+        return i + (level[row] - v0) / (v1 - v0)
+
+    r, f = row[up], row[~up]
+    rising = (
+        r,
+        crossing(r, before[up], lo[:, 0]),
+        crossing(r, after[up] - 1, hi[:, 0]),
+    )
+    falling = (
+        f,
+        crossing(f, before[~up], hi[:, 0]),
+        crossing(f, after[~up] - 1, lo[:, 0]),
+    )
+    return rising, falling
+
+
+def _edge_measure(volts, spl_rate, result):
+    # rows of volts with edges to measure, result holds their amplitude values
+    rows, samples = volts.shape
+    vmin, vmax = result["min"], result["max"]
+
+    # top and base as mean of the upper and lower half of the samples
+    upper = volts > ((vmin + vmax) / 2)[:, None]
+    count = np.count_nonzero(upper, axis=1)
+    top_sum = np.sum(volts, axis=1, where=upper, dtype=np.float64)
+    top = top_sum / count
+    base = (result["mean"] * samples - top_sum) / (samples - count)
+    amplitude = top - base
+    result["overshoot"] = (vmax - top) / amplitude * 100
+
+    # 10% / 90% thresholds, mid of an edge is where the signal is at 50%
+    lo = (base + 0.1 * amplitude)[:, None]
+    hi = (base + 0.9 * amplitude)[:, None]
+    (r_row, r_start, r_end), (f_row, f_start, f_end) = _edges(volts, lo, hi)
+    result["rise"] = _group_mean(r_row, r_end - r_start, rows) / spl_rate
+    result["fall"] = _group_mean(f_row, f_end - f_start, rows) / spl_rate
+
+    rise_mid = (r_start + r_end) / 2
+    fall_mid = (f_start + f_end) / 2
+    first, last = _first_last(r_row, rows)
+    periods = last - first
+    period = np.divide(
+        rise_mid[last] - rise_mid[first],
+        periods,
+        out=np.full(rows, np.nan),
+        where=periods > 0,
+    )
+    result["period"] = period / spl_rate
+    result["freq"] = spl_rate / period
+
+    # high time of each full period: first falling edge after its rising one.
+    # Positions of a row are offset past those of the rows before it.
+    offset = samples + 1
+    rise_key = r_row * offset + rise_mid
+    fall_key = f_row * offset + fall_mid
+    full = np.flatnonzero(r_row[1:] == r_row[:-1])  # rising edges with a next one
+    nxt = np.searchsorted(fall_key, rise_key[full])
+    found = nxt < len(fall_key)
+    full, nxt = full[found], nxt[found]
+    found = f_row[nxt] == r_row[full]
+    full, nxt = full[found], nxt[found]
+    high = fall_mid[nxt] - rise_mid[full]
+    length = rise_mid[full + 1] - rise_mid[full]
+    inside = high < length
+    duty = _group_mean(r_row[full][inside], (high / length)[inside], rows)
+    result["duty"] = duty * 100
+
+
+def measure_channels(volts, spl_rate, select=measurements, vref=5.0):
+    # Requested measurements of each row of volts (channels x samples, float)
+    # sampled at spl_rate, a dict per channel. All channels go through the same
+    # few array operations together: one reduction per amplitude value and one
+    # pass of level crossings for all timing. NaN where it can't be determined,
+    # e.g. frequency without two full periods on screen.
+    volts = np.asarray(volts)
+    channels, samples = volts.shape
+    result = dict.fromkeys(measurements, np.full(channels, np.nan))
+    result["min"] = vmin = volts.min(axis=1).astype(np.float64)
+    result["max"] = vmax = volts.max(axis=1).astype(np.float64)
+    result["pp"] = vmax - vmin
+    result["mean"] = volts.sum(axis=1, dtype=np.float64) / samples
+    if "rms" in select:
+        power = np.einsum("ij,ij->i", volts, volts, dtype=np.float64)
+        result["rms"] = np.sqrt(power / samples)
+
+    if not _edge_measurements.isdisjoint(select):
+        measured = vmax - vmin >= _min_amplitude / 0xFF * vref
+        if measured.all():
+            _edge_measure(volts, spl_rate, result)
+        elif measured.any():
+            part = {name: result[name][measured] for name in ("min", "max", "mean")}
+            _edge_measure(volts[measured], spl_rate, part)
+            for name in _edge_measurements:
+                values = result[name] = result[name].copy()
+                values[measured] = part[name]
+
+    columns = [result[name].tolist() for name in select]
+    rows = zip(*columns) if columns else [()] * channels
+    return [dict(zip(select, values)) for values in rows]
+
+
+def measure(volts, spl_rate, select=measurements, vref=5.0):
+    # measurements of one channel, see measure_channels()
+    return measure_channels(np.asarray(volts)[None], spl_rate, select, vref)[0]
+
+
+class RunningStats:
+    # min, max, mean and standard deviation over all values added so far,
+    # Welford's update, O(1) per value. NaNs are not counted.
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.min = math.nan
+        self.max = math.nan
+        self.mean = math.nan
+        self._m2 = 0.0
+
+    def add(self, value):
+        if math.isnan(value):
+            return
+        self.count += 1
+        if self.count == 1:
+            self.min = self.max = self.mean = value
+            return
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    @property
+    def std(self):
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else math.nan
+
+
+class MeasurementEngine:
+    # Measures both channels of each frame passed to update() and keeps running
+    # statistics of every measurement across frames. Results of the last frame
+    # are in .results[chan][name], the statistics in .stats[chan][name], for the
+    # channels named in .names. Further channels sampled on A0's time axis (math
+    # channels) can be passed as {name: volts}, they follow A0 and A1.
+
+    def __init__(self, select=("mean", "pp")):
+        self.results = [{}, {}]
+        self.names = ["A0", "A1"]
+        self.select(select)
+
+    def select(self, names):
+        unknown = set(names) - set(measurements)
+        if unknown:
+            raise ValueError("Unknown measurements: {}".format(", ".join(unknown)))
+        self.selected = [name for name in measurements if name in names]
+        self.stats = [self._stats_make() for _ in self.names]
+
+    def _stats_make(self):
+        return {name: RunningStats() for name in self.selected}
+
+    def reset(self):
+        for chan_stats in self.stats:
+            for stats in chan_stats.values():
+                stats.reset()
+
+    def reset_channel(self, name):
+        # e.g. its math expression changed
+        if name in self.names:
+            for stats in self.stats[self.names.index(name)].values():
+                stats.reset()
+
+    def measure(self, frame, extra=None):
+        # last results without touching the statistics
+        volts = frame.volts
+        if extra:
+            volts = np.concatenate([volts, np.stack(list(extra.values()))])
+        return measure_channels(volts, frame.spl_rate, self.selected, frame.vref)
+
+    def update(self, frame, extra=None):
+        names = ["A0", "A1"] + list(extra or {})
+        if names != self.names:
+            # channels that stay keep their statistics
+            kept = dict(zip(self.names, self.stats))
+            self.stats = [kept.get(name) or self._stats_make() for name in names]
+            self.names = names
+        self.results = self.measure(frame, extra)
+        for result, chan_stats in zip(self.results, self.stats):
+            for name, stats in chan_stats.items():
+                stats.add(result[name])
+        return self.results
@@ -0,0 +1,463 @@
+import asyncio
+import socket
+import threading
+from functools import lru_cache
+from time import sleep
+
+import numpy as np
+
+from .driver import (
+    Config,
+    FramePool,
+    FrameQueue,
+    TriggerEdge,
+    TriggerMode,
+    UnoDriver,
+)
+
+# Network stream (TCP), all values little endian. Every message is a header
+# (message_dtype, 8 bytes: magic "GN", kind, length of the body) and a body:
+#
+#   FRAME   server -> client   frame_dtype (86 bytes): arrival timestamp, sample
+#                              rate, time of the first sample and between samples,
+#                              A1 delay, vref, frame sequence number (gaps are
+#                              frames dropped for this client), frames dropped and
+#                              resyncs at the device, samples per channel,
+#                              triggered flag and the config in effect; then the
+#                              raw 8-bit codes of A0 and A1 (2 x samples bytes)
+#   CONFIG  client -> server   config_msg_dtype: a Config to apply, ignored by a
+#                              read-only server
+#
+# Frames are encoded once and the same bytes go to every client. Each client has
+# its own short queue, a slow one loses its oldest frames instead of holding up
+# the others or the board.
+
+message_magic = b"GN"
+default_port = 5025
+
+MSG_FRAME = 0
+MSG_CONFIG = 1
+
+message_dtype = np.dtype(
+    [("magic", "S2"), ("kind", "u1"), ("reserved", "u1"), ("length", "<u4")]
+)
+
+config_msg_dtype = np.dtype(
+    [
+        ("trig_level", "<f8"),  # full precision, configs compare equal after it
+        ("timeframe", "<f8"),
+        ("sgen_freq", "<f8"),
+        ("trig_mode", "u1"),
+        ("trig_chan", "u1"),
+        ("trig_edge", "u1"),
+        ("reserved", "u1"),
+    ]
+)
+
+frame_dtype = np.dtype(
+    [
+        ("timestamp", "<f8"),
+        ("spl_rate", "<f8"),
+        ("time0", "<f8"),  # time of the first sample
+        ("dt", "<f8"),  # time between samples
+        ("channel1_delay", "<f8"),
+        ("vref", "<f4"),
+        ("seq", "<u4"),
+        ("dropped", "<u4"),
+        ("resyncs", "<u2"),
+        ("samples", "<u2"),
+        ("triggered", "u1"),
+        ("has_config", "u1"),
+        ("config", config_msg_dtype),
+    ]
+)
+
+
+def _message(kind, body):
+    header = np.zeros(1, dtype=message_dtype)
+    header["magic"] = message_magic
+    header["kind"] = kind
+    header["length"] = len(body)
+    return header.tobytes() + body
+
+
+def _config_to(entry, config):
+    entry["trig_level"] = config.trig_level
+    entry["timeframe"] = config.timeframe
+    entry["sgen_freq"] = config.sgen_freq
+    entry["trig_mode"] = config.trig_mode
+    entry["trig_chan"] = config.trig_chan
+    entry["trig_edge"] = config.trig_edge
+
+
+def _config_from(entry):
+    return Config(
+        trig_mode=TriggerMode(int(entry["trig_mode"])),
+        trig_level=float(entry["trig_level"]),
+        trig_chan=int(entry["trig_chan"]),
+        trig_edge=TriggerEdge(int(entry["trig_edge"])),
+        timeframe=float(entry["timeframe"]),
+        sgen_freq=float(entry["sgen_freq"]),
+    )
+
+
+def config_encode(config):
+    body = np.zeros(1, dtype=config_msg_dtype)
+    _config_to(body[0], config)
+    return _message(MSG_CONFIG, body.tobytes())
+
+
+class FrameEncoder:
+    # frame messages, the header array is reused for every frame
+
+    def __init__(self):
+        self._info = np.zeros(1, dtype=frame_dtype)
+        self._header = np.zeros(1, dtype=message_dtype)
+        self._header["magic"] = message_magic
+        self._header["kind"] = MSG_FRAME
+
+    def encode(self, frame, seq=0, dropped=0, resyncs=0):
+        info = self._info[0]
+        samples = frame.codes.shape[1]
+        info["timestamp"] = frame.timestamp
+        info["spl_rate"] = frame.spl_rate
+        info["time0"] = frame.time0[0]
+        info["dt"] = frame.time0[1] - frame.time0[0] if samples > 1 else 0.0
+        info["channel1_delay"] = frame.time1[0] - frame.time0[0]
+        info["vref"] = frame.vref
+        info["seq"] = seq & 0xFFFFFFFF
+        info["dropped"] = dropped & 0xFFFFFFFF
+        info["resyncs"] = resyncs & 0xFFFF
+        info["samples"] = samples
+        info["triggered"] = frame.triggered
+        info["has_config"] = frame.config is not None
+        if frame.config is not None:
+            _config_to(info["config"], frame.config)
+
+        self._header["length"] = frame_dtype.itemsize + frame.codes.nbytes
+        return b"".join(
+            (self._header.tobytes(), self._info.tobytes(), frame.codes.tobytes())
+        )
+
+
+@lru_cache(maxsize=16)
+def _timebase(samples, time0, dt, channel1_delay):
+    # shared by all frames of a timebase, hence read-only
+    t0 = time0 + np.arange(samples) * dt
+    t1 = t0 + channel1_delay
+    t0.flags.writeable = False
+    t1.flags.writeable = False
+    return t0, t1
+
+
+class _Client:
+    def __init__(self, writer, queue_size):
+        self.writer = writer
+        self.peer = writer.get_extra_info("peername")
+        self.task = asyncio.current_task()  # the one serving it
+        self.queue = asyncio.Queue(queue_size)
+        self.frames_sent = 0
+        self.dropped = 0
+
+    def put(self, message):
+        # never waits: a slow client loses its oldest frames
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+
+class FrameServer:
+    # Shares one acquisition (an AsyncUnoDriver or anything with its frames()
+    # and configure()) with any number of TCP clients. Configs sent by clients
+    # are applied unless the server is read-only.
+
+    _queue_size = 8
+
+    def __init__(
+        self,
+        source,
+        host="0.0.0.0",
+        port=default_port,
+        queue_size=_queue_size,
+        read_only=False,
+    ):
+        self._source = source
+        self._host = host
+        self._port = port
+        self._queue_size = queue_size
+        self._read_only = read_only
+        self._encoder = FrameEncoder()
+        self._server = None
+        self._pump = None
+        self.clients = set()
+        self.frames = 0
+
+    @property
+    def port(self):
+        # the one actually bound, e.g. when asked for port 0
+        return self._server.sockets[0].getsockname()[1]
+
+    async def start(self):
+        self._server = await asyncio.start_server(
+            self._client_run, self._host, self._port
+        )
+        self._pump = asyncio.get_running_loop().create_task(self._pump_run())
+
+    async def close(self):
+        self._pump.cancel()
+        self._server.close()
+        tasks = [client.task for client in self.clients]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._server.wait_closed()
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    async def _pump_run(self):
+        device = getattr(self._source, "driver", None)
+        async for frame in self._source.frames():
+            self.frames += 1
+            if not self.clients:
+                continue
+            message = self._encoder.encode(
+                frame,
+                self.frames,
+                getattr(device, "dropped_frames", 0),
+                getattr(device, "resyncs", 0),
+            )
+            for client in self.clients:
+                client.put(message)
+
+    async def _client_run(self, reader, writer):
+        client = _Client(writer, self._queue_size)
+        self.clients.add(client)
+        print("Client {} connected".format(client.peer))
+        sender = asyncio.get_running_loop().create_task(self._client_send(client))
+        try:
+            while True:
+                header = np.frombuffer(
+                    await reader.readexactly(message_dtype.itemsize), message_dtype
+                )[0]
+                if header["magic"] != message_magic:
+                    break  # not talking our protocol
+                body = await reader.readexactly(int(header["length"]))
+                if header["kind"] == MSG_CONFIG and not self._read_only:
+                    config = np.frombuffer(body, config_msg_dtype, count=1)[0]
+                    await self._source.configure(_config_from(config))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            pass  # the server is closing
+        finally:
+            sender.cancel()
+            self.clients.discard(client)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+            print(
+                "Client {} gone after {} frames, {} dropped".format(
+                    client.peer, client.frames_sent, client.dropped
+                )
+            )
+
+    async def _client_send(self, client):
+        try:
+            while True:
+                client.writer.write(await client.queue.get())
+                await client.writer.drain()
+                client.frames_sent += 1
+        except ConnectionError:
+            client.writer.close()
+
+
+class NetDriver:
+    # Client of a FrameServer with the interface of a local UnoDriver, for the
+    # GUI or record. Reads in its own thread and reconnects when the connection
+    # drops. dropped_frames includes the frames lost at the board and the ones
+    # the server dropped for us (gaps in the sequence numbers).
+
+    _poll_delay_ms = 5
+    _queue_size = 4
+    _timeout = 1.0
+    _retry_delay = 1.0
+
+    def __init__(self, host, port=default_port, queue_size=_queue_size, history=None):
+        self.history = history
+        self._address = (host, port)
+        self._sock = None
+        self._send_lock = threading.Lock()
+        self._last_config = None
+        self._upd_callback = None
+        self._poll_timer = None
+        self._frames = FrameQueue(queue_size)
+        self._pool = None
+        self._pool_size = queue_size + UnoDriver._held_frames
+        self._header = bytearray(message_dtype.itemsize)
+        self._body = bytearray()  # grows to the largest message
+        self._seq = None
+
+        self.server_dropped = 0
+        self.device_dropped = 0
+        self.resyncs = 0
+        self.config_dropped_frames = 0
+        self.connects = 0
+
+        self._running = True
+        self._reader = threading.Thread(
+            target=self._reader_run, name="gruseloskop-net", daemon=True
+        )
+        self._reader.start()
+
+    @property
+    def dropped_frames(self):
+        return self._frames.dropped + self.server_dropped + self.device_dropped
+
+    def close(self):
+        self._running = False
+        sock = self._sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)  # wakes up the reader
+            except OSError:
+                pass
+        if self._reader.is_alive() and self._reader is not threading.current_thread():
+            self._reader.join()
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        if self._poll_timer is not None:
+            self._poll_timer.stop()
+
+    def set_config(self, config):
+        assert isinstance(config, Config)
+        self._last_config = config
+        self._config_send()
+
+    def _config_send(self):
+        sock = self._sock
+        if sock is None or self._last_config is None:
+            return
+        try:
+            with self._send_lock:
+                sock.sendall(config_encode(self._last_config))
+        except OSError:
+            pass  # the reader notices and reconnects, sending it again
+
+    def set_update_callback(self, callback):
+        # newest frame is delivered in the Qt thread, needs a running event loop
+        from pyqtgraph.Qt import QtCore
+
+        self._upd_callback = callback
+        if self._poll_timer is None:
+            self._poll_timer = QtCore.QTimer()
+            self._poll_timer.timeout.connect(self._poll)
+            self._poll_timer.start(NetDriver._poll_delay_ms)
+
+    def get_frame(self, timeout=None):
+        return self._frames.get(timeout)
+
+    def _recv_into(self, view):
+        while view:
+            received = self._sock.recv_into(view)
+            if received == 0:
+                raise ConnectionError("server closed the connection")
+            view = view[received:]
+
+    def _receive(self):
+        self._recv_into(memoryview(self._header))
+        header = np.frombuffer(self._header, message_dtype, count=1)[0]
+        if header["magic"] != message_magic:
+            raise ConnectionError("not a gruseloskop server")
+        kind, length = int(header["kind"]), int(header["length"])
+
+        if len(self._body) < length:
+            self._body = bytearray(length)
+        body = memoryview(self._body)[:length]
+        self._recv_into(body)
+        if kind != MSG_FRAME:
+            return None
+        return self._frame_decode(body)
+
+    def _frame_decode(self, body):
+        info = np.frombuffer(body, frame_dtype, count=1)[0]
+        samples = int(info["samples"])
+        vref = float(info["vref"])
+        if self._pool is None or self._pool_key != (samples, vref):
+            self._pool = FramePool(self._pool_size, samples, vref)
+            self._pool_key = (samples, vref)
+
+        frame = self._pool.acquire()
+        codes = np.frombuffer(
+            body, np.uint8, count=2 * samples, offset=frame_dtype.itemsize
+        )
+        np.copyto(frame.codes, codes.reshape((2, samples)))
+        frame.time0, frame.time1 = _timebase(
+            samples,
+            float(info["time0"]),
+            float(info["dt"]),
+            float(info["channel1_delay"]),
+        )
+        frame.triggered = bool(info["triggered"])
+        frame.spl_rate = float(info["spl_rate"])
+        frame.timestamp = float(info["timestamp"])
+        frame.config = _config_from(info["config"]) if info["has_config"] else None
+
+        seq = int(info["seq"])
+        if self._seq is not None:
+            self.server_dropped += (seq - self._seq - 1) & 0xFFFFFFFF
+        self._seq = seq
+        self.device_dropped = int(info["dropped"])
+        self.resyncs = int(info["resyncs"])
+        return frame
+
+    def _reader_run(self):
+        while self._running:
+            try:
+                if self._sock is None:
+                    self._sock = socket.create_connection(
+                        self._address, NetDriver._timeout
+                    )
+                    self._sock.settimeout(None)
+                    self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    self._seq = None  # the server may have restarted
+                    self.connects += 1
+                    self._config_send()
+
+                frame = self._receive()
+            except ValueError as e:
+                # a message that doesn't decode, the next one may
+                print("Bad frame from {}:{}: {}".format(*self._address, e))
+                continue
+            except OSError as e:
+                if not self._running:
+                    break
+                print("Connection to {}:{} failed: {}".format(*self._address, e))
+                if self._sock is not None:
+                    self._sock.close()
+                    self._sock = None
+                sleep(NetDriver._retry_delay)
+                continue
+
+            if frame is None:
+                continue
+            config = frame.config
+            if config is not None and config.trig_mode == TriggerMode.ROLL:
+                # snapshots supersede each other, like with a local board
+                if len(self._frames):
+                    continue
+            elif (
+                self.history is not None
+                and frame.codes.shape[1] == self.history.chan_samples
+            ):
+                self.history.append(frame)
+            self._frames.put(frame)
+
+    def _poll(self):
+        frame = self._frames.latest()
+        if frame is not None and self._upd_callback is not None:
+            self._upd_callback(frame)
@@ -0,0 +1,119 @@
+class PacketFramer:
+    # Finds fixed-size packets starting with a sync word in a byte stream. Data is
+    # read straight into the buffer via writable()/commit(), complete packets are
+    # handed out as views by next_packet(). On a broken packet only that packet is
+    # skipped and the stream is scanned for the next sync word.
+    # Variable-size packets: length(header) gives the size of a packet from its
+    # first header_size bytes, packet_size is the largest one possible then.
+
+    def __init__(
+        self,
+        packet_size,
+        syncword,
+        nak=None,
+        resync_limit=4,
+        header_size=None,
+        length=None,
+    ):
+        self._packet_size = packet_size
+        self._header_size = header_size or len(syncword)
+        self._length = length
+        self._sync = bytes(syncword)
+        self._nak = nak
+        self._resync_limit = resync_limit
+
+        self._buf = bytearray(4 * packet_size)
+        self._view = memoryview(self._buf)
+        self._head = 0
+        self._tail = 0
+
+        self._synced = True
+        self._unsynced_bytes = 0
+        self._nak_seen = False
+
+        self.resyncs = 0
+        self.discarded_bytes = 0
+
+    def reset(self):
+        self._head = self._tail = 0
+        self._synced = True
+        self._unsynced_bytes = 0
+        self._nak_seen = False
+
+    @property
+    def lost(self):
+        # device explicitly asked for a reset or no sync for too long
+        limit = self._resync_limit * self._packet_size
+        return self._nak_seen or self._unsynced_bytes >= limit
+
+    def writable(self, size):
+        if self._head > 0:
+            pending = self._tail - self._head
+            self._view[:pending] = self._view[self._head : self._tail]
+            self._head, self._tail = 0, pending
+        size = min(size, len(self._buf) - self._tail)
+        return self._view[self._tail : self._tail + size]
+
+    def commit(self, count):
+        self._tail += count
+
+    def flush(self):
+        # the stream went idle: whatever is buffered will never complete a packet
+        if self._tail > self._head:
+            self._discard(self._tail - self._head)
+
+    def next_packet(self):
+        sync_size = len(self._sync)
+        while True:
+            pending = self._tail - self._head
+            if pending < sync_size:
+                return None
+
+            if self._view[self._head : self._head + sync_size] != self._sync:
+                self._resync()
+                continue
+
+            size = self._packet_size
+            if self._length is not None:
+                if pending < self._header_size:
+                    return None
+                header = self._view[self._head : self._head + self._header_size]
+                size = self._length(header)
+                if not self._header_size <= size <= self._packet_size:
+                    self._resync()
+                    continue
+
+            if pending < size:
+                return None
+
+            # the next packet must start right after this one, if it's there already
+            end = self._head + size
+            if pending >= size + sync_size:
+                if self._view[end : end + sync_size] != self._sync:
+                    self._resync()
+                    continue
+
+            packet = self._view[self._head : end]
+            self._head = end
+            self._synced = True
+            self._unsynced_bytes = 0
+            return packet
+
+    def _resync(self):
+        pos = self._buf.find(self._sync, self._head + 1, self._tail)
+        if pos < 0:
+            # keep the tail, it may be the beginning of a sync word
+            drop = max(1, self._tail - self._head - (len(self._sync) - 1))
+        else:
+            drop = pos - self._head
+            if drop == 1 and self._buf[self._head] == self._nak:
+                self._nak_seen = True
+        self._discard(drop)
+
+    def _discard(self, count):
+        if self._synced:
+            self.resyncs += 1
+            self._synced = False
+        self._head += count
+        self.discarded_bytes += count
+        self._unsynced_bytes += count
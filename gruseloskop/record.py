@@ -0,0 +1,394 @@
+import os
+from dataclasses import astuple
+from time import monotonic
+
+import numpy as np
+
+from .driver import Config, FrameData, TriggerEdge, TriggerMode
+
+# Capture file format (*.grc), all values little endian:
+#
+#   offset 0            header (header_dtype, 40 bytes): magic "GRUSCAP\0", format
+#                       version, samples per channel, config table capacity, number
+#                       of valid config entries, vref in volts, A1 delay vs. A0 in s,
+#                       byte offset of the first frame record
+#   offset 40           config table (config_capacity x config_dtype, 48 bytes each):
+#                       config history in order of appearance, each entry holding the
+#                       first frame using it, its sample rate (this is the sample-rate
+#                       table) and the trigger/timebase/generator settings
+#   record_offset       frame records (record_dtype, 16 + 2 * samples bytes each):
+#                       arrival timestamp, config table index, triggered flag, raw
+#                       8-bit codes of A0 then A1
+#
+# Records only ever get appended, header and config table are rewritten in place
+# when a new config shows up. Since records have a fixed size, frame N lives at
+# record_offset + N * record size and the whole file can be memory-mapped.
+#
+# Next to each capture file a sidecar index "<file>.idx" (numpy .npz) is written on
+# close: timestamps of every index_stride-th frame and the frames at which the
+# config changed. The reader rebuilds it if missing, e.g. after a crash.
+
+capture_magic = b"GRUSCAP\0"
+capture_version = 1
+index_stride = 1024
+
+header_dtype = np.dtype(
+    [
+        ("magic", "S8"),
+        ("version", "<u2"),
+        ("chan_samples", "<u2"),
+        ("config_capacity", "<u2"),
+        ("config_count", "<u2"),
+        ("vref", "<f8"),
+        ("channel1_delay", "<f8"),
+        ("record_offset", "<u8"),
+    ]
+)
+
+config_dtype = np.dtype(
+    [
+        ("first_frame", "<u8"),  # index of the first record using this config
+        ("spl_rate", "<f8"),
+        ("timeframe", "<f8"),
+        ("trig_level", "<f8"),
+        ("sgen_freq", "<f8"),
+        ("trig_mode", "u1"),
+        ("trig_chan", "u1"),
+        ("trig_edge", "u1"),
+        ("reserved", "u1", (5,)),
+    ]
+)
+
+
+def record_dtype(chan_samples):
+    return np.dtype(
+        [
+            ("timestamp", "<f8"),  # arrival time, seconds since epoch
+            ("config", "<u2"),  # index into the config table
+            ("triggered", "u1"),
+            ("reserved", "u1", (5,)),
+            ("codes", "u1", (2, chan_samples)),  # raw A0 and A1 samples
+        ]
+    )
+
+
+class CaptureWriter:
+    _config_capacity = 256
+
+    def __init__(
+        self,
+        path,
+        chan_samples,
+        vref,
+        channel1_delay,
+        max_bytes=0,
+        batch_frames=64,
+        flush_interval=1.0,
+    ):
+        self._path = path
+        self._max_bytes = max_bytes
+        self.flush_interval = flush_interval
+
+        self._header = np.zeros(1, dtype=header_dtype)
+        self._header["magic"] = capture_magic
+        self._header["version"] = capture_version
+        self._header["chan_samples"] = chan_samples
+        self._header["config_capacity"] = CaptureWriter._config_capacity
+        self._header["vref"] = vref
+        self._header["channel1_delay"] = channel1_delay
+        self._header["record_offset"] = (
+            header_dtype.itemsize
+            + CaptureWriter._config_capacity * config_dtype.itemsize
+        )
+        self._configs = np.zeros(CaptureWriter._config_capacity, dtype=config_dtype)
+        self._config_ids = {}
+
+        # records are collected here and written in one go
+        self._batch = np.zeros(batch_frames, dtype=record_dtype(chan_samples))
+        self._batch_bytes = self._batch.view(np.uint8).reshape((batch_frames, -1))
+        self._batch_timestamp = self._batch["timestamp"]
+        self._batch_config = self._batch["config"]
+        self._batch_triggered = self._batch["triggered"]
+        self._batch_codes = self._batch["codes"]
+        self._batch_len = 0
+        self._flushed_at = monotonic()
+
+        self._file = None
+        self._file_frames = 0
+        self._header_dirty = False
+        self._index_timestamps = []
+        self._index_changes = []
+        self.files = []
+        self.frames_written = 0
+
+        self._open_next()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def _record_size(self):
+        return self._batch.dtype.itemsize
+
+    def _file_bytes(self):
+        frames = self._file_frames + self._batch_len
+        return int(self._header["record_offset"][0]) + frames * self._record_size
+
+    def _open_next(self):
+        if self._file is not None:
+            self._close_file()
+
+        path = self._path
+        if self.files:
+            stem, ext = os.path.splitext(self._path)
+            path = "{}-{:04d}{}".format(stem, len(self.files), ext)
+
+        self._file = open(path, "wb", buffering=0)
+        self._file_frames = 0
+        self._header["config_count"] = 0
+        self._configs[:] = 0
+        self._config_ids.clear()
+        self._index_timestamps.clear()
+        self._index_changes.clear()
+        self._write_header()
+        self.files.append(path)
+
+    def _write_header(self):
+        self._file.seek(0)
+        self._file.write(self._header.tobytes())
+        self._file.write(self._configs.tobytes())
+        self._file.seek(0, os.SEEK_END)
+        self._header_dirty = False
+
+    def _config_id(self, frame):
+        key = (astuple(frame.config), frame.spl_rate)
+        config_id = self._config_ids.get(key)
+        if config_id is not None:
+            return config_id
+
+        config_id = int(self._header["config_count"][0])
+        if config_id == CaptureWriter._config_capacity:
+            self._open_next()
+            config_id = 0
+
+        entry = self._configs[config_id]
+        entry["first_frame"] = self._file_frames + self._batch_len
+        entry["spl_rate"] = frame.spl_rate
+        entry["timeframe"] = frame.config.timeframe
+        entry["trig_level"] = frame.config.trig_level
+        entry["sgen_freq"] = frame.config.sgen_freq
+        entry["trig_mode"] = frame.config.trig_mode
+        entry["trig_chan"] = frame.config.trig_chan
+        entry["trig_edge"] = frame.config.trig_edge
+
+        self._header["config_count"] = config_id + 1
+        self._config_ids[key] = config_id
+        self._header_dirty = True
+        return config_id
+
+    def write(self, frame):
+        if self._max_bytes and (self._file_frames or self._batch_len):
+            if self._file_bytes() + self._record_size > self._max_bytes:
+                self._open_next()
+
+        config_id = self._config_id(frame)
+        frame_index = self._file_frames + self._batch_len
+        if frame_index % index_stride == 0:
+            self._index_timestamps.append(frame.timestamp)
+        if not self._index_changes or self._index_changes[-1][1] != config_id:
+            self._index_changes.append((frame_index, config_id))
+
+        i = self._batch_len
+        self._batch_config[i] = config_id
+        self._batch_timestamp[i] = frame.timestamp
+        self._batch_triggered[i] = frame.triggered
+        self._batch_codes[i] = frame.codes
+        self._batch_len += 1
+
+        if self._batch_len == len(self._batch):
+            self.flush()
+        elif monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self._header_dirty:
+            self._write_header()
+        if self._batch_len:
+            self._file.write(self._batch_bytes[: self._batch_len])
+            self._file_frames += self._batch_len
+            self.frames_written += self._batch_len
+            self._batch_len = 0
+        self._flushed_at = monotonic()
+
+    def _close_file(self):
+        self.flush()
+        self._file.close()
+        self._file = None
+        index_write(
+            self.files[-1],
+            np.array(self._index_timestamps, dtype=np.float64),
+            np.array(self._index_changes, dtype=np.int64).reshape((-1, 2)),
+        )
+
+    def close(self):
+        if self._file is not None:
+            self._close_file()
+
+
+def index_write(path, timestamps, changes):
+    with open(path + ".idx", "wb") as f:
+        np.savez(f, stride=index_stride, timestamps=timestamps, changes=changes)
+
+
+class CaptureReader:
+    # Memory-maps a capture file, frames are zero-copy views into the mapping
+
+    def __init__(self, path):
+        self.path = path
+        self.header = np.memmap(path, dtype=header_dtype, mode="r", shape=(1,))[0]
+        if bytes(self.header["magic"]) != capture_magic.rstrip(b"\0"):
+            raise ValueError("{} is not a capture file".format(path))
+        if self.header["version"] != capture_version:
+            raise ValueError("Unsupported capture version {}".format(self.version))
+
+        self.chan_samples = int(self.header["chan_samples"])
+        self.vref = float(self.header["vref"])
+        self.channel1_delay = float(self.header["channel1_delay"])
+
+        self.configs = np.memmap(
+            path,
+            dtype=config_dtype,
+            mode="r",
+            offset=header_dtype.itemsize,
+            shape=(int(self.header["config_count"]),),
+        )
+
+        # a crashed recording may end with a partial record, ignore it
+        dtype = record_dtype(self.chan_samples)
+        offset = int(self.header["record_offset"])
+        count = (os.path.getsize(path) - offset) // dtype.itemsize
+        self.records = np.memmap(
+            path, dtype=dtype, mode="r", offset=offset, shape=(count,)
+        )
+        self.timestamps = self.records["timestamp"]
+
+        self._timebases = {}
+        self._config_objs = {}
+        self._index_load()
+
+    @property
+    def version(self):
+        return int(self.header["version"])
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, i):
+        return self.frame(i)
+
+    def _index_load(self):
+        try:
+            with np.load(self.path + ".idx") as index:
+                if int(index["stride"]) == index_stride:
+                    self._index_timestamps = index["timestamps"]
+                    self.config_changes = index["changes"]
+                    return
+        except (OSError, ValueError, KeyError):
+            pass
+        self.index_rebuild()
+
+    def index_rebuild(self):
+        self._index_timestamps = np.array(self.timestamps[::index_stride])
+        config = self.records["config"]
+        changed = np.flatnonzero(config[1:] != config[:-1]) + 1
+        frames = np.concatenate(([0], changed)) if len(config) else changed
+        self.config_changes = np.stack((frames, config[frames]), axis=1).astype(
+            np.int64
+        )
+
+    def index_at(self, timestamp):
+        # last frame recorded at or before timestamp, coarse index narrows it down
+        block = np.searchsorted(self._index_timestamps, timestamp, side="right")
+        lo = max(block - 1, 0) * index_stride
+        hi = min(block * index_stride + 1, len(self))
+        pos = lo + np.searchsorted(self.timestamps[lo:hi], timestamp, side="right")
+        return max(int(pos) - 1, 0)
+
+    def config_at(self, i):
+        # config table index in effect for frame i
+        row = np.searchsorted(self.config_changes[:, 0], i, side="right") - 1
+        return int(self.config_changes[max(row, 0), 1])
+
+    def config(self, config_id):
+        config = self._config_objs.get(config_id)
+        if config is None:
+            entry = self.configs[config_id]
+            config = Config(
+                trig_mode=TriggerMode(int(entry["trig_mode"])),
+                trig_level=float(entry["trig_level"]),
+                trig_chan=int(entry["trig_chan"]),
+                trig_edge=TriggerEdge(int(entry["trig_edge"])),
+                timeframe=float(entry["timeframe"]),
+                sgen_freq=float(entry["sgen_freq"]),
+            )
+            self._config_objs[config_id] = config
+        return config
+
+    def timebase(self, config_id):
+        # same axes as the driver builds them, shared by all frames of a config
+        timebase = self._timebases.get(config_id)
+        if timebase is None:
+            spl_rate = float(self.configs[config_id]["spl_rate"])
+            n = self.chan_samples
+            time0 = np.linspace(0, n / spl_rate, n)
+            time1 = time0 + self.channel1_delay
+            time0.flags.writeable = False
+            time1.flags.writeable = False
+            timebase = self._timebases[config_id] = (time0, time1, spl_rate)
+        return timebase
+
+    def frame(self, i):
+        record = self.records[i]
+        config_id = int(record["config"])
+        time0, time1, spl_rate = self.timebase(config_id)
+
+        frame = FrameData(
+            time0,
+            time1,
+            self.records["codes"][i],
+            bool(record["triggered"]),
+            spl_rate,
+            self.vref,
+        )
+        frame.timestamp = float(record["timestamp"])
+        frame.config = self.config(config_id)
+        return frame
+
+    def close(self):
+        # views handed out keep the mapping alive until they are gone
+        del self.records, self.timestamps, self.configs, self.header
+
+
+def record(driver, writer, duration=None, max_frames=None):
+    # streams every frame the driver delivers until a limit is hit or Ctrl+C
+    start = monotonic()
+    frames = 0
+    try:
+        while duration is None or monotonic() - start < duration:
+            frame = driver.get_frame(timeout=writer.flush_interval)
+            if frame is None:
+                writer.flush()
+                continue
+
+            writer.write(frame)
+            frames += 1
+            if max_frames is not None and frames >= max_frames:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.close()
+    return frames
@@ -0,0 +1,129 @@
+from collections import OrderedDict, deque
+
+import numpy as np
+
+
+def minmax_envelope(x, y, x0, x1, columns):
+    # Reduces a trace with ascending x to the min and max of each of `columns`
+    # pixel columns between x0 and x1, interleaved as a line drawing both.
+    edges = np.searchsorted(x, np.linspace(x0, x1, columns + 1))
+    lo, hi = edges[0], edges[-1]
+    if hi <= lo:
+        return x[:0], y[:0]
+
+    starts = edges[:-1]
+    starts = starts[np.flatnonzero(edges[1:] > starts)] - lo  # non-empty columns
+    y = y[lo:hi]
+
+    xs = np.repeat(x[lo:hi][starts], 2)
+    ys = np.empty(2 * len(starts), dtype=y.dtype)
+    np.minimum.reduceat(y, starts, out=ys[0::2])
+    np.maximum.reduceat(y, starts, out=ys[1::2])
+    return xs, ys
+
+
+class Decimator:
+    # Envelopes of recently shown traces, so redrawing a stopped or replayed frame
+    # does not reduce it again. Short traces are passed through as they are.
+
+    def __init__(self, maxsize=64):
+        self._maxsize = maxsize
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self._cache.clear()
+
+    def envelope(self, key, x, y, x0, x1, columns):
+        if len(x) <= 2 * columns:
+            return x, y
+
+        key = (key, x0, x1, columns)
+        result = self._cache.get(key)
+        if result is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return result
+
+        self.misses += 1
+        result = minmax_envelope(x, y, x0, x1, columns)
+        self._cache[key] = result
+        if len(self._cache) > self._maxsize:
+            self._cache.popitem(last=False)
+        return result
+
+
+class PaintBudget:
+    # Smoothed paint time vs. frame budget: antialiasing goes off when painting gets
+    # too slow and back on once there is plenty of headroom again.
+
+    def __init__(self, budget, smoothing=0.2):
+        self.budget = budget
+        self._smoothing = smoothing
+        self.paint_time = 0.0
+        self.antialias = True
+
+    def add(self, seconds):
+        self.paint_time += self._smoothing * (seconds - self.paint_time)
+        if self.antialias and self.paint_time > self.budget:
+            self.antialias = False
+        elif not self.antialias and self.paint_time < self.budget / 4:
+            self.antialias = True
+
+
+class RenderScheduler:
+    # Decouples repaints from the acquisition rate: frames are pushed as they come
+    # in, each repaint takes the newest one. Frames replaced before they got on
+    # screen are counted as skipped.
+
+    def __init__(self):
+        self._pending = None
+        self.received = 0
+        self.shown = 0
+        self.skipped = 0
+
+    def push(self, frame):
+        if self._pending is not None:
+            self.skipped += 1
+        self._pending = frame
+        self.received += 1
+
+    def take(self):
+        frame, self._pending = self._pending, None
+        if frame is not None:
+            self.shown += 1
+        return frame
+
+
+class Persistence:
+    # Last traces of one curve joined into a single NaN separated line. Drawn with
+    # a translucent pen, overlapping traces blend like phosphor, at the cost of one
+    # curve. Traces are copied, pooled frame buffers are never held on to.
+
+    def __init__(self, depth=0):
+        self._traces = deque(maxlen=depth)
+
+    @property
+    def depth(self):
+        return self._traces.maxlen
+
+    def clear(self):
+        self._traces.clear()
+
+    def add(self, x, y):
+        if self.depth:
+            self._traces.append((np.array(x, np.float64), np.array(y, np.float64)))
+
+    def line(self):
+        size = sum(len(x) + 1 for x, _ in self._traces)
+        xs = np.empty(size)
+        ys = np.empty(size)
+        pos = 0
+        for x, y in self._traces:
+            end = pos + len(x)
+            xs[pos:end] = x
+            ys[pos:end] = y
+            xs[end] = ys[end] = np.nan
+            pos = end + 1
+        return xs, ys
@@ -0,0 +1,93 @@
+from time import monotonic
+
+from .driver import Config, TriggerMode
+from .record import CaptureReader
+
+
+class ReplayDriver:
+    # Plays a capture file back through the usual driver callback at the recorded
+    # pace. Trigger mode STOP pauses playback, seek() jumps to any frame.
+
+    _poll_delay_ms = 5
+
+    def __init__(self, path):
+        self._reader = CaptureReader(path)
+        self._upd_callback = None
+        self._last_config = Config()
+        self._poll_timer = None
+
+        self._pos = 0
+        self._paused = False
+        self._clock_anchor()
+
+        self.dropped_frames = 0
+        self.config_dropped_frames = 0
+        self.resyncs = 0
+
+    @property
+    def reader(self):
+        return self._reader
+
+    @property
+    def frame_count(self):
+        return len(self._reader)
+
+    @property
+    def position(self):
+        return self._pos
+
+    def close(self):
+        if self._poll_timer is not None:
+            self._poll_timer.stop()
+
+    def set_config(self, config):
+        # recorded data can't be re-acquired, only playback follows the trigger mode
+        assert isinstance(config, Config)
+        paused = config.trig_mode == TriggerMode.STOP
+        if self._paused and not paused:
+            self._clock_anchor()
+        self._paused = paused
+        self._last_config = config
+
+    def set_update_callback(self, callback):
+        from pyqtgraph.Qt import QtCore  # CaptureReader users don't need Qt
+
+        self._upd_callback = callback
+        if self._poll_timer is None:
+            self._poll_timer = QtCore.QTimer()
+            self._poll_timer.timeout.connect(self._poll)
+            self._poll_timer.start(ReplayDriver._poll_delay_ms)
+
+    def get_frame(self, timeout=None):
+        if self._pos >= self.frame_count:
+            return None
+        frame = self._reader.frame(self._pos)
+        self._pos += 1
+        return frame
+
+    def seek(self, pos):
+        self._pos = min(max(int(pos), 0), self.frame_count - 1)
+        self._clock_anchor()
+        self._deliver()
+
+    def _clock_anchor(self):
+        self._anchor_wall = monotonic()
+        self._anchor_rec = (
+            self._reader.timestamps[self._pos] if self.frame_count else 0.0
+        )
+
+    def _deliver(self):
+        if self._upd_callback is not None and self.frame_count:
+            self._upd_callback(self._reader.frame(self._pos))
+
+    def _poll(self):
+        if self._paused or not self.frame_count:
+            return
+
+        due = self._reader.index_at(self._anchor_rec + monotonic() - self._anchor_wall)
+        if due >= self.frame_count - 1 and self._pos == self.frame_count - 1:
+            self.seek(0)  # loop around at the end
+        elif due > self._pos:
+            self.dropped_frames += due - self._pos - 1  # GUI only shows the newest
+            self._pos = due
+            self._deliver()
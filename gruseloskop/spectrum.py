@@ -0,0 +1,269 @@
+import threading
+from collections import deque, namedtuple
+from enum import IntEnum
+from functools import lru_cache
+
+import numpy as np
+
+# name: label, in display order
+window_info = {
+    "rect": "Rectangular",
+    "hann": "Hann",
+    "hamming": "Hamming",
+    "blackman": "Blackman",
+    "flattop": "Flat top",
+}
+
+# cosine sums a0 - a1 cos(x) + a2 cos(2x) - ..., flat top as in ISO 18431-2
+_window_terms = {
+    "rect": [1.0],
+    "hann": [0.5, 0.5],
+    "hamming": [0.54, 0.46],
+    "blackman": [0.42, 0.5, 0.08],
+    "flattop": [0.21557895, 0.41663158, 0.277263158, 0.083578947, 0.006947368],
+}
+
+# numpy >= 2.0 writes the transform into a given buffer
+try:
+    np.fft.rfft(np.zeros(4, np.float32), out=np.empty(3, np.complex64))
+    _rfft_out = True
+except TypeError:
+    _rfft_out = False
+
+
+class Averaging(IntEnum):
+    NONE = 0
+    LINEAR = 1  # mean power of the last `count` frames
+    EXPONENTIAL = 2  # each new frame weighs 1 / count
+    PEAK = 3  # maximum since the last reset
+
+
+# Averaged power of both channels in dBV (RMS) per bin up to spl_rate / 2, over
+# `frames` frames. Arrays are the caller's, freq is shared and read-only.
+Spectrum = namedtuple("Spectrum", ["freq", "db", "spl_rate", "frames"])
+
+
+@lru_cache(maxsize=16)
+def window_coefficients(name, samples):
+    # Periodic window (the first sample of the next frame would be the last one)
+    # scaled for single-sided RMS amplitude: a sine of amplitude A reads A / sqrt(2)
+    # in its bin whatever the window. Shared by every frame of this size, read-only.
+    x = np.arange(samples) * (2 * np.pi / samples)
+    window = np.zeros(samples)
+    for k, a in enumerate(_window_terms[name]):
+        window += (-1) ** k * a * np.cos(k * x)
+    window *= np.sqrt(2) / window.sum()
+    window = window.astype(np.float32)
+    window.flags.writeable = False
+    return window
+
+
+@lru_cache(maxsize=16)
+def frequency_axis(samples, spl_rate):
+    freq = np.fft.rfftfreq(samples, 1.0 / spl_rate)
+    freq.flags.writeable = False
+    return freq
+
+
+class SpectrumAnalyzer:
+    # Power spectra of both channels of a batch of frames, averaged across batches.
+    # Input, transform and power buffers grow to the largest batch seen and are
+    # reused, as is the FFT (numpy keeps its plans per length). A change of sample
+    # count or rate starts averaging over.
+
+    def __init__(self, window="hann", averaging=Averaging.NONE, count=8):
+        self._input = None
+        self._transform = None
+        self._power = None
+        self.configure(window, averaging, count)
+
+    def configure(self, window="hann", averaging=Averaging.NONE, count=8):
+        if window not in window_info:
+            raise ValueError("Unknown window: {}".format(window))
+        if count < 1:
+            raise ValueError("Averaging count must be positive")
+        self.window = window
+        self.averaging = Averaging(averaging)
+        self.count = count
+        self.reset()
+
+    def reset(self):
+        self._key = None
+        self._average = None
+        self._ring = None  # last `count` spectra for linear averaging
+        self._ring_pos = 0
+        self._ring_len = 0
+        self.frames = 0
+
+    def _buffers(self, frames, samples):
+        if (
+            self._input is None
+            or self._input.shape[0] < frames
+            or self._input.shape[2] != samples
+        ):
+            bins = samples // 2 + 1
+            self._input = np.empty((frames, 2, samples), np.float32)
+            self._transform = np.empty((frames, 2, bins), np.complex64)
+            self._power = np.empty((frames, 2, bins), np.float32)
+        return (
+            self._input[:frames],
+            self._transform[:frames],
+            self._power[:frames],
+        )
+
+    def _powers(self, codes, vref):
+        # |rfft(volts * window)|^2 of each frame and channel
+        frames = len(codes)
+        samples = codes[0].shape[-1]
+        data, transform, power = self._buffers(frames, samples)
+        for i, frame_codes in enumerate(codes):
+            np.copyto(data[i], frame_codes)
+        window = window_coefficients(self.window, samples)
+        if np.issubdtype(codes[0].dtype, np.integer):
+            window = window * np.float32(vref / 0xFF)
+        np.multiply(data, window, out=data)
+
+        if _rfft_out:
+            np.fft.rfft(data, axis=-1, out=transform)
+        else:
+            transform[...] = np.fft.rfft(data, axis=-1)
+        np.abs(transform, out=power)
+        np.square(power, out=power)
+        # DC and (for even sizes) Nyquist have no mirrored half to fold in
+        power[..., 0] *= 0.5
+        if samples % 2 == 0:
+            power[..., -1] *= 0.5
+        return power
+
+    def _average_update(self, power):
+        if self._average is None:
+            self._average = np.zeros(power.shape[1:], np.float64)
+            if self.averaging == Averaging.EXPONENTIAL:
+                self._average[:] = power[0]  # start from the first frame, not zero
+                power = power[1:]
+
+        if self.averaging == Averaging.NONE:
+            self._average[:] = power[-1]
+        elif self.averaging == Averaging.LINEAR:
+            if self._ring is None:
+                self._ring = np.empty((self.count,) + power.shape[1:], np.float32)
+            for spectrum in power[-self.count :]:
+                self._ring[self._ring_pos] = spectrum
+                self._ring_pos = (self._ring_pos + 1) % self.count
+            self._ring_len = min(self._ring_len + len(power), self.count)
+            np.mean(self._ring[: self._ring_len], axis=0, out=self._average)
+        elif self.averaging == Averaging.EXPONENTIAL:
+            # all frames of the batch in one step, the newest weighs most
+            alpha = 1.0 / self.count
+            weights = alpha * (1 - alpha) ** np.arange(len(power) - 1, -1, -1)
+            self._average *= (1 - alpha) ** len(power)
+            self._average += np.tensordot(weights, power, 1)
+        elif self.averaging == Averaging.PEAK:
+            np.maximum(self._average, power.max(axis=0), out=self._average)
+
+    def process(self, codes, spl_rate, vref=5.0):
+        # codes: sequence of (2, samples) uint8 arrays sampled at spl_rate, e.g. a
+        # (frames, 2, samples) array, or of float volts (e.g. of averaged frames).
+        # Returns the Spectrum after adding all of them.
+        samples = codes[0].shape[-1]
+        if self._key != (samples, spl_rate):
+            self.reset()
+            self._key = (samples, spl_rate)
+
+        self._average_update(self._powers(codes, vref))
+        self.frames += len(codes)
+
+        db = 10 * np.log10(np.maximum(self._average, 1e-20))
+        return Spectrum(frequency_axis(samples, spl_rate), db, spl_rate, self.frames)
+
+
+class SpectrumWorker:
+    # Runs a SpectrumAnalyzer on its own thread. push() queues the codes of each
+    # frame, or its volts if they are finer (copied, pooled frames are not held on
+    # to), the thread processes all queued frames of the same timebase as one
+    # batch, take() returns the newest Spectrum or None. When the thread falls
+    # behind, the oldest frames are dropped from the queue.
+
+    def __init__(self, analyzer=None, batch=32, maxlen=256):
+        self.analyzer = analyzer if analyzer is not None else SpectrumAnalyzer()
+        self._batch = batch
+        self._queue = deque(maxlen=maxlen)
+        self._cond = threading.Condition()
+        self._analyzer_lock = threading.Lock()
+        self._generation = 0  # bumped by configure(), older batches are discarded
+        self._result = None
+        self._closed = False
+        self.dropped = 0
+        self.batches = 0
+        self._thread = threading.Thread(
+            target=self._run, name="gruseloskop-spectrum", daemon=True
+        )
+        self._thread.start()
+
+    def push(self, frame):
+        with self._cond:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            data = frame.volts if frame.fine else frame.codes
+            self._queue.append((data.copy(), frame.spl_rate, frame.vref))
+            self._cond.notify()
+
+    def take(self):
+        with self._cond:
+            result, self._result = self._result, None
+        return result
+
+    def configure(self, window="hann", averaging=Averaging.NONE, count=8):
+        with self._analyzer_lock:
+            self.analyzer.configure(window, averaging, count)
+            self._clear()
+
+    def reset(self):
+        with self._analyzer_lock:
+            self.analyzer.reset()
+            self._clear()
+
+    def _clear(self):
+        # queued frames and a batch in progress belong to the old settings
+        with self._cond:
+            self._queue.clear()
+            self._result = None
+            self._generation += 1
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _next_batch(self):
+        # consecutive frames of the same shape, type, timebase and vref (locked)
+        codes, spl_rate, vref = self._queue.popleft()
+        key = (codes.shape, codes.dtype, spl_rate, vref)
+        batch = [codes]
+        while self._queue and len(batch) < self._batch:
+            following, next_rate, next_vref = self._queue[0]
+            if (following.shape, following.dtype, next_rate, next_vref) != key:
+                break
+            batch.append(self._queue.popleft()[0])
+        return batch, spl_rate, vref
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                batch, spl_rate, vref = self._next_batch()
+                generation = self._generation
+
+            # the queue stays open for push() meanwhile
+            with self._analyzer_lock:
+                if generation != self._generation:
+                    continue
+                result = self.analyzer.process(batch, spl_rate, vref)
+            with self._cond:
+                if generation == self._generation:
+                    self._result = result
+                self.batches += 1
@@ -0,0 +1,87 @@
+import numpy as np
+
+# Roll mode chunk as sent by the firmware, sampled without pause:
+#   sync word  00 00 FF FE (block packets use 00 00 FF FF)
+#   seq        uint8, +1 per chunk, also for chunks the device had to drop
+#   a0, a1     chunk_samples x uint8 each
+stream_syncword = [0x00, 0x00, 0xFF, 0xFE]
+chunk_samples = 16
+
+
+def chunk_size(samples=chunk_samples):
+    return len(stream_syncword) + 1 + 2 * samples
+
+
+class StreamBuffer:
+    # Last `capacity` samples of both channels in a ring, fed with roll mode
+    # chunks. Gaps are found from the sequence numbers (up to 255 chunks in a
+    # row), the missing samples are filled by holding the last value so the time
+    # axis stays right.
+
+    def __init__(self, capacity, samples=chunk_samples):
+        self._ring = np.zeros((2, capacity), dtype=np.uint8)
+        self._samples = samples
+        self._sync_size = len(stream_syncword)
+        self.reset()
+
+    @property
+    def capacity(self):
+        return self._ring.shape[1]
+
+    def reset(self):
+        self._pos = 0  # next write position
+        self.filled = 0
+        self.position = 0  # samples since the reset, held ones included
+        self._last_seq = None
+        self.chunks = 0
+        self.gaps = 0
+        self.lost_samples = 0
+
+    def push_chunk(self, chunk):
+        seq = chunk[self._sync_size]
+        if self._last_seq is not None:
+            missing = (seq - self._last_seq - 1) & 0xFF
+            if missing:
+                self.gaps += 1
+                self.lost_samples += missing * self._samples
+                self._hold(missing * self._samples)
+        self._last_seq = seq
+        self.chunks += 1
+
+        codes = np.frombuffer(
+            chunk, dtype=np.uint8, count=2 * self._samples, offset=self._sync_size + 1
+        ).reshape((2, self._samples))
+        self.append(codes)
+
+    def append(self, codes):
+        count = codes.shape[1]
+        self.position += count
+        if count >= self.capacity:
+            codes = codes[:, -self.capacity :]
+            count = self.capacity
+        first = min(count, self.capacity - self._pos)
+        self._ring[:, self._pos : self._pos + first] = codes[:, :first]
+        self._ring[:, : count - first] = codes[:, first:]
+        self._advance(count)
+
+    def _hold(self, count):
+        if not self.filled:
+            return
+        self.position += count
+        count = min(count, self.capacity)
+        last = self._ring[:, self._pos - 1, None]
+        first = min(count, self.capacity - self._pos)
+        self._ring[:, self._pos : self._pos + first] = last
+        self._ring[:, : count - first] = last
+        self._advance(count)
+
+    def _advance(self, count):
+        self._pos = (self._pos + count) % self.capacity
+        self.filled = min(self.filled + count, self.capacity)
+
+    def snapshot(self):
+        # copy of the samples held, oldest first
+        start = self._pos - self.filled
+        if start >= 0:
+            return self._ring[:, start : self._pos].copy()
+        return np.concatenate([self._ring[:, start:], self._ring[:, : self._pos]], 1)
@@ -0,0 +1,373 @@
+import math
+from collections import deque
+from dataclasses import dataclass, replace
+from enum import IntEnum
+from functools import lru_cache
+
+import numpy as np
+
+from .driver import Config, FramePool, TriggerEdge, TriggerMode
+
+
+class TriggerKind(IntEnum):
+    EDGE = 0
+    PULSE = 1  # pulse with a width within [width_min, width_max]
+    WINDOW = 2  # signal leaves [window_low, window_high]
+
+
+@dataclass
+class SoftTriggerConfig:
+    kind: TriggerKind = TriggerKind.EDGE
+    chan: int = 0
+    level: float = 2.5  # V, edge and pulse triggers
+    edge: TriggerEdge = TriggerEdge.RAISING  # pulses: RAISING positive, else negative
+    hysteresis: float = 0.05  # V, noise smaller than that can't (re)arm the trigger
+    width_min: float = 0.0  # s
+    width_max: float = math.inf  # s
+    window_low: float = 1.5  # V
+    window_high: float = 3.5  # V
+    pre: int = 400  # samples before the trigger point
+    post: int = 400  # samples from the trigger point on
+    holdoff: float = 0.0  # s after a frame is complete before rearming
+    auto: float = None  # s without trigger before an untriggered frame, None: norm
+
+
+@lru_cache(maxsize=16)
+def _timebase(samples, spl_rate, channel1_delay):
+    # shared by all frames of a trigger with this rate, hence read-only
+    time0 = np.arange(samples) / spl_rate
+    time1 = time0 + channel1_delay
+    time0.flags.writeable = False
+    time1.flags.writeable = False
+    return time0, time1
+
+
+class _Comparator:
+    # Schmitt trigger over a stream of codes, state carries over between chunks.
+    # 0 below or at lo, 1 at or above hi, in between the last state is held.
+
+    def __init__(self, lo, hi):
+        self.lo = lo
+        self.hi = hi
+        self.state = -1  # nothing seen yet
+
+    def flips(self, x):
+        # positions in x where the state changes and the state after each
+        cls = np.full(len(x), -1, dtype=np.int8)
+        cls[x <= self.lo] = 0
+        cls[x >= self.hi] = 1
+        held = np.flatnonzero(cls >= 0)
+        if not len(held):
+            return held, cls[:0]
+
+        states = cls[held]
+        prev = np.empty_like(states)
+        prev[0] = self.state
+        prev[1:] = states[:-1]
+        flip = (states != prev) & (prev >= 0)
+        self.state = int(states[-1])
+        return held[flip], states[flip]
+
+
+class SoftTrigger:
+    # Trigger on a continuous stream of raw codes (2 x n chunks passed to feed()),
+    # with pre-trigger samples, holdoff and edge, pulse width or window
+    # conditions. Conditions are evaluated on whole chunks at once. Returns pooled
+    # FrameData windows of pre + post samples, the trigger point at index `pre`,
+    # each valid until pool_size more were returned.
+
+    def __init__(self, config, spl_rate, vref=5.0, channel1_delay=0.0, pool_size=16):
+        self.vref = vref
+        self._channel1_delay = channel1_delay
+        self._pool_size = pool_size
+        self._pool = None
+        self.triggers = 0
+        self.frames = 0
+        self.samples = 0
+        self.config = config
+        self.reset(spl_rate)
+
+    @property
+    def window(self):
+        return self.config.pre + self.config.post
+
+    def configure(self, config):
+        self.config = config
+        self.reset()
+
+    def reset(self, spl_rate=None):
+        # start over, e.g. after a gap in the stream or a change of rate
+        if spl_rate is not None:
+            self.spl_rate = spl_rate
+        cfg = self.config
+        n = self.window
+        if self._pool is None or self._pool_samples != n:
+            self._pool = FramePool(self._pool_size, n, self.vref)
+            self._pool_samples = n
+
+        self._comparators = self._comparators_make()
+        self._buf = np.empty((2, max(4 * n, 4096)), dtype=np.uint8)
+        self._origin = 0  # stream position of the first sample in the buffer
+        self._end = 0  # stream position after the last sample
+        self._pending = deque()  # triggers waiting for their post-trigger samples
+        self._rearm = 0  # earliest position for the next trigger
+        self._last_flip = None  # pulse triggers, flip before the current chunk
+        self._last_frame_end = 0
+        self._anchor = (0, 0.0)  # stream position and its timestamp
+
+        self._time0, self._time1 = _timebase(n, self.spl_rate, self._channel1_delay)
+        self._holdoff = cfg.post + int(round(cfg.holdoff * self.spl_rate))
+        self._auto = None
+        if cfg.auto is not None:
+            self._auto = max(int(cfg.auto * self.spl_rate), n)
+
+    def _codes(self, volts):
+        return volts / self.vref * 0xFF
+
+    def _comparators_make(self):
+        # (comparator, state that fires)
+        cfg = self.config
+        hyst = max(self._codes(cfg.hysteresis), 1.0)
+        level = self._codes(cfg.level)
+
+        if cfg.kind == TriggerKind.WINDOW:
+            low, high = self._codes(cfg.window_low), self._codes(cfg.window_high)
+            return [
+                (_Comparator(high - hyst, high), 1),
+                (_Comparator(low, low + hyst), 0),
+            ]
+        if cfg.kind == TriggerKind.PULSE:
+            return [(_Comparator(level - hyst / 2, level + hyst / 2), None)]
+
+        comparators = []
+        if cfg.edge in (TriggerEdge.RAISING, TriggerEdge.BOTH):
+            comparators.append((_Comparator(level - hyst, level), 1))
+        if cfg.edge in (TriggerEdge.FALLING, TriggerEdge.BOTH):
+            comparators.append((_Comparator(level, level + hyst), 0))
+        return comparators
+
+    def _candidates(self, x, base):
+        # stream positions in this chunk where the condition is met
+        cfg = self.config
+        if cfg.kind != TriggerKind.PULSE:
+            found = []
+            for comparator, fires in self._comparators:
+                pos, states = comparator.flips(x)
+                found.append(pos[states == fires])
+            pos = found[0] if len(found) == 1 else np.sort(np.concatenate(found))
+            return pos + base
+
+        # a pulse lasts from one flip to the next, it fires where it ends
+        pos, states = self._comparators[0][0].flips(x)
+        pos = pos + base
+        flips = pos if self._last_flip is None else np.append(self._last_flip, pos)
+        if len(pos):
+            self._last_flip = pos[-1]
+        ends = flips[1:]
+        widths = np.diff(flips) / self.spl_rate
+        ok = (widths >= cfg.width_min) & (widths <= cfg.width_max)
+        if cfg.edge == TriggerEdge.RAISING:
+            ok &= states[len(states) - len(ends) :] == 0  # positive pulse ended
+        elif cfg.edge == TriggerEdge.FALLING:
+            ok &= states[len(states) - len(ends) :] == 1
+        return ends[ok]
+
+    def feed(self, codes, timestamp=None):
+        # codes: 2 x n raw samples following the previous chunk without a gap,
+        # timestamp: time of the first of them. Returns the completed frames.
+        cfg = self.config
+        base = self._end
+        if timestamp is not None:
+            self._anchor = (base, timestamp)
+        self._append(codes)
+        self.samples += codes.shape[1]
+
+        # holdoff is sequential: jump to the first candidate after each rearm
+        candidates = self._candidates(codes[cfg.chan], base)
+        candidates = candidates[candidates >= max(cfg.pre, self._rearm)]
+        i = 0
+        while i < len(candidates):
+            pos = int(candidates[i])
+            self._pending.append(pos)
+            self._rearm = pos + self._holdoff
+            self.triggers += 1
+            i = np.searchsorted(candidates, self._rearm, side="left")
+
+        ready = sum(pos + cfg.post <= self._end for pos in self._pending)
+        if ready > self._pool.size - self._pool_size:
+            # the windows of one chunk don't reuse each other
+            self._pool.reserve(ready - self._pool.size + self._pool_size)
+        frames = []
+        while self._pending and self._pending[0] + cfg.post <= self._end:
+            frames.append(self._frame_make(self._pending.popleft() - cfg.pre, True))
+
+        if self._auto is not None and not self._pending and self._end >= self.window:
+            if self._end - self._last_frame_end >= self._auto:
+                frames.append(self._frame_make(self._end - self.window, False))
+        return frames
+
+    def _keep_from(self):
+        keep = self._end - self.window
+        if self._pending:
+            keep = min(keep, self._pending[0] - self.config.pre)
+        return max(keep, self._origin)
+
+    def _append(self, codes):
+        count = codes.shape[1]
+        if self._end - self._origin + count > self._buf.shape[1]:
+            # drop what can't be part of a frame anymore, grow if still too small
+            keep = self._keep_from()
+            kept = self._buf[:, keep - self._origin : self._end - self._origin]
+            if kept.shape[1] + count > self._buf.shape[1]:
+                buf = np.empty((2, 2 * (kept.shape[1] + count)), dtype=np.uint8)
+                buf[:, : kept.shape[1]] = kept
+                self._buf = buf
+            else:
+                self._buf[:, : kept.shape[1]] = kept
+            self._origin = keep
+
+        start = self._end - self._origin
+        self._buf[:, start : start + count] = codes
+        self._end += count
+
+    def _frame_make(self, start, triggered):
+        frame = self._pool.acquire()
+        offset = start - self._origin
+        np.copyto(frame.codes, self._buf[:, offset : offset + self.window])
+        frame.triggered = triggered
+        frame.time0 = self._time0
+        frame.time1 = self._time1
+        frame.spl_rate = self.spl_rate
+        anchor_pos, anchor_time = self._anchor
+        trigger_pos = start + self.config.pre
+        frame.timestamp = anchor_time + (trigger_pos - anchor_pos) / self.spl_rate
+        frame.config = None
+
+        self._last_frame_end = start + self.window
+        self.frames += 1
+        return frame
+
+
+class SoftTriggerDriver:
+    # Triggers on the host instead of in the firmware: the wrapped driver streams
+    # (roll mode), the new samples of each snapshot are fed to a SoftTrigger and
+    # triggered windows with pre-trigger samples come out. Trigger level, edge,
+    # channel and mode follow the usual Config. When samples were lost, or for
+    # frames without a stream position (block captures, replays, the network),
+    # the trigger starts over: windows never span a gap.
+
+    _poll_delay_ms = 5
+    _queue_size = 8  # windows, half the trigger's pool
+
+    def __init__(self, driver, trigger=None, vref=5.0, channel1_delay=0.0):
+        self._driver = driver
+        self._trigger = SoftTrigger(
+            trigger or SoftTriggerConfig(), 1.0, vref, channel1_delay
+        )
+        self._last_config = Config()
+        self._stream_end = None  # position after the last sample fed
+        self._frames = deque(maxlen=SoftTriggerDriver._queue_size)  # oldest dropped
+        self._upd_callback = None
+        self._poll_timer = None
+        self.history = None  # raw stream frames are not what is on screen
+
+    @property
+    def trigger(self):
+        return self._trigger
+
+    @property
+    def dropped_frames(self):
+        return self._driver.dropped_frames
+
+    @property
+    def config_dropped_frames(self):
+        return self._driver.config_dropped_frames
+
+    @property
+    def resyncs(self):
+        return self._driver.resyncs
+
+    def close(self):
+        if self._poll_timer is not None:
+            self._poll_timer.stop()
+        self._driver.close()
+
+    def set_config(self, config):
+        assert isinstance(config, Config)
+        auto = 2 * config.timeframe if config.trig_mode == TriggerMode.AUTO else None
+        self._trigger.configure(
+            replace(
+                self._trigger.config,
+                chan=config.trig_chan,
+                level=config.trig_level,
+                edge=config.trig_edge,
+                auto=auto,
+            )
+        )
+        self._frames.clear()
+        self._last_config = config
+
+        # device triggering is off, STOP still stops the stream
+        if config.trig_mode != TriggerMode.STOP:
+            config = replace(config, trig_mode=TriggerMode.ROLL)
+        self._driver.set_config(config)
+
+    def set_update_callback(self, callback):
+        from pyqtgraph.Qt import QtCore
+
+        self._upd_callback = callback
+        if hasattr(self._driver, "seek"):
+            # playback keeps its own pace, its frames are triggered as they come
+            self._driver.set_update_callback(self._replayed)
+            return
+        if self._poll_timer is None:
+            self._poll_timer = QtCore.QTimer()
+            self._poll_timer.timeout.connect(self._poll)
+            self._poll_timer.start(SoftTriggerDriver._poll_delay_ms)
+
+    def get_frame(self, timeout=None):
+        # oldest triggered window, pulls as much of the stream as that takes
+        while not self._frames:
+            frame = self._driver.get_frame(timeout)
+            if frame is None:
+                return None
+            self._feed(frame)
+        return self._frames.popleft()
+
+    def _feed(self, frame):
+        codes, timestamp = frame.codes, frame.timestamp
+        end, self._stream_end = self._stream_end, frame.stream_end
+        new = 0
+        if end is not None and frame.stream_end is not None:
+            new = frame.stream_end - end
+            if new == 0:
+                return  # nothing streamed since the last snapshot
+        if frame.spl_rate != self._trigger.spl_rate or not 0 < new <= codes.shape[1]:
+            # separate frames, samples lost, a new rate or the stream restarted
+            self._trigger.reset(frame.spl_rate)
+        else:
+            codes = codes[:, -new:]
+        if frame.stream_end is not None:
+            # a snapshot is taken at about the time of its last sample
+            timestamp -= (codes.shape[1] - 1) / frame.spl_rate
+        for out in self._trigger.feed(codes, timestamp):
+            out.config = self._last_config
+            self._frames.append(out)
+
+    def _poll(self):
+        while True:
+            frame = self._driver.get_frame(0)
+            if frame is None:
+                break
+            self._feed(frame)
+        self._deliver()
+
+    def _replayed(self, frame):
+        self._feed(frame)
+        self._deliver()
+
+    def _deliver(self):
+        if self._frames and self._upd_callback is not None:
+            frame = self._frames.pop()
+            self._frames.clear()  # only the newest one gets shown
+            self._upd_callback(frame)
@@ -0,0 +1,95 @@
+import asyncio
+
+from gruseloskop.asyncdriver import AsyncUnoDriver
+from gruseloskop.driver import Config, TriggerMode
+
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 10.0))
+
+
+async def take(subscription, count):
+    frames = []
+    async for frame in subscription:
+        frames.append(frame.copy())
+        if len(frames) == count:
+            break
+    return frames
+
+
+async def drain(subscription):
+    # frames queued so far, then the end
+    subscription.close()
+    async for frame in subscription:
+        yield frame
+
+
+def test_configure_and_frames():
+    # frames after configure() was awaited are from the new config
+    async def main():
+        async with AsyncUnoDriver("dummy") as drv:
+            config = Config(trig_mode=TriggerMode.AUTO, timeframe=0.02)
+            await drv.configure(config)
+            subscription = drv.frames()
+            frames = await take(subscription, 5)
+            subscription.close()
+            return config, frames
+
+    config, frames = run(main())
+    assert all(frame.config == config for frame in frames)
+    stamps = [frame.timestamp for frame in frames]
+    assert stamps == sorted(stamps)
+
+
+def test_fan_out():
+    # every subscriber gets every frame, in order
+    async def main():
+        async with AsyncUnoDriver("dummy") as drv:
+            first, second = drv.frames(16), drv.frames(16)
+            return await asyncio.gather(take(first, 8), take(second, 8))
+
+    first, second = run(main())
+    assert [f.timestamp for f in first] == [f.timestamp for f in second]
+
+
+def test_slow_subscriber_drops():
+    # a full queue drops its oldest frames, the other subscriber isn't held up
+    async def main():
+        async with AsyncUnoDriver("dummy") as drv:
+            slow, fast = drv.frames(2), drv.frames(16)
+            await take(fast, 10)
+            return slow.dropped, [f.timestamp async for f in drain(slow)]
+
+    dropped, stamps = run(main())
+    assert dropped >= 6
+    assert len(stamps) == 1  # closing a full queue makes room for its end
+
+
+def test_block():
+    # a blocking subscriber holds back the others until it has room
+    async def main():
+        async with AsyncUnoDriver("dummy") as drv:
+            blocking, other = drv.frames(2, block=True), drv.frames(16)
+            await asyncio.sleep(0.5)
+            held = other._queue.qsize()
+            await take(blocking, 2)  # room again
+            await take(other, held + 1)
+            return held, blocking.dropped
+
+    held, dropped = run(main())
+    assert held <= 3
+    assert dropped == 0
+
+
+def test_close_ends_iteration():
+    async def main():
+        drv = AsyncUnoDriver("dummy")
+        await drv.open()
+        subscription = drv.frames()
+        await take(subscription, 1)
+        await drv.close()
+        return [frame async for frame in subscription], drv.driver
+
+    rest, driver = run(main())
+    assert len(rest) <= 4
+    assert driver is None
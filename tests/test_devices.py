@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from gruseloskop.devices import DeviceManager, MultiFrame
+from gruseloskop.driver import Config, FrameData, UnoDriver
+
+SAMPLES = UnoDriver._chan_samples
+
+
+def frame_make(timestamp, value=0):
+    time0, time1, spl_rate = UnoDriver._timebase(1)
+    codes = np.full((2, SAMPLES), value, dtype=np.uint8)
+    frame = FrameData(time0, time1, codes, True, spl_rate, UnoDriver._vref)
+    frame.timestamp = timestamp
+    return frame
+
+
+@pytest.fixture
+def manager():
+    # merger stopped, frames are handed to _merge() by the test
+    manager = DeviceManager(["dummy"] * 3, merge_window=0.005)
+    manager.close()
+    for pending in manager._pending:
+        pending.clear()
+    manager.groups = manager.incomplete_groups = 0
+    yield manager
+
+
+def test_multi_frame():
+    frames = [frame_make(10.002, 1), None, frame_make(10.0, 2)]
+    group = MultiFrame(frames)
+    assert group.timestamp == 10.0
+    assert group.skew == pytest.approx(0.002)
+    assert not group.complete
+
+    # channels device by device, NaN for the missing one
+    volts = group.volts
+    assert volts.shape == (6, SAMPLES)
+    np.testing.assert_array_equal(volts[0:2], frames[0].volts)
+    assert np.all(np.isnan(volts[2:4]))
+    np.testing.assert_array_equal(volts[4:6], frames[2].volts)
+
+
+def test_merge_groups(manager):
+    # three boards, one of them a little late each time
+    for i, delay in enumerate([0.0, 0.003, 0.001]):
+        for n in range(4):
+            manager._pending[i].append(frame_make(100.0 + 0.05 * n + delay, n))
+    groups = manager._merge(100.2)
+    assert len(groups) == 4
+    for n, group in enumerate(groups):
+        assert group.complete
+        assert group.timestamp == pytest.approx(100.0 + 0.05 * n)
+        assert group.skew == pytest.approx(0.003)
+        assert all(frame.codes[0, 0] == n for frame in group.frames)
+    assert manager.groups == 4 and manager.incomplete_groups == 0
+    assert not any(manager._pending)
+
+
+def test_merge_waits_for_late_frames(manager):
+    manager._pending[0].append(frame_make(100.0))
+    manager._pending[1].append(frame_make(100.002))
+    assert manager._merge(100.004) == []  # the third board may still deliver
+
+    # outside the window: once no partner can show up anymore, a group without
+    # it, the frame starts the next one
+    manager._pending[2].append(frame_make(100.008))
+    assert manager._merge(100.009) == []
+    late = manager._window() + 2 * DeviceManager._poll_delay_ms / 1000
+    (group,) = manager._merge(100.0 + late)
+    assert [frame is not None for frame in group.frames] == [True, True, False]
+    assert manager.incomplete_groups == 1
+    assert len(manager._pending[2]) == 1
+
+    (group,) = manager._merge(100.008 + late)
+    assert [frame is not None for frame in group.frames] == [False, False, True]
+
+
+def test_merge_window_follows_timebase(manager):
+    # slow timebases spread the boards' triggers further apart
+    assert manager._window() == 0.005
+    manager.set_config(Config(timeframe=1.0))
+    assert manager._window() == 0.5
+
+
+def test_dummy_boards():
+    manager = DeviceManager(["dummy", "dummy"])
+    try:
+        groups = [manager.get_frame(2.0) for _ in range(3)]
+        assert all(group is not None and group.complete for group in groups)
+        assert all(group.skew <= manager._window() for group in groups)
+        stats = manager.device_stats()
+        assert [s.port for s in stats] == ["dummy", "dummy"]
+        assert all(s.frames >= 3 and s.errors == 0 for s in stats)
+    finally:
+        manager.close()
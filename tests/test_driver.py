@@ -0,0 +1,60 @@
+import numpy as np
+
+from gruseloskop.driver import FrameData, FramePool, FrameQueue
+
+
+def test_pool_turns():
+    # a frame is left alone until `size` more were acquired
+    pool = FramePool(3, 10, 5.0)
+    frames = [pool.acquire() for _ in range(3)]
+    assert len(set(map(id, frames))) == 3
+    assert [pool.acquire() for _ in range(3)] == frames
+
+
+def test_pool_reserve():
+    pool = FramePool(2, 10, 5.0)
+    held = pool.acquire()
+    pool.reserve(2)
+    assert pool.size == 4
+    assert all(pool.acquire() is not held for _ in range(3))
+    assert pool.acquire() is held
+
+
+def test_pool_invalidates():
+    pool = FramePool(1, 4, 5.0)
+    frame = pool.acquire()
+    frame.codes[:] = 0xFF
+    np.testing.assert_allclose(frame.volts, 5.0)
+    frame = pool.acquire()
+    frame.codes[:] = 0
+    np.testing.assert_array_equal(frame.volts, 0.0)
+
+
+def test_frame_copy():
+    codes = np.arange(8, dtype=np.uint8).reshape((2, 4))
+    time = np.arange(4) / 10.0
+    frame = FrameData(time, time, codes, True, 10.0, 5.0)
+    frame.timestamp = 12.5
+    volts = np.full((2, 4), 1.25, dtype=np.float32)
+    frame.set_volts(volts)
+
+    copy = frame.copy()
+    frame.codes[:] = 0
+    frame.set_volts(volts * 2)
+    np.testing.assert_array_equal(copy.codes, np.arange(8).reshape((2, 4)))
+    np.testing.assert_array_equal(copy.volts, volts)
+    assert copy.fine and copy.triggered and copy.timestamp == 12.5
+    assert copy.time0 is time
+
+
+def test_queue_drops_oldest():
+    queue = FrameQueue(2)
+    for i in range(5):
+        queue.put(i)
+    assert queue.dropped == 3
+    assert queue.get(0) == 3
+    queue.put(5)
+    queue.put(6)
+    assert queue.latest() == 6
+    assert queue.dropped == 5  # one more when full, one skipped by latest()
+    assert queue.get(0.01) is None
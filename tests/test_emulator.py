@@ -0,0 +1,71 @@
+from time import monotonic, sleep
+
+import numpy as np
+import pytest
+
+from gruseloskop.driver import Config, TriggerMode, UnoDriver
+
+# the emulator talks over a pseudo-terminal, POSIX only
+emulator = pytest.importorskip("gruseloskop.emulator")
+
+
+def frames_get(driver, count):
+    frames = []
+    deadline = monotonic() + 5.0
+    while len(frames) < count and monotonic() < deadline:
+        frame = driver.get_frame(0.1)
+        if frame is not None and frame.config.trig_mode == TriggerMode.AUTO:
+            frames.append(frame.copy())
+    assert len(frames) == count
+    return frames
+
+
+@pytest.fixture
+def board():
+    with emulator.UnoEmulator(frame_delay=0.005) as emu:
+        driver = UnoDriver(emu.port, queue_size=4)
+        try:
+            driver.set_config(Config(trig_mode=TriggerMode.AUTO, timeframe=0.02))
+            yield emu, driver
+        finally:
+            driver.close()
+
+
+def test_frames(board):
+    # read in the driver's own thread, no Qt needed to get them
+    emu, driver = board
+    frames = frames_get(driver, 5)
+    stamps = [frame.timestamp for frame in frames]
+    assert stamps == sorted(stamps)
+    for frame in frames:
+        # the emulator's sines span most of the range
+        assert frame.codes.shape == (2, UnoDriver._chan_samples)
+        assert np.ptp(frame.data0) > 3.0 and np.ptp(frame.data1) > 3.0
+    assert emu.configs_received >= 1
+    assert driver.resyncs == 0
+
+
+def test_queue_bounded(board):
+    # nobody takes frames: the oldest are dropped, the newest are kept
+    emu, driver = board
+    frames_get(driver, 1)
+    sent = emu.frames_sent
+    deadline = monotonic() + 5.0
+    while emu.frames_sent < sent + 12 and monotonic() < deadline:
+        sleep(0.01)
+    assert driver.dropped_frames >= 4
+    frames = frames_get(driver, 4)
+    assert frames[-1].timestamp >= frames[0].timestamp
+
+
+def test_resync(board):
+    # garbage on the line costs a packet, the stream goes on without a reset
+    emu, driver = board
+    frames_get(driver, 2)
+    sleep(0.1)  # configs still on their way
+    configs = emu.configs_received
+    emu.inject(b"\x12\x34\x56")
+    sleep(0.1)
+    frames_get(driver, 3)
+    assert driver.resyncs == 1
+    assert emu.configs_received == configs
@@ -0,0 +1,135 @@
+import os
+
+import numpy as np
+import pytest
+
+from gruseloskop.driver import Config, FrameData, UnoDriver
+from gruseloskop.export import CaptureSource, ExportJob, FrameListSource
+from gruseloskop.mathchan import MathChannel
+from gruseloskop.record import CaptureReader, CaptureWriter
+
+SAMPLES = UnoDriver._chan_samples
+VREF = UnoDriver._vref
+
+
+def frames_make(count, seed=0):
+    rng = np.random.default_rng(seed)
+    time0, time1, spl_rate = UnoDriver._timebase(1)
+    frames = []
+    for i in range(count):
+        codes = rng.integers(0, 0x100, (2, SAMPLES), dtype=np.uint8)
+        frame = FrameData(time0, time1, codes, i % 2 == 0, spl_rate, VREF)
+        frame.timestamp = 1000.0 + i * 0.01
+        frame.config = Config()
+        frames.append(frame)
+    return frames
+
+
+def csv_read(path):
+    with open(path, "rb") as f:
+        header = f.readline().decode("ascii").strip().split(",")
+        text = f.read()
+    assert b" " not in text  # no padding
+    return header, np.loadtxt(text.decode("ascii").splitlines(), delimiter=",")
+
+
+@pytest.mark.parametrize("start,stop", [(0, None), (7, 12), (95, 105)])
+def test_csv(tmp_path, start, stop):
+    # frame column holds the index in the source, also across a digit boundary
+    frames = frames_make(110)
+    path = str(tmp_path / "out.csv")
+    job = ExportJob(FrameListSource(frames), path, "csv", start, stop).start()
+    assert job.wait(10.0) and job.error is None
+
+    header, rows = csv_read(path)
+    assert header == ["frame", "t0", "a0", "t1", "a1"]
+    stop = len(frames) if stop is None else stop
+    assert len(rows) == (stop - start) * SAMPLES
+    rows = rows.reshape((stop - start, SAMPLES, 5))
+    np.testing.assert_array_equal(rows[:, 0, 0], np.arange(start, stop))
+    for frame, frame_rows in zip(frames[start:stop], rows):
+        np.testing.assert_array_equal(frame_rows[:, 0], frame_rows[0, 0])
+        np.testing.assert_allclose(frame_rows[:, 1], frame.time0, rtol=1e-6)
+        np.testing.assert_allclose(frame_rows[:, 3], frame.time1, rtol=1e-6)
+        np.testing.assert_allclose(frame_rows[:, 2], frame.data0, atol=5e-5)
+        np.testing.assert_allclose(frame_rows[:, 4], frame.data1, atol=5e-5)
+
+
+def test_csv_fine_volts(tmp_path):
+    # volts finer than the codes are written instead of them
+    frames = frames_make(3)
+    volts = np.random.default_rng(1).uniform(0, VREF, (2, SAMPLES))
+    frames[1].set_volts(volts)
+    path = str(tmp_path / "out.csv")
+    assert ExportJob(FrameListSource(frames), path, "csv").start().wait(10.0)
+
+    _, rows = csv_read(path)
+    rows = rows.reshape((3, SAMPLES, 5))
+    np.testing.assert_allclose(rows[1, :, 2], volts[0], atol=5e-5)
+    np.testing.assert_allclose(rows[1, :, 4], volts[1], atol=5e-5)
+
+
+def test_npz(tmp_path):
+    frames = frames_make(20)
+    path = str(tmp_path / "out.npz")
+    job = ExportJob(FrameListSource(frames), path, "npz", 5, 15).start()
+    assert job.wait(10.0) and job.error is None
+
+    with np.load(path) as npz:
+        assert int(npz["start"]) == 5
+        assert float(npz["vref"]) == VREF
+        np.testing.assert_array_equal(
+            npz["codes"], np.stack([f.codes for f in frames[5:15]])
+        )
+        np.testing.assert_array_equal(
+            npz["timestamps"], [f.timestamp for f in frames[5:15]]
+        )
+        np.testing.assert_array_equal(
+            npz["triggered"], [f.triggered for f in frames[5:15]]
+        )
+        assert "volts" not in npz
+
+
+def test_capture_to_csv(tmp_path):
+    # recorded frames export with the capture's frame numbers
+    frames = frames_make(50)
+    path = str(tmp_path / "capture.grc")
+    with CaptureWriter(path, SAMPLES, VREF, UnoDriver._channel1_delay) as writer:
+        for frame in frames:
+            writer.write(frame)
+
+    reader = CaptureReader(path)
+    out = str(tmp_path / "out.csv")
+    assert ExportJob(CaptureSource(reader), out, "csv", 40).start().wait(10.0)
+    _, rows = csv_read(out)
+    rows = rows.reshape((10, SAMPLES, 5))
+    for i, frame_rows in zip(range(40, 50), rows):
+        assert frame_rows[0, 0] == i
+        np.testing.assert_allclose(frame_rows[:, 2], reader[i].data0, atol=5e-5)
+    reader.close()
+
+
+def test_cancel(tmp_path):
+    frames = frames_make(200)
+    path = str(tmp_path / "out.csv")
+    job = ExportJob(FrameListSource(frames), path, "csv")
+    job.cancel()
+    assert job.start().wait(10.0)
+    assert job.exported == 0
+    assert not os.path.exists(path)
+
+
+def test_math_columns(tmp_path):
+    frames = frames_make(4)
+    math = [MathChannel("a0 - a1", "Diff"), MathChannel("a0 * 2", "Double")]
+    path = str(tmp_path / "out.csv")
+    job = ExportJob(FrameListSource(frames), path, "csv", math=math).start()
+    assert job.wait(10.0) and job.error is None
+
+    header, rows = csv_read(path)
+    assert header == ["frame", "t0", "a0", "t1", "a1", "diff", "double"]
+    rows = rows.reshape((4, SAMPLES, 7))
+    for frame, frame_rows in zip(frames, rows):
+        volts = frame.volts
+        np.testing.assert_allclose(frame_rows[:, 5], volts[0] - volts[1], atol=1e-5)
+        np.testing.assert_allclose(frame_rows[:, 6], volts[0] * 2, atol=1e-5)
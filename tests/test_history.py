@@ -0,0 +1,95 @@
+from time import monotonic
+
+import numpy as np
+import pytest
+
+from gruseloskop.driver import Config, FrameData, TriggerMode, UnoDriver
+from gruseloskop.history import FrameHistory
+
+SAMPLES = 16
+FRAME_BYTES = 2 * SAMPLES + 8 + 8 + 1 + 3 * 8
+
+
+def frame_make(n):
+    time0 = np.arange(SAMPLES) / 1000.0
+    codes = np.full((2, SAMPLES), n % 0x100, dtype=np.uint8)
+    frame = FrameData(time0, time0, codes, n % 2 == 0, 1000.0 + n)
+    frame.timestamp = 100.0 + n
+    frame.config = Config()
+    return frame
+
+
+def history_make(capacity, frames):
+    history = FrameHistory(SAMPLES, capacity * FRAME_BYTES)
+    assert history.capacity == capacity
+    for n in range(frames):
+        history.append(frame_make(n))
+    return history
+
+
+def test_wrap_around():
+    # the oldest ones go, index 0 is the oldest one held
+    history = history_make(5, 13)
+    assert len(history) == 5
+    for i in range(5):
+        frame = history[i]
+        n = 8 + i
+        assert frame.codes[0, 0] == n
+        assert frame.timestamp == 100.0 + n
+        assert frame.spl_rate == 1000.0 + n
+        assert frame.triggered == (n % 2 == 0)
+    with pytest.raises(IndexError):
+        history[5]
+
+    chunk = history.chunk(1, 4)
+    np.testing.assert_array_equal(chunk.codes[:, 0, 0], [9, 10, 11])
+    np.testing.assert_array_equal(chunk.timestamps, [109.0, 110.0, 111.0])
+
+    history.clear()
+    assert len(history) == 0
+    history.append(frame_make(20))
+    assert history[0].codes[0, 0] == 20
+
+
+def test_snapshot():
+    # appending doesn't shift a snapshot, overwriting its frames fails it
+    history = history_make(5, 3)
+    snapshot = history.snapshot()
+    history.append(frame_make(3))
+    assert len(snapshot) == 3
+    np.testing.assert_array_equal(snapshot.chunk(0, 3).codes[:, 0, 0], [0, 1, 2])
+
+    for n in range(4, 7):
+        history.append(frame_make(n))
+    np.testing.assert_array_equal(snapshot.chunk(2, 3).codes[:, 0, 0], [2])
+    with pytest.raises(IndexError):
+        snapshot.chunk(0, 3)
+
+
+def frames_wait(driver, count, mode):
+    deadline = monotonic() + 5.0
+    frames = 0
+    while frames < count and monotonic() < deadline:
+        frame = driver.get_frame(0.1)
+        if frame is not None and frame.config.trig_mode == mode:
+            frames += 1
+    assert frames == count
+
+
+def test_driver_roll():
+    # roll snapshots overlap each other and aren't kept, block frames are
+    history = FrameHistory(UnoDriver._chan_samples, 100 * 2 * UnoDriver._chan_samples)
+    driver = UnoDriver("dummy", history=history)
+    try:
+        driver.set_config(Config(trig_mode=TriggerMode.ROLL))
+        frames_wait(driver, 5, TriggerMode.ROLL)
+        history.clear()  # frames from before the config took effect
+        frames_wait(driver, 5, TriggerMode.ROLL)
+        assert len(history) == 0
+
+        driver.set_config(Config(trig_mode=TriggerMode.AUTO))
+        frames_wait(driver, 3, TriggerMode.AUTO)
+        assert len(history) >= 3
+        assert all(history[i].config.trig_mode == TriggerMode.AUTO for i in range(3))
+    finally:
+        driver.close()
@@ -0,0 +1,140 @@
+from time import monotonic, sleep
+
+import numpy as np
+import pytest
+
+from gruseloskop import link
+from gruseloskop.driver import Config, TriggerMode, UnoDriver
+
+# the emulator talks over a pseudo-terminal, POSIX only
+emulator = pytest.importorskip("gruseloskop.emulator")
+
+FRAMES = 5
+
+signals = {
+    # slow enough for 4 bit deltas at the fastest timebase
+    link.Packing.DELTA: lambda t, chan: 2.5 + 2.0 * np.sin(2 * np.pi * 200 * t + chan),
+    link.Packing.RLE: lambda t, chan: np.where((t * 50 + chan / 4) % 1 < 0.5, 4.0, 1.0),
+    link.Packing.RAW: lambda t, chan: np.random.uniform(0, 5, len(t)),
+}
+
+
+def codes_of(signal):
+    t = np.arange(UnoDriver._chan_samples) / UnoDriver._sample_base_clk
+    volts = np.stack([signal(t, chan) for chan in (0, 1)])
+    return np.clip(volts / UnoDriver._vref * 0xFF, 0, 0xFF).astype(np.uint8)
+
+
+@pytest.mark.parametrize("packing", list(signals))
+def test_pack_round_trip(packing):
+    codes = codes_of(signals[packing])
+    packet = link.pack(codes, True, link.PACK_DELTA | link.PACK_RLE)
+    assert packet[5] == packing
+    assert len(packet) == link.packed_length(packet[: link.packed_header_size])
+
+    out = np.empty_like(codes)
+    assert link.unpack(packet, out)
+    np.testing.assert_array_equal(out, codes)
+
+
+def test_pack_flags_off():
+    codes = codes_of(signals[link.Packing.RLE])
+    packet = link.pack(codes, False, 0)
+    assert packet[5] == link.Packing.RAW
+
+    out = np.empty_like(codes)
+    assert not link.unpack(packet, out)
+    np.testing.assert_array_equal(out, codes)
+
+
+def test_hello_reply():
+    hello = link.hello_make(1000000, link.PACK_DELTA)
+    assert len(hello) == link.hello_size
+    assert link.hello_parse(hello) == (link.protocol_version, 3, link.PACK_DELTA)
+    assert link.hello_parse(bytes(link.hello_size)) is None
+
+    reply = link.reply_make(2, 3, link.PACK_RLE)
+    assert link.reply_parse(b"\x12\x34" + reply) == (2, 1000000, link.PACK_RLE)
+    assert link.reply_parse(reply[:-1]) is None
+
+
+def capture(emu, driver, frames):
+    # codes of the frames received and the packing each was sent with (None:
+    # plain packet), once the config is in effect. Frames have to be ones the
+    # emulator sent since then, in order.
+    # the fastest timebase, the config sent on opening has a slower one
+    driver.set_config(Config(trig_mode=TriggerMode.AUTO, timeframe=0.02))
+    deadline = monotonic() + 2.0
+    while (emu.config is None or emu.spl_div != 1) and monotonic() < deadline:
+        sleep(0.01)
+    assert emu.config is not None and emu.spl_div == 1
+
+    sent = {}  # codes: (position, packing)
+    samples, make_packet = emu._samples, emu._make_packet
+
+    def recorded_packet():
+        packet = make_packet()
+        sent[recorded_packet.codes] = (len(sent), packet[5] if emu.link_flags else None)
+        return packet
+
+    def recorded_samples(count):
+        codes = samples(count)
+        recorded_packet.codes = codes.tobytes()
+        return codes
+
+    emu._samples = recorded_samples
+    emu._make_packet = recorded_packet
+
+    received = []
+    deadline = monotonic() + 5.0
+    while len(received) < frames and monotonic() < deadline:
+        frame = driver.get_frame(0.1)
+        if frame is not None and frame.codes.tobytes() in sent:
+            received.append(sent[frame.codes.tobytes()])
+    assert len(received) == frames
+    positions = [pos for pos, _ in received]
+    assert positions == sorted(positions)
+    return [packing for _, packing in received]
+
+
+@pytest.mark.parametrize("packing", list(signals))
+def test_v2_packed(packing):
+    with emulator.UnoEmulator(signals[packing], frame_delay=0.005) as emu:
+        driver = UnoDriver(emu.port, baud=1000000, packing=True)
+        try:
+            assert driver.link_baud == 1000000
+            assert driver.link_flags == link.PACK_DELTA | link.PACK_RLE
+            assert emu.baud == 1000000
+
+            assert set(capture(emu, driver, FRAMES)) == {packing}
+            assert driver.resyncs == 0
+        finally:
+            driver.close()
+
+
+def test_v2_raw_only():
+    # a faster link without packing
+    signal = signals[link.Packing.RLE]
+    with emulator.UnoEmulator(signal, frame_delay=0.005) as emu:
+        driver = UnoDriver(emu.port, baud=500000, packing=False)
+        try:
+            assert driver.link_baud == emu.baud == 500000
+            assert driver.link_flags == emu.link_flags == 0
+
+            assert set(capture(emu, driver, FRAMES)) == {None}
+        finally:
+            driver.close()
+
+
+def test_v1_fallback():
+    # old firmware NAKs the hello, the link stays at 115200 with plain packets
+    signal = signals[link.Packing.DELTA]
+    with emulator.UnoEmulator(signal, frame_delay=0.005, version=1) as emu:
+        driver = UnoDriver(emu.port, baud=1000000, packing=True)
+        try:
+            assert driver.link_baud == emu.baud == UnoDriver._serial_baud
+            assert driver.link_flags == emu.link_flags == 0
+
+            assert set(capture(emu, driver, FRAMES)) == {None}
+        finally:
+            driver.close()
@@ -0,0 +1,131 @@
+import math
+
+import numpy as np
+import pytest
+
+from gruseloskop.driver import FrameData
+from gruseloskop.mathchan import MathChannel, compile_expression
+
+SPL_RATE = 10000.0
+SAMPLES = 500
+
+
+def frame_make(seed=0, samples=SAMPLES, spl_rate=SPL_RATE):
+    rng = np.random.default_rng(seed)
+    time0 = np.arange(samples) / spl_rate
+    volts = rng.uniform(0.5, 4.5, (2, samples)).astype(np.float32)
+    frame = FrameData(time0, time0, np.zeros((2, samples), np.uint8), True, spl_rate)
+    frame.set_volts(volts)
+    frame.timestamp = 100.0 + seed
+    return frame
+
+
+def lowpass_loop(x, alpha):
+    y = np.empty(len(x))
+    state = x[0]
+    for k, value in enumerate(x):
+        state += alpha * (value - state)
+        y[k] = state
+    return y
+
+
+def test_arithmetic():
+    frame = frame_make()
+    a0, a1 = frame.data0.astype(np.float64), frame.data1.astype(np.float64)
+    cases = {
+        "A1-A0": a1 - a0,
+        "a0 * a1 / 2": a0 * a1 / 2,
+        "-A0 + 2**3": -a0 + 8,
+        "sqrt(abs(A0 - A1)) + log10(A1)": np.sqrt(np.abs(a0 - a1)) + np.log10(a1),
+        "exp(-A0) * log(A1)": np.exp(-a0) * np.log(a1),
+    }
+    for expression, expected in cases.items():
+        result = MathChannel(expression).evaluate(frame)
+        np.testing.assert_allclose(result, expected, rtol=1e-5, err_msg=expression)
+
+
+def test_constants():
+    # folded at compile time, a constant result fills the channel
+    steps, _, _ = compile_expression("A0 * (2 + 3) - sqrt(16)")
+    assert len(steps) == 2
+    np.testing.assert_array_equal(MathChannel("1 / 4").evaluate(frame_make()), 0.25)
+
+
+def test_filters():
+    frame = frame_make()
+    x = frame.data0.astype(np.float64)
+
+    avg = MathChannel("avg(A0, 8)").evaluate(frame)
+    expected = [x[max(k - 7, 0) : k + 1].mean() for k in range(SAMPLES)]
+    np.testing.assert_allclose(avg, expected, rtol=1e-5)
+
+    deriv = MathChannel("deriv(A0)").evaluate(frame)
+    np.testing.assert_allclose(deriv, np.gradient(x) * SPL_RATE, rtol=1e-4)
+
+    integ = MathChannel("integ(A0)").evaluate(frame)
+    trapezoids = np.concatenate([[0], np.cumsum((x[1:] + x[:-1]) / 2)]) / SPL_RATE
+    np.testing.assert_allclose(integ, trapezoids, rtol=1e-4)
+
+    fir = MathChannel("fir(A0, 0.5, 0.25, 0.25)").evaluate(frame)
+    padded = np.concatenate([[x[0], x[0]], x])
+    expected = 0.5 * padded[2:] + 0.25 * padded[1:-1] + 0.25 * padded[:-2]
+    np.testing.assert_allclose(fir, expected, rtol=1e-5)
+
+    alpha = 1 - math.exp(-2 * math.pi * 300 / SPL_RATE)
+    lowpass = MathChannel("lowpass(A0, 300)").evaluate(frame)
+    np.testing.assert_allclose(lowpass, lowpass_loop(x, alpha), rtol=1e-4)
+    highpass = MathChannel("highpass(A0, 300)").evaluate(frame)
+    np.testing.assert_allclose(highpass, x - lowpass_loop(x, alpha), atol=1e-4)
+
+
+def test_lowpass_long():
+    # slow filter on a long frame: evaluated in blocks, r^-j would overflow
+    frame = frame_make(samples=100000)
+    alpha = 1 - math.exp(-2 * math.pi * 5 / SPL_RATE)
+    lowpass = MathChannel("lowpass(A1, 5)").evaluate(frame)
+    expected = lowpass_loop(frame.data1.astype(np.float64), alpha)
+    assert np.all(np.isfinite(lowpass))
+    np.testing.assert_allclose(lowpass, expected, rtol=1e-4)
+
+
+def test_batch():
+    # the same as frame by frame, also with frames at different sample rates
+    frames = [frame_make(i, spl_rate=SPL_RATE * (1 + i % 2)) for i in range(4)]
+    volts = np.stack([frame.volts for frame in frames])
+    rates = [frame.spl_rate for frame in frames]
+    for expression in ["A0 - A1", "lowpass(A0, 300)", "deriv(avg(A1, 4))"]:
+        batch = MathChannel(expression).evaluate_batch(volts, rates).copy()
+        single = MathChannel(expression)
+        for frame, result in zip(frames, batch):
+            np.testing.assert_allclose(result, single.evaluate(frame), rtol=1e-5)
+
+
+def test_cached():
+    # evaluating the same frame again is free, a new one is evaluated
+    channel = MathChannel("A0 + A1")
+    frame = frame_make()
+    result = channel.evaluate(frame)
+    assert channel.evaluate(frame) is result
+    other = frame_make(1)
+    np.testing.assert_allclose(channel.evaluate(other), other.data0 + other.data1)
+
+
+@pytest.mark.parametrize(
+    "expression",
+    [
+        "A2",
+        "A0 +",
+        "foo(A0)",
+        "avg(A0)",
+        "avg(A0, 0)",
+        "avg(A0, A1)",
+        "lowpass(1, 100)",
+        "fir(A0)",
+        "A0 if A1 else 0",
+        "__import__('os')",
+        "A0.real",
+    ],
+)
+def test_invalid(expression):
+    with pytest.raises(ValueError):
+        MathChannel(expression)
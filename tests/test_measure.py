@@ -0,0 +1,114 @@
+import math
+
+import numpy as np
+import pytest
+
+from gruseloskop.driver import FrameData
+from gruseloskop.measure import (
+    MeasurementEngine,
+    RunningStats,
+    measure,
+    measure_channels,
+    measurements,
+)
+
+SPL_RATE = 10000.0
+SAMPLES = 1000
+
+
+def square(period, duty, low=1.0, high=4.0, ramp=4):
+    # `ramp` samples per edge, starting low
+    t = np.arange(SAMPLES)
+    phase = (t % period) / period
+    volts = np.where((phase >= 1 - duty), high, low)
+    kernel = np.ones(ramp) / ramp
+    return np.convolve(np.pad(volts, (ramp - 1, 0), "edge"), kernel, "valid")
+
+
+def test_square():
+    result = measure(square(100, 0.25), SPL_RATE)
+    assert result["min"] == pytest.approx(1.0)
+    assert result["max"] == pytest.approx(4.0)
+    assert result["pp"] == pytest.approx(3.0)
+    assert result["freq"] == pytest.approx(SPL_RATE / 100)
+    assert result["period"] == pytest.approx(100 / SPL_RATE)
+    assert result["duty"] == pytest.approx(25.0, abs=0.5)
+    # the top level averages in a few ramp samples
+    assert 0 <= result["overshoot"] < 5
+    # 10% to 90% of a linear ramp over 4 samples
+    assert result["rise"] == pytest.approx(3.2 / SPL_RATE, rel=0.1)
+    assert result["fall"] == pytest.approx(3.2 / SPL_RATE, rel=0.1)
+
+
+def test_sine():
+    t = np.arange(SAMPLES) / SPL_RATE
+    volts = 2.5 + 2.0 * np.sin(2 * np.pi * 200 * t)
+    result = measure(volts, SPL_RATE, ["mean", "rms", "freq", "duty"])
+    assert set(result) == {"mean", "rms", "freq", "duty"}
+    assert result["mean"] == pytest.approx(2.5, abs=1e-3)
+    assert result["rms"] == pytest.approx(math.sqrt(2.5**2 + 2.0**2 / 2), rel=1e-3)
+    assert result["freq"] == pytest.approx(200, rel=1e-3)
+    assert result["duty"] == pytest.approx(50, abs=0.5)
+
+
+def test_flat():
+    # no edges: timing can't be determined
+    result = measure(np.full(SAMPLES, 2.0), SPL_RATE)
+    assert result["pp"] == 0.0
+    for name in ["freq", "period", "duty", "rise", "fall", "overshoot"]:
+        assert math.isnan(result[name])
+
+
+def test_channels_together():
+    # the same as one at a time, also with channels that have no edges
+    rng = np.random.default_rng(0)
+    volts = np.stack(
+        [
+            square(100, 0.25),
+            np.full(SAMPLES, 3.0),
+            square(37, 0.6, 0.5, 4.5) + rng.normal(0, 0.02, SAMPLES),
+            rng.uniform(0, 5, SAMPLES),
+            square(400, 0.5),  # one full period only
+        ]
+    )
+    together = measure_channels(volts, SPL_RATE)
+    for row, result in zip(volts, together):
+        single = measure(row, SPL_RATE)
+        for name in measurements:
+            if math.isnan(single[name]):
+                assert math.isnan(result[name]), name
+            else:
+                assert result[name] == pytest.approx(single[name]), name
+
+
+def test_running_stats():
+    stats = RunningStats()
+    values = [1.0, 4.0, math.nan, 2.0, 3.0]
+    for value in values:
+        stats.add(value)
+    assert stats.count == 4
+    assert (stats.min, stats.max, stats.mean) == (1.0, 4.0, 2.5)
+    assert stats.std == pytest.approx(np.std([1, 4, 2, 3], ddof=1))
+
+
+def test_engine():
+    volts = np.stack([square(100, 0.5), square(50, 0.5)]).astype(np.float32)
+    frame = FrameData(None, None, np.zeros((2, SAMPLES), np.uint8), True, SPL_RATE)
+    frame.set_volts(volts)
+
+    engine = MeasurementEngine(["freq", "mean"])
+    for _ in range(3):
+        engine.update(frame)
+    assert engine.names == ["A0", "A1"]
+    assert engine.results[1]["freq"] == pytest.approx(SPL_RATE / 50)
+    assert engine.stats[0]["freq"].count == 3
+
+    # a math channel joins, A0 and A1 keep their statistics
+    engine.update(frame, {"M1": volts[0] - volts[1]})
+    assert engine.names == ["A0", "A1", "M1"]
+    assert engine.stats[0]["freq"].count == 4
+    assert engine.stats[2]["mean"].count == 1
+    assert engine.results[2]["mean"] == pytest.approx(0.0, abs=1e-6)
+
+    with pytest.raises(ValueError):
+        engine.select(["nonsense"])
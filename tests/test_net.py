@@ -0,0 +1,156 @@
+import asyncio
+import socket
+import threading
+from time import monotonic, sleep, time
+
+import numpy as np
+import pytest
+
+from gruseloskop.driver import Config, FrameData, TriggerMode, UnoDriver
+from gruseloskop.history import FrameHistory
+from gruseloskop.net import FrameServer, NetDriver
+
+SAMPLES = UnoDriver._chan_samples
+
+
+class Source:
+    # stands in for an AsyncUnoDriver, in the mode the last config asked for:
+    # short snapshots of varying length in roll mode, full frames otherwise
+
+    def __init__(self):
+        self.configs = []
+        self.mode = TriggerMode.ROLL
+        self.sent = 0
+
+    async def configure(self, config):
+        self.configs.append(config)
+        self.mode = config.trig_mode
+
+    def _frame(self, samples, mode):
+        time0, time1, spl_rate = UnoDriver._timebase(1)
+        codes = np.full((2, samples), self.sent % 0x100, dtype=np.uint8)
+        frame = FrameData(
+            time0[:samples], time1[:samples], codes, True, spl_rate, UnoDriver._vref
+        )
+        frame.timestamp = time()
+        frame.config = Config(trig_mode=mode)
+        return frame
+
+    async def frames(self):
+        while True:
+            self.sent += 1
+            if self.mode == TriggerMode.ROLL:
+                yield self._frame(self.sent % 16 + 1, TriggerMode.ROLL)
+            else:
+                yield self._frame(SAMPLES, self.mode)
+            await asyncio.sleep(0.002)
+
+
+@pytest.fixture
+def server():
+    # serving in a thread of its own, the NetDriver under test blocks
+    loop = asyncio.new_event_loop()
+    source = Source()
+    server = FrameServer(source, "127.0.0.1", 0)
+    loop.run_until_complete(server.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield server, source
+
+    asyncio.run_coroutine_threadsafe(server.close(), loop).result(5.0)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def frames_get(drv, count, accept=lambda frame: True):
+    frames = []
+    deadline = monotonic() + 5.0
+    while len(frames) < count and monotonic() < deadline:
+        frame = drv.get_frame(0.1)
+        if frame is not None and accept(frame):
+            frames.append(frame)
+    assert len(frames) == count
+    return frames
+
+
+def test_roll_frames_not_in_history(server):
+    server, source = server
+    history = FrameHistory(SAMPLES, 100 * 2 * SAMPLES)
+    drv = NetDriver("127.0.0.1", server.port, history=history)
+    try:
+        frames = frames_get(drv, 10)
+        assert all(frame.config.trig_mode == TriggerMode.ROLL for frame in frames)
+        assert any(frame.codes.shape[1] < SAMPLES for frame in frames)
+        assert len(history) == 0
+        assert drv._reader.is_alive()
+
+        # block frames are kept again once out of roll mode
+        drv.set_config(Config(trig_mode=TriggerMode.AUTO))
+        frames_get(drv, 3, lambda frame: frame.codes.shape[1] == SAMPLES)
+        assert len(history) > 0
+        assert drv._reader.is_alive()
+        assert source.configs[-1].trig_mode == TriggerMode.AUTO
+    finally:
+        drv.close()
+
+
+def test_frame_round_trip(server):
+    server, source = server
+    source.mode = TriggerMode.AUTO
+    drv = NetDriver("127.0.0.1", server.port)
+    try:
+        frame = frames_get(drv, 1)[0]
+        time0, time1, spl_rate = UnoDriver._timebase(1)
+        assert frame.codes.shape == (2, SAMPLES)
+        assert np.all(frame.codes == frame.codes[0, 0])
+        np.testing.assert_allclose(frame.time0, time0)
+        np.testing.assert_allclose(frame.time1, time1)
+        assert frame.spl_rate == spl_rate
+        assert frame.config == Config(trig_mode=TriggerMode.AUTO)
+        assert drv.connects == 1
+    finally:
+        drv.close()
+
+
+def test_reconnect(server):
+    server, source = server
+    source.mode = TriggerMode.AUTO
+    NetDriver._retry_delay, retry_delay = 0.05, NetDriver._retry_delay
+    drv = NetDriver("127.0.0.1", server.port)
+    try:
+        frames_get(drv, 1)
+        drv._sock.shutdown(socket.SHUT_RDWR)  # as if the connection broke
+        sleep(0.1)
+        frames_get(drv, 1)
+        assert drv.connects == 2
+    finally:
+        NetDriver._retry_delay = retry_delay
+        drv.close()
+
+
+def test_close_with_clients():
+    # clients still connected: their handlers end quietly, the clients retry
+    async def serve():
+        loop = asyncio.get_running_loop()
+        loop.set_exception_handler(lambda loop, context: errors.append(context))
+        source = Source()
+        source.mode = TriggerMode.AUTO
+        server = FrameServer(source, "127.0.0.1", 0)
+        await server.start()
+        for _ in range(3):
+            drv = await loop.run_in_executor(None, NetDriver, "127.0.0.1", server.port)
+            drivers.append(drv)
+        while len(server.clients) < 3:
+            await asyncio.sleep(0.01)
+        await server.close()
+        return server
+
+    errors, drivers = [], []
+    try:
+        server = asyncio.run(serve())
+        assert not server.clients
+        assert errors == []
+    finally:
+        for drv in drivers:
+            drv.close()
@@ -0,0 +1,133 @@
+import numpy as np
+import pytest
+
+from gruseloskop.protocol import PacketFramer
+
+SYNC = b"\xaa\x55"
+NAK = 0x15
+SIZE = 16
+
+
+def packets_make(count, size=SIZE):
+    # payload bytes stay below the sync word's, it can't show up in there
+    rng = np.random.default_rng(count)
+    return [
+        SYNC + rng.integers(0, 0x50, size - len(SYNC), np.uint8).tobytes()
+        for _ in range(count)
+    ]
+
+
+def feed(framer, data, chunk):
+    packets = []
+    for pos in range(0, len(data), chunk):
+        part = data[pos : pos + chunk]
+        while part:
+            buf = framer.writable(len(part))
+            buf[: len(buf)] = part[: len(buf)]
+            framer.commit(len(buf))
+            part = part[len(buf) :]
+            while True:
+                packet = framer.next_packet()
+                if packet is None:
+                    break
+                packets.append(bytes(packet))
+    return packets
+
+
+@pytest.mark.parametrize("chunk", [1, 3, SIZE, 5 * SIZE])
+def test_clean_stream(chunk):
+    packets = packets_make(20)
+    framer = PacketFramer(SIZE, SYNC, NAK)
+    assert feed(framer, b"".join(packets), chunk) == packets
+    assert framer.resyncs == framer.discarded_bytes == 0
+    assert not framer.lost
+
+
+def corrupted(packets):
+    # garbage, a cut short packet, a stray byte and a broken sync word
+    return (
+        b"\x01\x02\x03"
+        + packets[0]
+        + packets[1][:9]
+        + packets[2]
+        + packets[3]
+        + b"\xaa"
+        + packets[4]
+        + packets[5]
+        + b"\xab"
+        + packets[6][1:]
+        + b"".join(packets[7:])
+    )
+
+
+@pytest.mark.parametrize("chunk", [4 * SIZE, 1000])
+def test_resync(chunk):
+    # with the start of the next packet at hand a packet only counts if it's a
+    # sync word: the one in front of garbage is dropped too, the rest gets through
+    packets = packets_make(10)
+    framer = PacketFramer(SIZE, SYNC, NAK)
+    expected = [packets[0], packets[2], packets[4]] + packets[7:]
+    assert feed(framer, corrupted(packets), chunk) == expected
+    assert framer.resyncs == 4
+    assert framer.discarded_bytes == 3 + 9 + (SIZE + 1) + 2 * SIZE
+    assert not framer.lost
+
+
+def test_resync_byte_by_byte():
+    # a packet is handed out as soon as it's complete, a cut short one with the
+    # beginning of the next may pass. The framer is back in sync right after.
+    packets = packets_make(10)
+    framer = PacketFramer(SIZE, SYNC, NAK)
+    received = feed(framer, corrupted(packets), 1)
+    assert received[0] == packets[0]
+    assert received[-3:] == packets[7:]
+    assert all(len(packet) == SIZE and packet[:2] == SYNC for packet in received)
+    assert framer.resyncs >= 4
+    assert not framer.lost
+
+
+def test_nak():
+    # the device answers garbage with a NAK: it wants a reset
+    packets = packets_make(2)
+    framer = PacketFramer(SIZE, SYNC, NAK)
+    assert feed(framer, bytes([NAK]) + b"".join(packets), 5) == packets
+    assert framer.lost
+    framer.reset()
+    assert not framer.lost
+
+
+def test_lost_after_limit():
+    framer = PacketFramer(SIZE, SYNC, NAK, resync_limit=2)
+    assert feed(framer, bytes(2 * SIZE - 1), 4) == []
+    assert not framer.lost
+    feed(framer, bytes(2), 4)
+    assert framer.lost
+    assert framer.resyncs == 1
+
+    # a packet clears it again
+    packets = packets_make(2)
+    assert feed(framer, b"".join(packets), 4) == packets
+    assert not framer.lost
+
+
+def test_flush():
+    packets = packets_make(2)
+    framer = PacketFramer(SIZE, SYNC, NAK)
+    assert feed(framer, packets[0] + packets[1][:5], 8) == [packets[0]]
+    framer.flush()
+    assert framer.discarded_bytes == 5
+    assert feed(framer, packets[1], 8) == [packets[1]]
+
+
+def test_variable_length():
+    # third byte is the packet length, up to SIZE
+    def length(header):
+        return header[2]
+
+    packets = [SYNC + bytes([n]) + bytes(n - 3) for n in (4, SIZE, 9, 3)]
+    bad = SYNC + bytes([SIZE + 1]) + bytes(5)  # longer than possible
+    framer = PacketFramer(SIZE, SYNC, NAK, header_size=3, length=length)
+    data = packets[0] + packets[1] + bad + packets[2] + packets[3]
+    assert feed(framer, data, 5) == packets
+    assert framer.resyncs == 1
+    assert framer.discarded_bytes == len(bad)
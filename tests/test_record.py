@@ -0,0 +1,170 @@
+import os
+
+import numpy as np
+import pytest
+
+from gruseloskop.driver import Config, FrameData, TriggerMode, UnoDriver
+from gruseloskop.record import (
+    CaptureReader,
+    CaptureWriter,
+    index_stride,
+    record,
+    record_dtype,
+)
+from gruseloskop.replay import ReplayDriver
+
+VREF = UnoDriver._vref
+DELAY = UnoDriver._channel1_delay
+CONFIGS = [Config(), Config(trig_mode=TriggerMode.NORM, trig_level=1.5)]
+
+
+def frames_make(count, samples=UnoDriver._chan_samples, configs=CONFIGS, step=0.01):
+    # config changes every 10 frames, then back
+    rng = np.random.default_rng(count)
+    frames = []
+    for i in range(count):
+        spl_rate = 10000.0 * (1 + (i // 10) % len(configs))
+        time0 = np.linspace(0, samples / spl_rate, samples)
+        codes = rng.integers(0, 0x100, (2, samples), dtype=np.uint8)
+        frame = FrameData(time0, time0 + DELAY, codes, i % 3 > 0, spl_rate, VREF)
+        frame.timestamp = 1000.0 + i * step
+        frame.config = configs[(i // 10) % len(configs)]
+        frames.append(frame)
+    return frames
+
+
+def assert_same(frame, original):
+    np.testing.assert_array_equal(frame.codes, original.codes)
+    assert frame.timestamp == original.timestamp
+    assert frame.triggered == original.triggered
+    assert frame.config == original.config
+    assert frame.spl_rate == original.spl_rate
+    np.testing.assert_allclose(frame.time0, original.time0)
+    np.testing.assert_allclose(frame.time1, original.time1)
+
+
+def capture_write(path, frames, **kwargs):
+    samples = frames[0].codes.shape[1]
+    with CaptureWriter(path, samples, VREF, DELAY, **kwargs) as writer:
+        for frame in frames:
+            writer.write(frame)
+    return writer
+
+
+def test_round_trip(tmp_path):
+    frames = frames_make(45)
+    path = str(tmp_path / "capture.grc")
+    writer = capture_write(path, frames, batch_frames=8)
+    assert writer.files == [path]
+    assert writer.frames_written == 45
+
+    reader = CaptureReader(path)
+    assert len(reader) == 45
+    assert reader.vref == VREF and reader.channel1_delay == DELAY
+    for i, original in enumerate(frames):
+        assert_same(reader[i], original)
+    # configs come back as the same objects, one table entry per config
+    assert len(reader.configs) == 2
+    assert reader[0].config is reader[25].config
+    np.testing.assert_array_equal(
+        reader.config_changes, [[0, 0], [10, 1], [20, 0], [30, 1], [40, 0]]
+    )
+    assert [reader.config_at(i) for i in (0, 9, 10, 35, 44)] == [0, 0, 1, 1, 0]
+    reader.close()
+
+
+def test_rotation(tmp_path):
+    frames = frames_make(50)
+    path = str(tmp_path / "capture.grc")
+    size = record_dtype(UnoDriver._chan_samples).itemsize
+    writer = capture_write(path, frames, max_bytes=16 * size + 20000)
+    assert writer.frames_written == 50
+    assert writer.files[0] == path
+    assert writer.files[1] == str(tmp_path / "capture-0001.grc")
+    assert all(os.path.getsize(f) <= 16 * size + 20000 for f in writer.files)
+
+    # each file stands on its own, with its own config table
+    read = []
+    for f in writer.files:
+        reader = CaptureReader(f)
+        assert os.path.exists(f + ".idx")
+        assert reader.config_at(0) == 0
+        read += [reader[i] for i in range(len(reader))]
+    assert len(read) == 50
+    for frame, original in zip(read, frames):
+        assert_same(frame, original)
+
+
+def test_index(tmp_path):
+    # a few index strides of short frames, one config change halfway
+    count = 3 * index_stride + 100
+    frames = frames_make(count, samples=4, configs=[Config()], step=0.001)
+    frames[count // 2].config = CONFIGS[1]
+    path = str(tmp_path / "capture.grc")
+    capture_write(path, frames)
+
+    reader = CaptureReader(path)
+    stamps = reader.timestamps
+    for i in [0, 1, index_stride - 1, index_stride, 2 * index_stride + 7, count - 1]:
+        assert reader.index_at(stamps[i]) == i
+        assert reader.index_at(stamps[i] + 0.0005) == i
+    assert reader.index_at(0.0) == 0
+    assert reader.index_at(1e12) == count - 1
+    assert reader.config_at(count // 2) == 1
+    assert reader.config_at(count // 2 + 1) == 0
+    changes = reader.config_changes.copy()
+    index = reader._index_timestamps.copy()
+    reader.close()
+
+    # without the sidecar (a crash) it's rebuilt the same
+    os.remove(path + ".idx")
+    reader = CaptureReader(path)
+    np.testing.assert_array_equal(reader.config_changes, changes)
+    np.testing.assert_array_equal(reader._index_timestamps, index)
+    reader.close()
+
+
+def test_partial_record(tmp_path):
+    # a crash mid record: the frames before it are still there
+    frames = frames_make(5)
+    path = str(tmp_path / "capture.grc")
+    capture_write(path, frames)
+    with open(path, "ab") as f:
+        f.write(bytes(100))
+    os.remove(path + ".idx")
+    reader = CaptureReader(path)
+    assert len(reader) == 5
+    assert_same(reader[4], frames[4])
+    reader.close()
+
+
+def test_not_a_capture(tmp_path):
+    path = str(tmp_path / "other.grc")
+    with open(path, "wb") as f:
+        f.write(bytes(1000))
+    with pytest.raises(ValueError):
+        CaptureReader(path)
+
+
+class ListDriver:
+    def __init__(self, frames):
+        self._frames = list(frames)
+
+    def get_frame(self, timeout=None):
+        return self._frames.pop(0) if self._frames else None
+
+
+def test_record_and_replay(tmp_path):
+    frames = frames_make(30)
+    path = str(tmp_path / "capture.grc")
+    writer = CaptureWriter(path, UnoDriver._chan_samples, VREF, DELAY)
+    assert record(ListDriver(frames), writer, max_frames=20) == 20
+
+    drv = ReplayDriver(path)
+    assert drv.frame_count == 20
+    for original in frames[:20]:
+        assert_same(drv.get_frame(), original)
+    assert drv.get_frame() is None
+    drv.seek(15)
+    assert_same(drv.get_frame(), frames[15])
+    drv.close()
@@ -0,0 +1,103 @@
+from time import monotonic
+
+import numpy as np
+import pytest
+
+from gruseloskop.driver import Config, TriggerMode, UnoDriver
+from gruseloskop.stream import StreamBuffer, chunk_samples, stream_syncword
+
+# the emulator talks over a pseudo-terminal, POSIX only
+emulator = pytest.importorskip("gruseloskop.emulator")
+
+
+def chunk_make(seq, first):
+    # A0 counts the samples, A1 the chunk
+    codes = np.stack(
+        [
+            np.arange(first, first + chunk_samples) % 0x100,
+            np.full(chunk_samples, seq),
+        ]
+    )
+    return bytes(stream_syncword) + bytes([seq]) + codes.astype(np.uint8).tobytes()
+
+
+def test_ring():
+    ring = StreamBuffer(40)
+    ring.append(np.zeros((2, 0), np.uint8))
+    assert ring.snapshot().shape == (2, 0)
+    for seq in range(5):
+        ring.push_chunk(chunk_make(seq, seq * chunk_samples))
+    # the last 40 of 80 samples, oldest first
+    snapshot = ring.snapshot()
+    np.testing.assert_array_equal(snapshot[0], np.arange(40, 80))
+    assert ring.position == 80 and ring.filled == 40
+    assert ring.gaps == 0
+
+    # more than the ring holds at once
+    ring.append(np.tile(np.arange(100, dtype=np.uint8), (2, 1)))
+    np.testing.assert_array_equal(ring.snapshot()[0], np.arange(60, 100))
+    assert ring.position == 180
+
+
+def test_gaps():
+    # missing chunks are held at the last value, the time axis stays right
+    ring = StreamBuffer(200)
+    ring.push_chunk(chunk_make(254, 0))
+    ring.push_chunk(chunk_make(255, 16))
+    ring.push_chunk(chunk_make(2, 64))  # 0 and 1 lost, across the wrap
+    assert ring.gaps == 1
+    assert ring.lost_samples == 2 * chunk_samples
+    assert ring.position == 5 * chunk_samples
+
+    a0 = ring.snapshot()[0]
+    np.testing.assert_array_equal(a0[:32], np.arange(32))
+    np.testing.assert_array_equal(a0[32:64], 31)
+    np.testing.assert_array_equal(a0[64:], np.arange(64, 80))
+
+    ring.reset()
+    assert ring.position == ring.filled == ring.gaps == 0
+    ring.push_chunk(chunk_make(7, 0))  # the first after a reset is no gap
+    assert ring.gaps == 0
+
+
+def snapshots(driver, count, accept=lambda frame: True):
+    frames = []
+    deadline = monotonic() + 5.0
+    while len(frames) < count and monotonic() < deadline:
+        frame = driver.get_frame(0.1)
+        if frame is not None and accept(frame):
+            frames.append(frame)
+    assert len(frames) == count
+    return frames
+
+
+def is_roll(frame):
+    return frame.config.trig_mode == TriggerMode.ROLL
+
+
+def test_roll_over_pty():
+    with emulator.UnoEmulator(frame_delay=0.005) as emu:
+        driver = UnoDriver(emu.port)
+        try:
+            driver.set_config(Config(trig_mode=TriggerMode.ROLL, timeframe=0.02))
+            first, last = snapshots(driver, 10, is_roll)[::9]
+            # snapshots grow to the screen, then move along the stream
+            assert last.stream_end > first.stream_end
+            assert last.codes.shape[1] <= UnoDriver._chan_samples
+            assert driver.stream_gaps == 0
+
+            emu.drop(3)
+            deadline = monotonic() + 5.0
+            while driver.stream_gaps == 0 and monotonic() < deadline:
+                driver.get_frame(0.1)
+            assert driver.stream_gaps == 1
+            assert driver.stream_lost_samples == 3 * chunk_samples
+            assert emu.chunks_dropped == 3
+
+            # back to block frames
+            driver.set_config(Config(trig_mode=TriggerMode.AUTO))
+            frame = snapshots(driver, 1, lambda frame: not is_roll(frame))[0]
+            assert frame.codes.shape == (2, UnoDriver._chan_samples)
+            assert frame.stream_end is None
+        finally:
+            driver.close()
@@ -0,0 +1,145 @@
+import numpy as np
+import pytest
+
+from gruseloskop.driver import Config, FrameData, TriggerEdge, TriggerMode
+from gruseloskop.stream import StreamBuffer
+from gruseloskop.trigger import (
+    SoftTrigger,
+    SoftTriggerConfig,
+    SoftTriggerDriver,
+    TriggerKind,
+)
+
+SPL_RATE = 10000.0
+LEVEL = 0x80  # codes, 2.5 V at a 5 V reference
+
+
+def stream_make(samples):
+    # A0 a sine crossing the level once per period, A1 counts the samples
+    n = np.arange(samples)
+    a0 = 0x80 + 100 * np.sin(2 * np.pi * (n + 0.5) / 250)
+    return np.stack([np.round(a0), n % 0x100]).astype(np.uint8)
+
+
+def triggered_at(codes, pre):
+    # the window is one piece of the stream with a rising crossing at `pre`
+    assert np.all((np.diff(codes[1].astype(int)) % 0x100) == 1)
+    assert codes[0, pre - 1] < LEVEL <= codes[0, pre]
+
+
+@pytest.mark.parametrize("chunk", [1, 37, 800, 100000])
+def test_chunks(chunk):
+    # the same triggers whatever the chunks the stream comes in
+    stream = stream_make(20000)
+    trigger = SoftTrigger(SoftTriggerConfig(), SPL_RATE)
+    frames = []
+    for pos in range(0, stream.shape[1], chunk):
+        frames += [f.codes.copy() for f in trigger.feed(stream[:, pos : pos + chunk])]
+
+    # a trigger every other period, the holdoff covers the next one
+    assert trigger.triggers == len(frames) == 20000 // 500 - 1
+    for codes in frames:
+        triggered_at(codes, 400)
+
+
+@pytest.mark.parametrize(
+    "config",
+    [
+        SoftTriggerConfig(edge=TriggerEdge.FALLING, pre=100, post=100),
+        SoftTriggerConfig(kind=TriggerKind.PULSE, width_min=0.01, pre=10, post=10),
+        SoftTriggerConfig(kind=TriggerKind.WINDOW, window_high=4.5, pre=10, post=10),
+    ],
+)
+def test_kinds(config):
+    stream = stream_make(5000)
+    trigger = SoftTrigger(config, SPL_RATE)
+    frames = trigger.feed(stream)
+    assert len(frames) > 0
+    for frame in frames:
+        assert frame.triggered
+        assert frame.codes.shape == (2, config.pre + config.post)
+
+
+def test_auto():
+    # flat signal: an untriggered window each auto timeout
+    stream = np.full((2, 10000), 0x10, dtype=np.uint8)
+    trigger = SoftTrigger(SoftTriggerConfig(auto=0.1), SPL_RATE)
+    frames = []
+    for pos in range(0, stream.shape[1], 100):
+        frames += trigger.feed(stream[:, pos : pos + 100])
+    assert len(frames) == 10000 // 1000
+    assert not any(frame.triggered for frame in frames)
+
+
+class RollSource:
+    # stands in for a UnoDriver in roll mode: snapshots of a ring the stream goes
+    # into, `steps` samples at a time
+
+    dropped_frames = config_dropped_frames = resyncs = 0
+
+    def __init__(self, stream, steps):
+        self._stream = stream
+        self._steps = iter(steps)
+        self._ring = StreamBuffer(800)
+        self._pos = 0
+        self.configs = []
+
+    def set_config(self, config):
+        self.configs.append(config)
+
+    def get_frame(self, timeout=None):
+        step = next(self._steps, None)
+        if step is None or self._pos >= self._stream.shape[1]:
+            return None
+        self._ring.append(self._stream[:, self._pos : self._pos + step])
+        self._pos += step
+        codes = self._ring.snapshot()
+        time0 = np.arange(codes.shape[1]) / SPL_RATE
+        frame = FrameData(time0, time0, codes, False, SPL_RATE)
+        frame.stream_end = self._ring.position
+        frame.config = self.configs[-1]
+        return frame
+
+
+def frames_get(drv):
+    frames = []
+    while True:
+        frame = drv.get_frame(0)
+        if frame is None:
+            return frames
+        frames.append(frame.codes.copy())
+
+
+def test_driver_roll():
+    stream = stream_make(20000)
+    steps = np.random.default_rng(1).integers(1, 300, 1000)
+    source = RollSource(stream, steps)
+    drv = SoftTriggerDriver(source)
+    drv.set_config(Config(trig_mode=TriggerMode.NORM))
+    assert source.configs[-1].trig_mode == TriggerMode.ROLL
+
+    # nothing lost: the same windows as from the stream in one piece
+    frames = frames_get(drv)
+    assert len(frames) == 20000 // 500 - 1
+    for codes in frames:
+        triggered_at(codes, 400)
+
+
+def test_driver_gaps():
+    # more than a snapshot holds between two of them: no window spans the gap
+    stream = stream_make(20000)
+    source = RollSource(stream, [100, 100, 900] * 100)
+    drv = SoftTriggerDriver(source)
+    drv.set_config(Config(trig_mode=TriggerMode.NORM))
+    frames = frames_get(drv)
+    assert len(frames) > 0
+    for codes in frames:
+        triggered_at(codes, 400)
+
+
+def test_driver_stop():
+    source = RollSource(stream_make(1000), [])
+    drv = SoftTriggerDriver(source)
+    drv.set_config(Config(trig_mode=TriggerMode.STOP))
+    assert source.configs[-1].trig_mode == TriggerMode.STOP
+    assert drv.get_frame(0) is None